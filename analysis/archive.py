@@ -0,0 +1,292 @@
+# Selective reader for session archives (_all.json.gz, or _all.jsonl(.gz) streamed
+# by vzgazetoolbox.ExperimentArchive)
+
+import re
+import json
+import zlib
+
+# Keys whose values are skipped by default: raw validation samples make
+# up more than 90% of an archive, but are rarely needed
+SKIP_KEYS = ('samples',)
+
+# Archive file name endings, in order of preference if a session has several
+ARCHIVE_SUFFIXES = ('_all.json.gz', '_all.jsonl.gz', '_all.jsonl')
+
+# Top-level experiment data key of each JSON Lines record type
+_RECORD_KEYS = {'config': 'config', 'participant': 'participant',
+                'trial': 'trials', 'validation': 'eye_tracker_validations'}
+
+_DECODER = json.JSONDecoder()
+_WS = re.compile(r'[ \t\n\r]*')
+
+
+class _Done(Exception):
+    """ Raised when all requested fields have been found """
+    pass
+
+
+def archive_base(path):
+    """ Return an archive path without its ending (see ARCHIVE_SUFFIXES), or None
+    if the file is not a session archive """
+    for suffix in ARCHIVE_SUFFIXES:
+        if path.endswith(suffix):
+            return path[0:-len(suffix)]
+    return None
+
+
+def read_text(path):
+    """ Return the text of an archive, decompressed if it is gzipped """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.lower().endswith('.gz'):
+        data = _gunzip(data)
+    return data.decode('utf-8')
+
+
+def _gunzip(data):
+    """ Decompress all gzip members. A member cut off by a crash during writing
+    is decompressed as far as possible, up to its last complete line. """
+    out = []
+    while len(data) > 0:
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        out.append(d.decompress(data))
+        if not d.eof:
+            out[-1] = out[-1][0:out[-1].rfind(b'\n') + 1]
+            break
+        data = d.unused_data
+    return b''.join(out)
+
+
+def read_archive(path, fields, skip=SKIP_KEYS, default=None):
+    """ Read selected values from a session archive (VRpoint_*_all.json.gz or
+    VRpoint_*_all.jsonl(.gz)), without decoding the rest of the file. Values are located by scanning
+    the JSON text; anything not requested, as well as values of keys in skip,
+    is passed over without creating Python objects.
+
+    Args:
+        path (str): Archive file name
+        fields (list): Dotted paths of values to read, with list indices as
+            numbers, e.g. ['participant', 'trials.0.params.feedback']
+        skip (tuple): Keys to leave out of returned dicts, e.g. ('samples',)
+        default: Value returned for fields that do not exist
+
+    Returns dict of field path: value
+    """
+    if path.endswith('.jsonl') or path.endswith('.jsonl.gz'):
+        return read_jsonl_fields(read_text(path), fields, skip=skip, default=default)
+    return read_fields(read_text(path), fields, skip=skip, default=default)
+
+
+def read_fields(text, fields, skip=SKIP_KEYS, default=None):
+    """ Read selected values from JSON text, see read_archive() """
+    tree = {}
+    for f in fields:
+        node = tree
+        parts = f.split('.')
+        for p in parts[0:-1]:
+            if node.get(p, {}) is None:
+                break   # parent already requested as a whole
+            node = node.setdefault(p, {})
+        else:
+            node[parts[-1]] = None
+
+    found = {}
+    state = {'pending': _count_leaves(tree)}
+    try:
+        _walk(text, _WS.match(text, 0).end(), tree, '', found, state, tuple(skip))
+    except _Done:
+        pass
+    return dict([(f, _lookup(found, f, default)) for f in fields])
+
+
+def read_jsonl_fields(text, fields, skip=SKIP_KEYS, default=None):
+    """ Read selected values from JSON Lines archive text, see read_archive().
+    Records are combined into the same layout as a _all.json archive
+    (see vzgazetoolbox.datalog.readExperimentArchive), decoding only records
+    of the requested top-level keys. Trials are placed at their position in the
+    trial list, missing ones (e.g. after a crash) are None. """
+    tops = set([f.split('.')[0] for f in fields])
+    e = {}
+    trials = {}
+    validations = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        try:
+            rtype = read_fields(line, ['type'])['type']
+            key = _RECORD_KEYS.get(rtype)
+            if rtype != 'experiment' and key not in tops:
+                continue
+            record = read_fields(line, ['data', 'pos'], skip=skip)
+        except (ValueError, IndexError):
+            break   # incomplete last record
+        if rtype == 'experiment':
+            e.update(record['data'])
+        elif rtype == 'trial':
+            trials[record['pos']] = record['data']
+        elif rtype == 'validation':
+            validations.append(record['data'])
+        else:
+            e[key] = record['data']
+
+    if len(trials) > 0:
+        e['trials'] = [trials.get(pos) for pos in range(0, max(trials.keys()) + 1)]
+    if len(validations) > 0:
+        e['eye_tracker_validations'] = validations
+    return dict([(f, _lookup(e, f, default)) for f in fields])
+
+
+def _count_leaves(tree):
+    if tree is None:
+        return 1
+    return sum([_count_leaves(t) for t in tree.values()])
+
+
+def _lookup(found, field, default):
+    """ Value of a field, which may be part of a value read as a whole """
+    if field in found:
+        return found[field]
+    parts = field.split('.')
+    for n in range(len(parts) - 1, 0, -1):
+        parent = '.'.join(parts[0:n])
+        if parent in found:
+            value = found[parent]
+            try:
+                for p in parts[n:]:
+                    value = value[int(p)] if isinstance(value, list) else value[p]
+            except (KeyError, IndexError, ValueError, TypeError):
+                return default
+            return value
+    return default
+
+
+def _walk(s, pos, tree, path, found, state, skip):
+    """ Descend into the value at pos, collecting requested fields. Returns end position. """
+    if tree is None:
+        (found[path], end) = _value(s, pos, skip)
+        state['pending'] -= 1
+        if state['pending'] <= 0:
+            raise _Done()
+        return end
+
+    c = s[pos]
+    if c == '{':
+        pos = _WS.match(s, pos + 1).end()
+        if s[pos] == '}':
+            return pos + 1
+        while True:
+            (key, pos) = _DECODER.raw_decode(s, pos)
+            pos = _WS.match(s, _WS.match(s, pos).end() + 1).end()   # skip ':'
+            if key in tree:
+                pos = _walk(s, pos, tree[key], path + key + '.' if tree[key] is not None else path + key,
+                            found, state, skip)
+            else:
+                pos = _skip(s, pos)
+            pos = _WS.match(s, pos).end()
+            if s[pos] == '}':
+                return pos + 1
+            pos = _WS.match(s, pos + 1).end()   # skip ','
+
+    elif c == '[':
+        pos = _WS.match(s, pos + 1).end()
+        if s[pos] == ']':
+            return pos + 1
+        idx = 0
+        while True:
+            key = str(idx)
+            if key in tree:
+                pos = _walk(s, pos, tree[key], path + key + '.' if tree[key] is not None else path + key,
+                            found, state, skip)
+            else:
+                pos = _skip(s, pos)
+            pos = _WS.match(s, pos).end()
+            if s[pos] == ']':
+                return pos + 1
+            pos = _WS.match(s, pos + 1).end()
+            idx += 1
+
+    # Scalar where a container was expected: requested fields do not exist
+    return _skip(s, pos)
+
+
+def _skip(s, pos):
+    """ Return end position of the JSON value at pos, without decoding containers """
+    if s[pos] not in '[{':
+        return _DECODER.raw_decode(s, pos)[1]
+    end = _container_end(s, pos)
+    if end is None:
+        return _DECODER.raw_decode(s, pos)[1]
+    return end
+
+
+def _container_end(s, pos):
+    """ Find the end of the array or object at pos by counting only its own
+    bracket type; brackets inside strings are detected by quote parity.
+    Returns None if escape sequences make quote counting unreliable. """
+    opening = s[pos]
+    closing = ']' if opening == '[' else '}'
+    depth = 0
+    quotes = 0
+    last = pos
+    end = None
+    next_open = pos
+    next_close = s.find(closing, pos)
+    while next_close >= 0:
+        if 0 <= next_open < next_close:
+            p = next_open
+            next_open = s.find(opening, p + 1)
+        else:
+            p = next_close
+            next_close = s.find(closing, p + 1)
+        quotes += s.count('"', last, p)
+        last = p
+        if quotes % 2 == 1:
+            continue
+        if s[p] == opening:
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                end = p + 1
+                break
+    if end is None or s.find('\\', pos, end) >= 0:
+        return None
+    return end
+
+
+def _value(s, pos, skip):
+    """ Decode the value at pos, leaving out values of keys in skip.
+    Returns (value, end position). """
+    if s[pos] not in '[{':
+        return _DECODER.raw_decode(s, pos)
+
+    # Decode at C speed if no skipped key occurs within the value
+    end = _container_end(s, pos)
+    if end is not None and not any([s.find('"{:s}"'.format(k), pos, end) >= 0 for k in skip]):
+        return _DECODER.raw_decode(s, pos)
+
+    if s[pos] == '{':
+        value = {}
+        pos = _WS.match(s, pos + 1).end()
+        while s[pos] != '}':
+            (key, pos) = _DECODER.raw_decode(s, pos)
+            pos = _WS.match(s, _WS.match(s, pos).end() + 1).end()
+            if key in skip:
+                pos = _skip(s, pos)
+            else:
+                (value[key], pos) = _value(s, pos, skip)
+            pos = _WS.match(s, pos).end()
+            if s[pos] == ',':
+                pos = _WS.match(s, pos + 1).end()
+        return (value, pos + 1)
+
+    value = []
+    pos = _WS.match(s, pos + 1).end()
+    while s[pos] != ']':
+        (v, pos) = _value(s, pos, skip)
+        value.append(v)
+        pos = _WS.match(s, pos).end()
+        if s[pos] == ',':
+            pos = _WS.match(s, pos + 1).end()
+    return (value, pos + 1)
@@ -0,0 +1,122 @@
+# Session catalog: index of session metadata for selecting data files
+
+import os
+import json
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from archive import read_archive
+from ingest import CACHE_DIR, TABLES, SESSION_FIELDS, find_archives, session_files, file_signature, session_info
+
+# Catalog is rebuilt if this changes
+CATALOG_VERSION = 1
+CATALOG_FILE = 'catalog.json'
+
+
+def count_rows(path):
+    """ Return number of data rows in a gzipped TSV file, or None if it does not exist """
+    if not os.path.isfile(path):
+        return None
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            data = d.decompress(chunk)
+            if len(data) > 0:
+                lines += data.count(b'\n')
+                last = data[-1:]
+    if last != b'\n':
+        lines += 1  # no newline after last row
+    return max(lines - 1, 0)
+
+
+def catalog_entry(archive):
+    """ Return the catalog row for one session: session info, number of
+    validations, file paths and row counts of each table
+
+    Args:
+        archive (str): Path to a session archive, see ingest.find_archives()
+    """
+    exp = read_archive(archive, SESSION_FIELDS + ['eye_tracker_validations'], skip=('samples', 'targets'))
+    row = session_info(archive, exp=exp)
+    row['n_validations'] = len(exp['eye_tracker_validations'] or [])
+    files = session_files(archive)
+    for t in ['archive'] + TABLES:
+        row['{:s}_file'.format(t)] = files[t] if os.path.isfile(files[t]) else None
+    for t in TABLES:
+        row['n_{:s}'.format(t)] = count_rows(files[t])
+    return row
+
+
+def _catalog_path(folder, catalog_file):
+    if catalog_file is None:
+        catalog_file = os.path.join(folder, CACHE_DIR, CATALOG_FILE)
+    return catalog_file
+
+
+def update_catalog(folder, catalog_file=None, processes=None):
+    """ Build or update the session catalog of a data folder. Only sessions with new
+    or changed files are read. Returns the catalog as DataFrame, one row per session.
+
+    Args:
+        folder (str): Data folder containing session archives
+        catalog_file (str): Catalog file, default: catalog.json in the ingest cache folder
+        processes (int): Number of worker processes, default: number of CPUs
+    """
+    catalog_file = _catalog_path(folder, catalog_file)
+    try:
+        with open(catalog_file, 'r') as cf:
+            catalog = json.load(cf)
+        if catalog.get('version') != CATALOG_VERSION:
+            raise ValueError('Outdated catalog')
+    except (IOError, ValueError):
+        catalog = {'version': CATALOG_VERSION, 'sessions': {}}
+
+    entries = catalog['sessions']
+    archives = find_archives(folder)
+    changed = len([a for a in entries.keys() if a not in archives]) > 0
+    for a in list(entries.keys()):
+        if a not in archives:
+            del entries[a]
+
+    signatures = dict([(a, dict([(t, file_signature(p)) for (t, p) in session_files(a).items()])) for a in archives])
+    todo = [a for a in archives if a not in entries or entries[a]['files'] != signatures[a]]
+    if len(todo) > 0:
+        print('Cataloging {:d} of {:d} sessions...'.format(len(todo), len(archives)))
+        if processes == 1 or len(todo) == 1:
+            rows = [catalog_entry(a) for a in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                rows = list(pool.map(catalog_entry, todo))
+        for (a, row) in zip(todo, rows):
+            entries[a] = {'files': signatures[a], 'row': row}
+
+    if changed or len(todo) > 0:
+        if not os.path.isdir(os.path.dirname(catalog_file)):
+            os.makedirs(os.path.dirname(catalog_file))
+        tmp = catalog_file + '.tmp'
+        with open(tmp, 'w') as cf:
+            json.dump(catalog, cf, indent=1)
+        os.replace(tmp, catalog_file)
+
+    return pd.DataFrame([entries[a]['row'] for a in archives])
+
+
+def find_sessions(folder, where=None, catalog_file=None, **variables):
+    """ Return catalog rows of sessions matching a filter expression, e.g.
+    find_sessions(FOLDER_DATA, "occluded == 'no' and ppid not in @drop", drop=DROP_PPIDS).
+    The result can be passed to ingest.read_all_participant_data(sessions=...).
+
+    Args:
+        folder (str): Data folder
+        where (str): Expression for DataFrame.query(), None to return all sessions
+        catalog_file (str): Catalog file, default: catalog.json in the ingest cache folder
+        **variables: Values referenced in the expression as @name
+    """
+    catalog = update_catalog(folder, catalog_file=catalog_file)
+    if where is None:
+        return catalog
+    return catalog.query(where, local_dict=variables).reset_index(drop=True)
@@ -0,0 +1,166 @@
+# Memory-lean column types for trial, event and sample tables
+
+from fnmatch import fnmatch
+
+import numpy as np
+import pandas as pd
+
+# Largest absolute error allowed when storing a float column as float32, by
+# column name pattern (first match wins). Euler angles are in degrees; positions
+# (m), direction vectors and quaternions use the default. Columns that would lose
+# more, e.g. time stamps in ms, are kept as float64.
+FLOAT32_TOLERANCE = [('*_dir[XYZ]', 1e-4),
+                     ('*', 1e-6)]
+
+# Float columns converted to integers if all values are whole numbers
+COUNTER_COLS = ['frameno', '*_tick', '*_idx', 'trial*']
+
+# Text columns with at most this fraction of unique values become categoricals
+CATEGORY_MAX_UNIQUE = 0.5
+
+# Numeric columns where one value fills at least this fraction of rows are stored sparse
+SPARSE_MIN_FILL = 0.9
+
+
+def memory_usage(df):
+    """ Return memory used by a DataFrame in bytes, including string contents """
+    if df is None:
+        return 0
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _tolerance(col):
+    for (pattern, tol) in FLOAT32_TOLERANCE:
+        if fnmatch(col, pattern):
+            return tol
+    return 0.0
+
+
+def optimize_dtypes(df, float32=True, integers=True, categories=True, sparse=True):
+    """ Convert columns of a DataFrame to smaller types where no information is lost:
+
+    - float64 to float32 if no value changes by more than FLOAT32_TOLERANCE
+    - integer columns and whole-number counters (COUNTER_COLS) to the smallest integer type
+    - text columns with few distinct values (labels, ppid, session) to categoricals
+    - numeric columns that are mostly one constant value to sparse columns
+
+    Args:
+        df (DataFrame): Table to convert (not modified)
+        float32, integers, categories, sparse (bool): Enable each conversion
+
+    Returns the converted DataFrame and a report dict (see print_dtype_report())
+    """
+    report = {'rows': df.shape[0], 'before': memory_usage(df), 'after': 0,
+              'float32': {}, 'float64': {}, 'integer': [], 'category': [], 'sparse': {}}
+    df = df.copy()
+
+    for col in df.columns:
+        s = df[col]
+        name = str(col)
+
+        if pd.api.types.is_float_dtype(s.dtype) and not isinstance(s.dtype, pd.SparseDtype):
+            v = s.to_numpy(dtype=np.float64)
+            whole = np.all(np.isfinite(v)) and np.all(v == np.round(v))
+            if integers and whole and len(v) > 0 and any([fnmatch(name, p) for p in COUNTER_COLS]):
+                df[col] = pd.to_numeric(s.astype(np.int64), downcast='integer')
+                report['integer'].append(name)
+            elif float32 and s.dtype == np.float64:
+                with np.errstate(over='ignore', invalid='ignore'):
+                    err = np.abs(v.astype(np.float32).astype(np.float64) - v)
+                    err[np.isnan(v) & np.isnan(err)] = 0.0
+                err = float(np.max(err)) if len(err) > 0 else 0.0
+                if err <= _tolerance(name):
+                    df[col] = s.astype(np.float32)
+                    report['float32'][name] = err
+                else:
+                    report['float64'][name] = err
+
+        elif integers and pd.api.types.is_integer_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+            if isinstance(s.dtype, np.dtype):
+                df[col] = pd.to_numeric(s, downcast='integer')
+                if df[col].dtype != s.dtype:
+                    report['integer'].append(name)
+
+        elif categories and (pd.api.types.is_string_dtype(s.dtype) or s.dtype == object):
+            n = s.nunique(dropna=True)
+            if len(s) > 0 and n <= CATEGORY_MAX_UNIQUE * len(s):
+                df[col] = s.astype('category')
+                report['category'].append(name)
+
+        s = df[col]
+        if sparse and len(s) > 0 and pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype) \
+                and not isinstance(s.dtype, pd.SparseDtype):
+            counts = s.value_counts(dropna=False)
+            if counts.iloc[0] >= SPARSE_MIN_FILL * len(s):
+                fill = counts.index[0]
+                df[col] = s.astype(pd.SparseDtype(s.dtype, fill))
+                report['sparse'][name] = fill
+
+    report['after'] = memory_usage(df)
+    return df, report
+
+
+def concat_tables(dfs):
+    """ Concatenate optimized tables. Categoricals are merged into one set of
+    categories instead of falling back to strings; numeric columns take the
+    largest type of any table. """
+    dfs = [df for df in dfs if df is not None]
+    if len(dfs) == 0:
+        return None
+    cat_cols = []
+    for df in dfs:
+        cat_cols += [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype) and c not in cat_cols]
+    for col in cat_cols:
+        cats = []
+        for df in dfs:
+            if col in df.columns:
+                s = df[col]
+                vals = s.cat.categories if isinstance(s.dtype, pd.CategoricalDtype) else s.dropna().unique()
+                cats = cats + [v for v in vals if v not in cats]
+        dtype = pd.CategoricalDtype(sorted(cats, key=str))
+        dfs = [df.assign(**{col: df[col].astype(dtype)}) if col in df.columns else df for df in dfs]
+    return pd.concat(dfs)
+
+
+def merge_dtype_reports(reports):
+    """ Combine reports of several tables, e.g. one per session, keeping the
+    largest float32 error of each column """
+    total = {'rows': 0, 'before': 0, 'after': 0,
+             'float32': {}, 'float64': {}, 'integer': [], 'category': [], 'sparse': {}}
+    for r in reports:
+        total['rows'] += r['rows']
+        total['before'] += r['before']
+        total['after'] += r['after']
+        for k in ['float32', 'float64']:
+            for (col, err) in r[k].items():
+                total[k][col] = max(err, total[k].get(col, 0.0))
+        for k in ['integer', 'category']:
+            total[k] += [c for c in r[k] if c not in total[k]]
+        total['sparse'].update(r['sparse'])
+
+    # A column kept as float64 in any table is float64 after concatenation
+    for col in total['float64'].keys():
+        total['float32'].pop(col, None)
+    return total
+
+
+def print_dtype_report(report, name='', after=None):
+    """ Print memory use before and after optimize_dtypes(), and columns
+    that lose precision when stored as float32 or were kept as float64
+
+    Args:
+        report (dict): Report returned by optimize_dtypes() or merge_dtype_reports()
+        name (str): Table name
+        after (int): Memory of the final (e.g. concatenated) table, default: from report
+    """
+    after = report['after'] if after is None else after
+    print('{:s}: {:d} rows, {:.1f} MB -> {:.1f} MB ({:.0f}%)'.format(name, report['rows'], report['before'] / 1e6,
+                                                                     after / 1e6, 100.0 * after / max(report['before'], 1)))
+    print('  float32: {:d}, integer: {:d}, categorical: {:d}, sparse: {:d} columns'.format(
+          len(report['float32']), len(report['integer']), len(report['category']), len(report['sparse'])))
+    lossy = dict([(c, e) for (c, e) in report['float32'].items() if e > 0])
+    if len(lossy) > 0:
+        col = max(lossy, key=lossy.get)
+        print('  float32 rounding in {:d} columns, max. error {:.2g} ({:s})'.format(len(lossy), lossy[col], col))
+    for (col, err) in sorted(report['float64'].items()):
+        print('  kept float64: {:s} (float32 error {:.2g} > {:.2g})'.format(col, err, _tolerance(col)))
@@ -0,0 +1,313 @@
+# Parallel, cached import of participant session files
+
+import os
+import json
+import ntpath
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from archive import ARCHIVE_SUFFIXES, archive_base, read_archive
+from dtypes import optimize_dtypes, concat_tables, merge_dtype_reports, memory_usage, print_dtype_report
+
+# Cached tables are rebuilt if this changes
+CACHE_VERSION = 2
+CACHE_DIR = '.ingest_cache'
+MANIFEST = 'manifest.json'
+
+TABLES = ['trials', 'events', 'samples']
+
+
+def parquet_available():
+    """ Check whether pandas can write Parquet files """
+    for engine in ['pyarrow', 'fastparquet']:
+        try:
+            __import__(engine)
+            return True
+        except ImportError:
+            pass
+    return False
+
+# Parquet if an engine is installed, pickled DataFrames otherwise
+CACHE_FORMAT = 'parquet' if parquet_available() else 'pickle'
+
+
+def find_archives(folder):
+    """ Return sorted absolute paths of all session archives in a folder. If a
+    session has archives in several formats, the first in ARCHIVE_SUFFIXES is used.
+
+    Args:
+        folder (str): Data folder
+    """
+    archives = {}
+    for suffix in ARCHIVE_SUFFIXES:
+        for f in glob(os.path.join(folder, 'VRpoint_*' + suffix)):
+            archives.setdefault(f[0:-len(suffix)], os.path.abspath(f))
+    return sorted(archives.values())
+
+
+def session_files(archive):
+    """ Return paths of all files belonging to a session, by table name
+
+    Args:
+        archive (str): Path to a session archive, see find_archives()
+    """
+    base = archive_base(archive)
+    return {'archive': archive,
+            'trials': base + '.tsv.gz',
+            'events': base + '_events.tsv.gz',
+            'samples': base + '_samples.tsv.gz'}
+
+
+def file_signature(path):
+    """ Return [size, mtime] of a file, or None if it does not exist """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime]
+
+
+# Archive values needed for the session table
+SESSION_FIELDS = ['participant', 'config.object_scale', 'config.wrist_cal', 'config._trial_input_files',
+                  'trials.0.params.feedback', 'trials.18.params.occluded', 'eye_tracker_validations.0']
+
+
+def session_info(archive, exp=None):
+    """ Return the session table row for a session archive. Only reads the
+    required values, skipping raw validation samples (see archive.py).
+
+    Args:
+        archive (str): Path to a session archive, see find_archives()
+        exp (dict): SESSION_FIELDS values if already read with read_archive()
+    """
+    if exp is None:
+        exp = read_archive(archive, SESSION_FIELDS, skip=('samples', 'targets'))
+    val = exp['eye_tracker_validations.0']
+    return {'ppid': exp['participant']['id'],
+            'session': exp['participant']['session'],
+            'feedback': exp['trials.0.params.feedback'],
+            'occluded': exp['trials.18.params.occluded'],
+            'obj_scale': exp['config.object_scale'],
+            'age': exp['participant']['age'],
+            'gender': exp['participant']['gender'],
+            'gaze_acc': val['acc'],
+            'gaze_rms': val['rmsi'],
+            'gaze_sd': val['sd'],
+            'ipd': val['ipd'],
+            'wrist_cal_x': exp['config.wrist_cal']['average_offset'][0],
+            'wrist_cal_y': exp['config.wrist_cal']['average_offset'][1],
+            'wrist_cal_z': exp['config.wrist_cal']['average_offset'][2],
+            'data_file': os.path.basename(archive_base(archive)) + '_all.',  # as in the original session table
+            'in_file': ntpath.basename(exp['config._trial_input_files'][0])}
+
+
+def read_session(archive):
+    """ Read all data of one session. Returns the session table row and a dict
+    of trials, events and samples DataFrames (None if the file does not exist),
+    with ppid and session columns added.
+
+    Args:
+        archive (str): Path to a session archive, see find_archives()
+    """
+    sd = session_info(archive)
+
+    tables = {}
+    files = session_files(archive)
+    for t in TABLES:
+        if os.path.isfile(files[t]):
+            df = pd.read_csv(files[t], sep='\t', index_col=False, compression='gzip')
+            df.loc[:, 'ppid'] = sd['ppid']
+            df.loc[:, 'session'] = sd['session']
+            tables[t] = df
+        else:
+            tables[t] = None
+    return sd, tables
+
+
+def _cache_file(cache_dir, archive, table):
+    """ Path of a cached table file """
+    name = os.path.basename(archive_base(archive))
+    return os.path.join(cache_dir, '{:s}.{:s}.{:s}'.format(name, table, 'parquet' if CACHE_FORMAT == 'parquet' else 'pkl'))
+
+
+def _write_table(df, path):
+    if CACHE_FORMAT == 'parquet':
+        df.to_parquet(path, index=True)
+    else:
+        df.to_pickle(path)
+
+
+def _read_table(path):
+    if CACHE_FORMAT == 'parquet':
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+def _ingest_session(archive, cache_dir):
+    """ Worker: read one session and write its tables to the cache.
+    Returns the new manifest entry. """
+    sd, tables = read_session(archive)
+    entry = {'files': {}, 'session': sd, 'tables': {}}
+    for (t, path) in session_files(archive).items():
+        entry['files'][t] = file_signature(path)
+    for t in TABLES:
+        if tables[t] is not None:
+            cf = _cache_file(cache_dir, archive, t)
+            _write_table(tables[t], cf)
+            entry['tables'][t] = os.path.basename(cf)
+    return entry
+
+
+def _load_manifest(cache_dir):
+    """ Load the cache manifest, or return an empty one if missing or outdated """
+    empty = {'version': CACHE_VERSION, 'format': CACHE_FORMAT, 'sessions': {}}
+    try:
+        with open(os.path.join(cache_dir, MANIFEST), 'r') as mf:
+            manifest = json.load(mf)
+    except (IOError, ValueError):
+        return empty
+    if manifest.get('version') != CACHE_VERSION or manifest.get('format') != CACHE_FORMAT:
+        return empty
+    return manifest
+
+
+def _save_manifest(cache_dir, manifest):
+    tmp = os.path.join(cache_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w') as mf:
+        json.dump(manifest, mf, indent=1)
+    os.replace(tmp, os.path.join(cache_dir, MANIFEST))
+
+
+def _is_current(entry, archive):
+    """ True if none of a session's files changed since it was cached """
+    for (t, path) in session_files(archive).items():
+        if entry['files'].get(t) != file_signature(path):
+            return False
+    return True
+
+
+def update_cache(folder, cache_dir=None, processes=None, verbose=False, archives=None):
+    """ Ingest new or changed session files into the cache, and remove sessions
+    whose files were deleted. Returns the cache manifest.
+
+    Args:
+        folder (str): Data folder containing session archives
+        cache_dir (str): Cache folder, default: .ingest_cache in the data folder
+        processes (int): Number of worker processes, default: number of CPUs.
+            Use 1 to read files in the current process.
+        verbose (bool): if True, print each ingested session
+        archives (list): Only ingest these archive files, default: all in folder
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(folder, CACHE_DIR)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    manifest = _load_manifest(cache_dir)
+    cached = manifest['sessions']
+    available = find_archives(folder)
+    for key in list(cached.keys()):
+        if key not in available:
+            del cached[key]
+    if archives is None:
+        archives = available
+    else:
+        archives = [os.path.abspath(a) for a in archives]
+    todo = [a for a in archives if a not in cached or not _is_current(cached[a], a)]
+
+    if len(todo) > 0:
+        print('Ingesting {:d} of {:d} session files...'.format(len(todo), len(archives)))
+        if processes == 1 or len(todo) == 1:
+            entries = [_ingest_session(a, cache_dir) for a in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                entries = list(pool.map(_ingest_session, todo, [cache_dir] * len(todo)))
+        for (a, entry) in zip(todo, entries):
+            cached[a] = entry
+            if verbose:
+                print([entry['session']['ppid'], entry['session']['session']])
+    _save_manifest(cache_dir, manifest)
+    return manifest
+
+
+def load_cached(manifest, cache_dir, archives=None, optimize=False):
+    """ Load sessions, trials, samples and events from the cache, concatenated
+    once per table. Tables without any data are returned as None.
+
+    Args:
+        manifest (dict): Cache manifest, see update_cache()
+        cache_dir (str): Cache folder
+        archives (list): Archive paths of sessions to load, default: all
+        optimize (bool): if True, convert each session's tables to smaller
+            column types before concatenating (see dtypes.optimize_dtypes())
+            and print memory use before and after
+    """
+    if archives is None:
+        archives = sorted(manifest['sessions'].keys())
+    entries = [manifest['sessions'][a] for a in archives]
+    sessions = pd.DataFrame([e['session'] for e in entries])
+
+    tables = {}
+    for t in TABLES:
+        dfs = []
+        reports = []
+        for e in entries:
+            if t in e['tables']:
+                df = _read_table(os.path.join(cache_dir, e['tables'][t]))
+                if optimize:
+                    (df, report) = optimize_dtypes(df)
+                    reports.append(report)
+                dfs.append(df)
+        if not optimize:
+            tables[t] = pd.concat(dfs) if len(dfs) > 0 else None
+        else:
+            tables[t] = concat_tables(dfs)
+            if len(reports) > 0:
+                print_dtype_report(merge_dtype_reports(reports), name=t, after=memory_usage(tables[t]))
+    return sessions, tables['trials'], tables['samples'], tables['events']
+
+
+def read_all_participant_data(folder, verbose=False, drop_ppids=[], cache_dir=None, processes=None, sessions=None,
+                              optimize=False):
+    """ Read a folder full of participant data and return aggregated
+    trial, sample and event tables plus session info. Sessions with
+    occlusion conditions are dropped (not analyzed here).
+
+    Files are read in parallel and cached, so that only new or changed
+    sessions are read again on the next call.
+
+    Args:
+        folder (str): Data folder
+        verbose (bool): if True, print ingested and dropped sessions
+        drop_ppids (list): Participant IDs to exclude
+        cache_dir (str): Cache folder, default: .ingest_cache in the data folder
+        processes (int): Number of worker processes, default: number of CPUs
+        sessions (DataFrame): Only read these sessions, e.g. selected with
+            catalog.find_sessions(). Default: all sessions in folder
+        optimize (bool): if True, use memory-lean column types (float32, small
+            integers, categoricals, sparse columns) and print a memory report.
+            Note that ppid and session become categoricals.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(folder, CACHE_DIR)
+    archives = None
+    if sessions is not None:
+        archives = [os.path.abspath(a) for a in sessions.archive_file]
+    manifest = update_cache(folder, cache_dir=cache_dir, processes=processes, verbose=verbose, archives=archives)
+
+    print('Importing data files...')
+    keep = []
+    for a in sorted(manifest['sessions'].keys() if archives is None else archives):
+        sd = manifest['sessions'][a]['session']
+        if sd['ppid'] in drop_ppids:
+            print('Skipping PPID {:s}.'.format(str(sd['ppid'])))
+        elif sd['occluded'] != 'no':
+            if verbose:
+                print('dropped occlusion condition:', [sd['ppid'], sd['session']])
+        else:
+            keep.append(a)
+    sessions, trials, samples, events = load_cached(manifest, cache_dir, archives=keep, optimize=optimize)
+    print('Done.')
+    return sessions, trials, samples, events
@@ -0,0 +1,183 @@
+# Partitioned on-disk store for preprocessed analysis tables
+
+import os
+import json
+import shutil
+
+import pandas as pd
+
+from ingest import parquet_available
+
+# Tables are split into one file per participant and session
+PARTITION_COLS = ['ppid', 'session']
+
+# Label columns stored as categoricals
+CATEGORICAL_COLS = ['object', 'feedback', 'start_pos', 'type']
+
+SCHEMA_FILE = '_schema.json'
+
+# Parquet if an engine is installed, pickled DataFrames otherwise. Only Parquet
+# supports reading selected columns and filtering rows while reading.
+STORE_FORMAT = 'parquet' if parquet_available() else 'pickle'
+
+
+def _part_file(path):
+    return os.path.join(path, 'part.parquet' if STORE_FORMAT == 'parquet' else 'part.pkl')
+
+
+def save_tables(tables, folder, partition_cols=PARTITION_COLS, categorical=CATEGORICAL_COLS):
+    """ Save DataFrames to the store, replacing existing tables of the same name.
+    Each table is partitioned into folder/table/ppid=X/session=Y/ if it
+    contains the partition columns.
+
+    Args:
+        tables (dict): DataFrames by table name, e.g. {'trials': trials}. None values are ignored.
+        folder (str): Store folder
+        partition_cols (list): Columns to partition by
+        categorical (list): Columns to convert to categoricals, if present
+    """
+    for (name, df) in tables.items():
+        if df is None:
+            continue
+        df = df.copy()
+        for col in categorical:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        parts = [c for c in partition_cols if c in df.columns]
+
+        # Write to a temporary folder first, so readers never see a partial table
+        path = os.path.join(folder, name)
+        tmp = path + '.tmp'
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp)
+        os.makedirs(tmp)
+
+        if len(parts) == len(partition_cols) and len(parts) > 0:
+            for (key, part) in df.groupby(parts, sort=True, observed=True, dropna=False):
+                if not isinstance(key, tuple):
+                    key = (key,)
+                pdir = os.path.join(tmp, *['{:s}={:s}'.format(c, str(v)) for (c, v) in zip(parts, key)])
+                os.makedirs(pdir)
+                _write(part, _part_file(pdir))
+        else:
+            parts = []
+            _write(df, _part_file(tmp))
+
+        schema = {'format': STORE_FORMAT,
+                  'columns': [str(c) for c in df.columns],
+                  'partition_cols': parts,
+                  'categories': dict([(str(c), list(df[c].cat.categories)) for c in df.columns
+                                      if isinstance(df[c].dtype, pd.CategoricalDtype)])}
+        with open(os.path.join(tmp, SCHEMA_FILE), 'w') as sf:
+            json.dump(schema, sf, indent=1, default=str)
+
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.rename(tmp, path)
+
+
+def _write(df, path):
+    if STORE_FORMAT == 'parquet':
+        df.to_parquet(path, index=True)
+    else:
+        df.to_pickle(path)
+
+
+def _values(v):
+    """ Filter value(s) as a list """
+    if isinstance(v, (list, tuple, set, pd.Series, pd.Index)):
+        return list(v)
+    return [v]
+
+
+def _partitions(path, cols, where):
+    """ Yield partition folders of a table that match the where conditions """
+    if len(cols) == 0:
+        yield path
+        return
+    col = cols[0]
+    allowed = None
+    if col in where:
+        allowed = set([str(v) for v in _values(where[col])])
+    for d in sorted(os.listdir(path)):
+        if not d.startswith(col + '='):
+            continue
+        if allowed is not None and d[len(col) + 1:] not in allowed:
+            continue
+        for p in _partitions(os.path.join(path, d), cols[1:], where):
+            yield p
+
+
+def list_tables(folder):
+    """ Return names of all tables in the store """
+    return sorted([d for d in os.listdir(folder) if os.path.isfile(os.path.join(folder, d, SCHEMA_FILE))])
+
+
+def load_table(name, folder, where=None, columns=None):
+    """ Load one table from the store, see load() """
+    path = os.path.join(folder, name)
+    with open(os.path.join(path, SCHEMA_FILE), 'r') as sf:
+        schema = json.load(sf)
+    if schema['format'] != STORE_FORMAT:
+        raise ValueError('Table {:s} was saved as {:s}, which is not available'.format(name, schema['format']))
+    where = {} if where is None else where
+    for col in where.keys():
+        if col not in schema['columns']:
+            raise KeyError('Table {:s} has no column {:s}'.format(name, col))
+
+    # Columns to read: requested columns plus those needed for filtering
+    row_filters = [c for c in where.keys() if c not in schema['partition_cols']]
+    read_cols = None
+    if columns is not None:
+        read_cols = list(columns) + [c for c in row_filters if c not in columns]
+
+    dfs = []
+    for p in _partitions(path, schema['partition_cols'], where):
+        if STORE_FORMAT == 'parquet':
+            filters = [(c, 'in', _values(where[c])) for c in row_filters]
+            df = pd.read_parquet(_part_file(p), columns=read_cols, filters=filters if len(filters) > 0 else None)
+        else:
+            df = pd.read_pickle(_part_file(p))
+            if read_cols is not None:
+                df = df.loc[:, read_cols]
+        dfs.append(df)
+
+    if len(dfs) == 0:
+        df = pd.DataFrame(columns=read_cols if read_cols is not None else schema['columns'])
+    else:
+        df = pd.concat(dfs)
+    if STORE_FORMAT != 'parquet':
+        for c in row_filters:
+            df = df.loc[df[c].isin(_values(where[c])), :]
+
+    # Partitions may only contain some categories, restore the full set
+    for (c, cats) in schema['categories'].items():
+        if c in df.columns:
+            df[c] = df[c].astype(pd.CategoricalDtype(cats))
+    if columns is not None:
+        df = df.loc[:, list(columns)]
+    return df
+
+
+def load(tables, folder, where=None, columns=None):
+    """ Load tables from the store, reading only selected partitions, rows and columns.
+
+    Args:
+        tables: Table name, e.g. 'trials', or list of names
+        folder (str): Store folder
+        where (dict): Conditions as {column: value or list of values}, e.g.
+            {'ppid': [1, 2], 'feedback': 'hand'}. Conditions on partition columns
+            select files, others filter rows while reading. Conditions on columns
+            a table does not have raise a KeyError.
+        columns (list): Columns to return, default: all. A dict of lists by table
+            name can be used when loading several tables.
+
+    Returns a DataFrame, or a dict of DataFrames if tables is a list
+    """
+    if isinstance(tables, str):
+        return load_table(tables, folder, where=where, columns=columns)
+    result = {}
+    for name in tables:
+        cols = columns.get(name) if isinstance(columns, dict) else columns
+        result[name] = load_table(name, folder, where=where, columns=cols)
+    return result
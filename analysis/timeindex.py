@@ -0,0 +1,117 @@
+# Nearest-sample lookup and window extraction on sorted sample times
+
+import numpy as np
+
+
+def check_sample_times(times):
+    """ Raise ValueError unless sample times are sorted (non-decreasing) and not NaN,
+    which sample_index() requires
+
+    Args:
+        times (array): Sample time stamps, e.g. samples.time.values of one session
+    """
+    times = np.asarray(times)
+    if not np.all(times[1:] >= times[:-1]) or (len(times) > 0 and np.isnan(times[0])):
+        raise ValueError('Sample times must be sorted and not contain NaN')
+
+
+def sample_index(times, t, check=True):
+    """ Return the index of the sample closest to each time stamp, using binary
+    search instead of a full scan. Results are identical to
+    np.argmin(np.abs(times - t)) for each t, including the first sample
+    winning ties and index 0 for NaN time stamps.
+
+    Args:
+        times (array): Sorted sample time stamps
+        t: Time stamp or array of time stamps, same unit as times
+        check (bool): if True, verify that times are sorted (see check_sample_times())
+
+    Returns int if t is a scalar, otherwise an int array of the same shape
+    """
+    times = np.asarray(times)
+    if len(times) == 0:
+        raise ValueError('No samples to search')
+    if check:
+        check_sample_times(times)
+    scalar = np.ndim(t) == 0
+    t = np.atleast_1d(np.asarray(t, dtype=np.float64))
+
+    # Candidates: last sample before t and first sample at or after t
+    n = len(times)
+    i = np.searchsorted(times, t, side='left')
+    lo = np.clip(i - 1, 0, n - 1)
+    hi = np.clip(i, 0, n - 1)
+    d_lo = np.abs(times[lo] - t)
+    d_hi = np.abs(times[hi] - t)
+    ix = np.where(d_hi < d_lo, hi, lo)
+    d = np.minimum(d_lo, d_hi)
+
+    # Earlier samples may be at the same distance (duplicate time stamps or
+    # rounding of times - t), and argmin returns the first. Distances do not
+    # increase up to the candidate, so bisect for the first one that matches.
+    a = np.zeros_like(ix)
+    while np.any(a < ix):
+        m = (a + ix) // 2
+        ok = np.abs(times[m] - t) <= d
+        ix = np.where(ok, m, ix)
+        a = np.where(ok, a, m + 1)
+    ix[np.isnan(d)] = 0
+
+    if scalar:
+        return int(ix[0])
+    return ix
+
+
+def sample_windows(times, t_start, t_end, check=True):
+    """ Resolve many time windows at once. Window k contains samples
+    start[k]:stop[k], as selected by iloc[find_sample_index(t_start):find_sample_index(t_end)]
+
+    Args:
+        times (array): Sorted sample time stamps
+        t_start (array): Window start time stamps
+        t_end (array): Window end time stamps
+        check (bool): if True, verify that times are sorted
+
+    Returns (start, stop) int arrays
+    """
+    t_start = np.asarray(t_start, dtype=np.float64)
+    ix = sample_index(times, np.concatenate([t_start.ravel(), np.asarray(t_end, dtype=np.float64).ravel()]), check=check)
+    return (ix[0:t_start.size].reshape(t_start.shape), ix[t_start.size:].reshape(t_start.shape))
+
+
+def window_rows(start, stop):
+    """ Return sample row positions of all windows, concatenated, and the window
+    number of each row. Empty windows (stop <= start) contribute no rows.
+    Use e.g. samples.iloc[rows] to extract all traces in one step.
+
+    Args:
+        start, stop (array): Window bounds, see sample_windows()
+
+    Returns (rows, window) int arrays
+    """
+    start = np.asarray(start, dtype=np.intp).ravel()
+    lengths = np.maximum(np.asarray(stop, dtype=np.intp).ravel() - start, 0)
+    window = np.repeat(np.arange(len(start)), lengths)
+    offset = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return (np.repeat(start, lengths) + offset, window)
+
+
+def epochs(values, start, stop, fill=np.nan):
+    """ Cut sample values into an epoch array of shape (windows, samples, ...),
+    padded with fill after the end of shorter windows
+
+    Args:
+        values (array): Sample values, 1D or (samples x columns)
+        start, stop (array): Window bounds, see sample_windows()
+        fill: Value for samples beyond the end of a window
+
+    Returns (epoch array, number of samples per window)
+    """
+    values = np.asarray(values)
+    (rows, window) = window_rows(start, stop)
+    lengths = np.bincount(window, minlength=np.size(start))
+    width = lengths.max() if len(lengths) > 0 else 0
+    out = np.full((len(lengths), width) + values.shape[1:], fill, dtype=np.result_type(values, fill))
+    pos = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    out[window, pos] = values[rows]
+    return (out, lengths)
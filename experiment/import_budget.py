@@ -0,0 +1,77 @@
+"""
+vzgazetoolbox import-time budget
+
+Measures the time to import the toolbox in fresh Python processes, for
+analysis-only use (no Vizard) and for experiment use (simulated Vizard
+backend, including the Vizard-dependent classes). Also checks that the
+scientific Python stack is not imported until it is used. Exits with an
+error if any median import time exceeds its budget.
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+RUNS = 7
+
+# Budgets in ms. The full scientific stack alone takes ~800 ms to import.
+BUDGET_ANALYSIS = 100.0
+BUDGET_VIZARD = 200.0
+
+HEAVY_MODULES = ['numpy', 'pandas', 'matplotlib']
+
+_ANALYSIS = """
+import sys, json
+if sys.version_info[0] == 3:
+    from time import perf_counter
+else:
+    from time import clock as perf_counter
+t0 = perf_counter()
+import vzgazetoolbox
+t1 = perf_counter()
+print(json.dumps({'ms': (t1 - t0) * 1000.0, 'heavy': [m for m in %(heavy)r if m in sys.modules]}))
+"""
+
+_VIZARD = """
+import sys, json
+if sys.version_info[0] == 3:
+    from time import perf_counter
+else:
+    from time import clock as perf_counter
+t0 = perf_counter()
+import vzgazetoolbox
+from vzgazetoolbox import headless
+headless.install()
+from vzgazetoolbox import Experiment, SampleRecorder, ExperimentUI, SampleReplay
+t1 = perf_counter()
+print(json.dumps({'ms': (t1 - t0) * 1000.0, 'heavy': [m for m in %(heavy)r if m in sys.modules]}))
+"""
+
+
+def measure(code, runs=RUNS):
+    """ Run code in fresh interpreters, return median time and heavy modules imported """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    heavy = set()
+    for r in range(0, runs):
+        out = subprocess.check_output([sys.executable, '-c', code % {'heavy': HEAVY_MODULES}], env=env)
+        res = json.loads(out.decode('utf-8').strip().splitlines()[-1])
+        times.append(res['ms'])
+        heavy.update(res['heavy'])
+    times.sort()
+    return times[len(times) // 2], sorted(heavy)
+
+
+if __name__ == '__main__':
+    ok = True
+    for label, code, budget in [('analysis', _ANALYSIS, BUDGET_ANALYSIS),
+                                ('vizard (headless)', _VIZARD, BUDGET_VIZARD)]:
+        ms, heavy = measure(code)
+        passed = ms <= budget and len(heavy) == 0
+        ok = ok and passed
+        s = '{:18s} {:7.1f} ms (budget {:.0f} ms){:s} - {:s}'
+        extra = ', imported: ' + ', '.join(heavy) if len(heavy) > 0 else ''
+        print(s.format(label, ms, budget, extra, 'OK' if passed else 'OVER BUDGET'))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,99 @@
+"""
+Mid-Air Object Pointing Study - headless crash and resume check
+
+Runs a short session on the simulated Vizard backend with a journal and
+streaming archive, and kills the process after some trials without closing
+any files. The session is then resumed from its journal and killed again,
+and finally resumed and completed. After each run, the archive must contain
+every trial finished so far and the eye tracker validation. Trial blocks and
+some results are numpy values, which the journal and archive store as strings.
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+NUM_TRIALS = 20
+CRASH_AFTER = [6, 13]   # Finished trials at which the first and second run are killed
+OUTPUT_DIR = 'headless_output'
+SEED = 1
+
+
+def run_session(output_file, crash_after, resume):
+    """ Run (or resume) the session, killing the process once crash_after trials are finished """
+    from vzgazetoolbox import headless
+    sim = headless.install(frame_rate=90.0, seed=SEED)
+    sim.setResponder(rt=(0.3, 0.6))
+
+    import numpy as np
+    import viztask
+    from vzgazetoolbox.experiment import Experiment
+    from vzgazetoolbox.data import VAL_TAR_CR5
+
+    eyeTracker = sim.addEyeTracker(offset=(0.6, -0.4), noise=0.2, seed=SEED)
+    exp = Experiment(name='VRpoint', output_file=output_file)
+    exp.participant.id = 0
+    exp.participant.session = 1
+    exp.addTrials(NUM_TRIALS, params={'type': 'obj'}, list_params={'tar': list(range(1, NUM_TRIALS + 1))},
+                  block=np.int64(1))
+    exp.addSampleRecorder(eye_tracker=eyeTracker, cursor=False)
+    sim.ignoreNode(exp.recorder._cursor)
+
+    def Main():
+        if resume:
+            exp.resume(output_file + '_journal.jsonl')
+        else:
+            exp.openJournal()
+        exp.openArchive()
+        if not resume:
+            yield exp.recorder.validateEyeTracker(targets=VAL_TAR_CR5)
+
+        while not exp.done:
+            exp.startNextTrial(print_summary=False)
+            hit = yield viztask.waitKeyDown(' ')
+            exp.currentTrial.results.t_confirm = hit.time
+            exp.currentTrial.results.t_confirm_f32 = np.float32(hit.time)
+            yield viztask.waitTime(0.1)
+            exp.endCurrentTrial(print_summary=False)
+            if crash_after > 0 and len([t for t in exp.trials if t.done]) >= crash_after:
+                sys.stdout.flush()
+                os._exit(3) # Crash: no files are closed
+
+        exp.saveExperimentData()
+
+    sim.run(Main)
+
+
+def check_runs():
+    """ Run all sessions in separate processes and check the archive after each """
+    from vzgazetoolbox.datalog import readExperimentArchive
+
+    if not os.path.isdir(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
+    output_file = os.path.join(OUTPUT_DIR, 'VRpoint_resume_{:s}'.format(time.strftime('%Y%m%d_%H%M%S')))
+
+    ok = True
+    for run, crash_after in enumerate(CRASH_AFTER + [0]):
+        code = subprocess.call([sys.executable, os.path.abspath(__file__), output_file, str(crash_after), str(int(run > 0))])
+        archive = readExperimentArchive(output_file + '_all.jsonl.gz')
+        done = len([t for t in archive.get('trials', []) if t['status'] == 'done'])
+        validations = len(archive.get('eye_tracker_validations', []))
+        expected = crash_after if crash_after > 0 else NUM_TRIALS
+        run_ok = done == expected and validations == 1
+        print('Run {:d}: exit code {:d}, archive has {:d}/{:d} finished trials and {:d} validation(s) - {:s}'.format(
+              run + 1, code, done, expected, validations, 'OK' if run_ok else 'FAILED'))
+        ok = ok and run_ok
+
+    with open(output_file + '.tsv', 'r') as tf:
+        rows = len(tf.readlines()) - 1
+    print('Trial data file: {:d}/{:d} trials - {:s}'.format(rows, NUM_TRIALS, 'OK' if rows == NUM_TRIALS else 'FAILED'))
+    ok = ok and rows == NUM_TRIALS
+    return ok
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run_session(sys.argv[1], int(sys.argv[2]), bool(int(sys.argv[3])))
+    else:
+        sys.exit(0 if check_runs() else 1)
@@ -31,6 +31,12 @@ from vzgazetoolbox.data import VAL_TAR_CR5, VAL_TAR_C
 
 DEBUG = False
 
+# Record a timeline of trial phases (saved as <output_file>_trace.json, see chrome://tracing)
+TRACE = False
+
+# Set to the *_journal.jsonl file of an interrupted session to continue it
+RESUME_JOURNAL = None
+
 # Hardware Setup
 # -----------------------------------------------------------------------------
 
@@ -240,6 +246,8 @@ def wallText(msg, color=[1.0, 1.0, 1.0], scale=0.08):
 
 # Initialize experiment parameters
 exp = Experiment(name='VRpoint', debug=DEBUG, auto_save=False)
+if TRACE:
+    exp.enableTracing()
 
 exp.config.fade_dur     = 0.6
 exp.config.object_scale = 0.6
@@ -257,20 +265,21 @@ else:
     exp.config.ray_cursor   = False
     exp.config.gaze_cursor  = False
 
-# Load main trials (will ask for file)
-exp.addTrialsFromCSV(block=2, params={'type': 'obj'})
+if RESUME_JOURNAL is None:
+    # Load main trials (will ask for file)
+    exp.addTrialsFromCSV(block=2, params={'type': 'obj'})
 
-# Set up calibration trials 
-calib_params = {'type': 'cal',
-                'start_pos':'S',
-                'feedback': exp.trials[0].params.feedback}
-print('* Setting calibration feedback based on first trial: {:s}'.format(exp.trials[0].params.feedback))
-exp.addTrials(9, block=1, params=calib_params, list_params={'tar': list(range(1, 10))})
-exp.addTrials(9, block=1, params=calib_params, list_params={'tar': list(range(1, 10))})
+    # Set up calibration trials 
+    calib_params = {'type': 'cal',
+                    'start_pos':'S',
+                    'feedback': exp.trials[0].params.feedback}
+    print('* Setting calibration feedback based on first trial: {:s}'.format(exp.trials[0].params.feedback))
+    exp.addTrials(9, block=1, params=calib_params, list_params={'tar': list(range(1, 10))})
+    exp.addTrials(9, block=1, params=calib_params, list_params={'tar': list(range(1, 10))})
 
-# Randomize (also sorts by block)
-exp.randomizeTrials()
-print(exp.trials)
+    # Randomize (also sorts by block)
+    exp.randomizeTrials()
+    print(exp.trials)
 
 # Gaze and hand recording
 exp.addSampleRecorder(eye_tracker=eyeTracker, cursor=True)
@@ -427,8 +436,13 @@ occ_right.visible(False)
 
 def Main():
 
-    # Request participant info
-    yield exp.requestParticipantData()
+    # Request participant info, or continue an interrupted session
+    if RESUME_JOURNAL is None:
+        yield exp.requestParticipantData()
+        exp.openJournal()
+    else:
+        exp.resume(RESUME_JOURNAL)
+    exp.openArchive()
     
     # Read offset calibration
     wrist_offset = [0, 0, 0]
@@ -466,7 +480,8 @@ def Main():
     val = yield exp.recorder.validateEyeTracker(targets=VAL_TAR_CR5)
     print(val)
 
-    yield wallText('Nun kalibrieren wir noch deine Zeigebewegung.\nBitte schaue und zeige jeweils auf den grünen Punkt\nund drücke die linke Controller-Taste!')
+    if RESUME_JOURNAL is None or not exp.trials[0].done:
+        yield wallText('Nun kalibrieren wir noch deine Zeigebewegung.\nBitte schaue und zeige jeweils auf den grünen Punkt\nund drücke die linke Controller-Taste!')
     
     # Main Trial Loop
     cal_done = False
@@ -517,7 +532,8 @@ def Main():
 
         # World fade in
         if exp.currentTrial.params.type == 'obj':
-            yield fadeExposure(fader, 0, exp.config.fade_dur)
+            with exp.tracer.span('fade in', cat='phase'):
+                yield fadeExposure(fader, 0, exp.config.fade_dur)
         
         # Calibration trial: wait for button press only            
         if exp.currentTrial.params.type == 'cal':
@@ -527,9 +543,12 @@ def Main():
         # Pointing trial: wait for fixation, then show object
         elif exp.currentTrial.params.type == 'obj':
             exp.currentTrial.results.t_fix_on = viz.tick()
-            yield exp.recorder.waitGazeNearTarget(fix.getPosition(), tolerance=1.5)
-            exp.currentTrial.results.t_fixated = viz.tick()
-            yield viztask.waitTime(0.5)
+            with exp.tracer.span('fixation', cat='phase'):
+                yield exp.recorder.waitGazeNearTarget(fix.getPosition(), tolerance=1.5)
+                exp.currentTrial.results.t_fixated = viz.tick()
+                exp.recorder.setDataQualityTarget(fix)
+                yield viztask.waitTime(0.5)
+                exp.recorder.setDataQualityTarget(None)
             
             # Set occluder based on trial file
             if exp.currentTrial.params.occluded == 'left':
@@ -551,8 +570,10 @@ def Main():
                        yaw=exp.currentTrial.params.obj_angle,
                        material=exp.currentTrial.params.obj_material)
             exp.recorder.custom_vars.object_visible = 1
+            exp.tracer.instant('object onset', cat='phase')
         
         # Wait until button press to confirm pointing
+        response = exp.tracer.span('response', cat='phase')
         if HAS_VR:            
             hit = yield viztask.waitSensorDown(None, steamvr.BUTTON_TRIGGER)
             exp.currentTrial.results.t_confirm = viz.tick()
@@ -561,6 +582,7 @@ def Main():
             hit = yield viztask.waitKeyDown(' ')
             exp.currentTrial.results.t_confirm = hit.time
             exp.currentTrial.results.button = 'spacebar'
+        response.end()
 
         # Save position and vector data for this trial
         # Combined EFRC
@@ -631,11 +653,13 @@ def Main():
                 
         # World fade out
         if exp.currentTrial.params.type == 'obj':
-            yield fadeExposure(fader, -6, exp.config.fade_dur)
+            with exp.tracer.span('fade out', cat='phase'):
+                yield fadeExposure(fader, -6, exp.config.fade_dur)
             
     
     exp.saveTrialData(rec_data='single')
-    exp.saveExperimentData(exp.output_file_name + '_all.json')
+    exp.saveExperimentData()
+    exp.saveTrace()
     viz.quit()
 
 
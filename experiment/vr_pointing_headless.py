@@ -0,0 +1,198 @@
+"""
+Mid-Air Object Pointing Study - headless load test
+
+Runs a session with the same trial structure as vr_pointing.py (fade-in,
+fixation, object onset, response, save, fade-out) on the simulated Vizard
+backend, as fast as possible. Used to benchmark recording, saving and
+validation throughput without VR hardware.
+"""
+
+import os
+import sys
+import math
+import time
+
+from vzgazetoolbox import headless
+
+if sys.version_info[0] == 3:
+    from time import perf_counter
+else:
+    from time import clock as perf_counter
+
+NUM_TRIALS = 160
+FRAME_RATE = 90.0
+OUTPUT_DIR = 'headless_output'
+SEED = 1
+
+sim = headless.install(frame_rate=FRAME_RATE, seed=SEED)
+sim.setResponder(rt=(0.6, 1.2))
+
+import viz
+import vizmat
+import viztask
+import vizshape
+
+from vzgazetoolbox.experiment import *
+from vzgazetoolbox.data import VAL_TAR_CR5
+
+
+# Simulated devices
+# -----------------------------------------------------------------------------
+
+eyeTracker = sim.addEyeTracker(offset=(0.6, -0.4), noise=0.2, missing=0.01, seed=SEED)
+sim.addSource(viz.MainView, headless.sinusoidMotion(pos=(0.0, 1.7, -1.5)))
+
+wrist = viz.addGroup()
+sim.addSource(wrist, headless.sinusoidMotion(pos=(0.2, 1.1, -1.2), pos_amp=(0.05, 0.05, 0.1),
+                                             euler_amp=(10.0, 10.0, 5.0), period=1.5))
+index = vizshape.addSphere(0.0125, parent=wrist)
+index.setPosition([0.0, 0.0, 0.15])
+
+
+# Experiment Setup
+# -----------------------------------------------------------------------------
+
+if not os.path.isdir(OUTPUT_DIR):
+    os.makedirs(OUTPUT_DIR)
+exp = Experiment(name='VRpoint', auto_save=False,
+                 output_file=os.path.join(OUTPUT_DIR, 'VRpoint_headless_{:s}'.format(time.strftime('%Y%m%d_%H%M%S'))))
+exp.enableTracing()
+exp.participant.id = 0
+exp.participant.session = 1
+
+exp.config.fade_dur     = 0.6
+exp.config.object_scale = 0.6
+
+# Calibration trials and object trials, cycling through the levels of the main study
+objects = ['unten_sym', 'unten_asym', 'mitte_sym', 'mitte_asym', 'oben_sym', 'oben_asym', 'sphere']
+calib_params = {'type': 'cal', 'start_pos': 'S', 'feedback': 'hand'}
+exp.addTrials(9, block=1, params=calib_params, list_params={'tar': list(range(1, 10))})
+exp.addTrials(9, block=1, params=calib_params, list_params={'tar': list(range(1, 10))})
+n_obj = NUM_TRIALS - 18
+exp.addTrials(n_obj, block=2, params={'type': 'obj', 'feedback': 'hand', 'start_pos': 'S', 'table_height': 0.8},
+              list_params={'object': [objects[i % len(objects)] for i in range(0, n_obj)],
+                           'obj_angle': [(i * 45) % 360 for i in range(0, n_obj)]})
+exp.randomizeTrials(seed=SEED)
+
+exp.addSampleRecorder(eye_tracker=eyeTracker, cursor=False)
+sim.ignoreNode(exp.recorder._cursor)
+exp.recorder.setCustomVar('button', 0)
+exp.recorder.setCustomVar('object_visible', 0)
+exp.recorder.addTrackedNode(wrist, 'wrist')
+exp.recorder.addTrackedNode(index, 'index')
+
+# Fixation and calibration targets, objects
+fix = vizshape.addSphere(0.025, color=viz.RED)
+fix.disable(viz.INTERSECTION)
+fix.visible(False)
+fix.setPosition([0.0, 1.8, 2.0])
+cal = vizshape.addSphere(0.025, color=viz.GREEN)
+cal.disable(viz.INTERSECTION)
+cal.visible(False)
+cal_pos = {t: [(t % 3 - 1) * 1.0, 0.8 + (t // 3) * 1.0, 2.0] for t in range(1, 10)}
+allobj = {}
+for o in objects:
+    allobj[o] = vizshape.addSphere(exp.config.object_scale / 4.0)
+    allobj[o].visible(False)
+
+
+def fade(duration):
+    """ Stand-in for fadeExposure(): per-frame updates for the fade duration """
+    t_end = viz.tick() + duration
+    while viz.tick() < t_end:
+        yield viztask.waitTime(0.01)
+
+
+# Experiment Task
+# -----------------------------------------------------------------------------
+
+timing = {'validation': [], 'end_trial': [], 'save': []}
+
+def Main():
+
+    t0 = perf_counter()
+    val = yield exp.recorder.validateEyeTracker(targets=VAL_TAR_CR5)
+    timing['validation'].append(perf_counter() - t0)
+    print('Validation: acc={:.2f} sd={:.2f} rmsi={:.2f}'.format(val.acc, val.sd, val.rmsi))
+
+    while not exp.done:
+        exp.startNextTrial(print_summary=False)
+        trial = exp.currentTrial
+
+        if trial.params.type == 'cal':
+            cal.setPosition(cal_pos[trial.params.tar])
+            cal.visible(True)
+            trial.results.t_fix_on = -1.0
+            trial.results.t_fixated = -1.0
+        else:
+            with exp.tracer.span('fade in', cat='phase'):
+                yield fade(exp.config.fade_dur)
+            fix.visible(True)
+            trial.results.t_fix_on = viz.tick()
+            with exp.tracer.span('fixation', cat='phase'):
+                yield exp.recorder.waitGazeNearTarget(fix.getPosition(), tolerance=1.5)
+                trial.results.t_fixated = viz.tick()
+                exp.recorder.setDataQualityTarget(fix)
+                yield viztask.waitTime(0.5)
+                exp.recorder.setDataQualityTarget(None)
+            fix.visible(False)
+            obj = allobj[trial.params.object]
+            obj.setPosition([0.0, 1.1, 0.0])
+            obj.setEuler([trial.params.obj_angle, 0.0, 0.0])
+            obj.visible(True)
+            exp.recorder.custom_vars.object_visible = 1
+            exp.tracer.instant('object onset', cat='phase')
+
+        with exp.tracer.span('response', cat='phase'):
+            hit = yield viztask.waitKeyDown(' ')
+        exp.recorder.custom_vars.button = 1
+        trial.results.t_confirm = hit.time
+        trial.results.button = 'spacebar'
+        gaze_end = exp.recorder.getCurrentGazePoint()
+        trial.results.gaze_x = gaze_end[0]
+        trial.results.gaze_y = gaze_end[1]
+        trial.results.gaze_z = gaze_end[2]
+        hc = index.getPosition(viz.ABS_GLOBAL)
+        trial.results.index_x = hc[0]
+        trial.results.index_y = hc[1]
+        trial.results.index_z = hc[2]
+        yield viztask.waitFrame(1)
+        exp.recorder.custom_vars.button = 0
+
+        cal.visible(False)
+        for o in allobj.values():
+            o.visible(False)
+        exp.recorder.custom_vars.object_visible = 0
+
+        yield viztask.waitTime(0.25)
+        t0 = perf_counter()
+        exp.endCurrentTrial(print_summary=False)
+        timing['end_trial'].append(perf_counter() - t0)
+
+        if trial.params.type == 'obj':
+            with exp.tracer.span('fade out', cat='phase'):
+                yield fade(exp.config.fade_dur)
+
+    t0 = perf_counter()
+    exp.saveTrialData(rec_data='single')
+    exp.saveExperimentData()
+    timing['save'].append(perf_counter() - t0)
+    exp.saveTrace()
+
+
+t_start = perf_counter()
+sim.run(Main)
+t_total = perf_counter() - t_start
+
+stats = sim.stats()
+n_samples = sum([len(t.samples) for t in exp.trials])
+print('{:d} trials, {:d} frames ({:.1f} s simulated at {:.0f} Hz) in {:.2f} s ({:.0f}x real time)'.format(
+      len(exp.trials), stats['frames'], stats['sim_time'], FRAME_RATE, t_total, stats['sim_time'] / t_total))
+print('Recorded samples: {:d} ({:.1f} us per frame incl. recording)'.format(n_samples, stats['wall_time'] / stats['frames'] * 1e6))
+print('Validation: {:.3f} s, endCurrentTrial: mean {:.2f} ms / max {:.2f} ms, final save: {:.2f} s'.format(
+      sum(timing['validation']), 1000.0 * sum(timing['end_trial']) / len(timing['end_trial']),
+      1000.0 * max(timing['end_trial']), sum(timing['save'])))
+dq = [t.results for t in exp.trials if 'dq_acc' in t.results and t.results.dq_acc is not None]
+print('Streaming data quality: {:.1f}% missing, RMS-S2S {:.3f} deg, fixation accuracy {:.2f} deg'.format(
+      100.0 * sum([r.dq_missing for r in dq]) / sum([r.dq_samples for r in dq]),
+      sum([r.dq_rmsi for r in dq]) / len(dq), sum([r.dq_acc for r in dq]) / len(dq)))
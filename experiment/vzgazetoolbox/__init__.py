@@ -1,16 +1,76 @@
 # -*- coding: utf-8 -*-
 
+import sys
+import importlib
+
 from .data import *
-from .stats import * 
+from .stats import *
+from .datalog import *
+from .samplestream import *
+from .trajectory import *
+from .tracing import *
+
+# Geometry functions have generic names (normalize, slerp, ...) and are only
+# available from their module, e.g. vzgazetoolbox.geometry.eulerToMatrix
+from . import geometry
+
+# Vizard-dependent submodules and the names they provide. On Python 3.7+,
+# these are only imported on first access (e.g. vzgazetoolbox.Experiment).
+_VIZARD_EXPORTS = {
+    'experiment':   ['Experiment', 'Trial', 'TrialStore', 'STATE_NEW', 'STATE_RUNNING', 'STATE_DONE'],
+    'ui':           ['ExperimentUI'],
+    'vrfunctions':  ['showVRText', 'waitVRText'],
+    'recorder':     ['SampleRecorder'],
+    'replay':       ['SampleReplay', 'OverlayReplay'],
+    'assets':       ['getModelTemplate', 'addModelInstance', 'getModelCacheInfo', 'clearModelCache'],
+    'eyeball':      ['Eyeball'],
+}
+_VIZARD_NAMES = dict([(name, sub) for sub, names in _VIZARD_EXPORTS.items() for name in names])
 
 try:
     import viz
+    _HAS_VIZARD = True
+except ImportError:
+    _HAS_VIZARD = False
+    print('Note: vzgazetoolbox is not running under Vizard, or Vizard packages could not be imported. Only analysis tools will be available.')
+
+
+if sys.version_info[:2] >= (3, 7):
+    def __getattr__(name):
+        """ Import Vizard-dependent submodules on first access """
+        if name in _VIZARD_EXPORTS or name in _VIZARD_NAMES:
+            sub = name if name in _VIZARD_EXPORTS else _VIZARD_NAMES[name]
+            try:
+                module = importlib.import_module('.' + sub, __name__)
+            except ImportError:
+                if _HAS_VIZARD:
+                    raise
+                # Without Vizard, behave like a missing attribute (e.g. for hasattr)
+                raise AttributeError('module {:s} has no attribute {:s} (requires Vizard)'.format(__name__, name))
+            if sub == name:
+                return module
+            value = getattr(module, name)
+            globals()[name] = value
+            return value
+        raise AttributeError('module {:s} has no attribute {:s}'.format(__name__, name))
+
+
+    def __dir__():
+        if _HAS_VIZARD:
+            return sorted(set(globals().keys()) | set(_VIZARD_NAMES.keys()))
+        return sorted(globals().keys())
+
+elif _HAS_VIZARD:
     from .experiment import *
     from .ui import *
     from .vrfunctions import *
     from .recorder import *
-    from .replay import * 
+    from .replay import *
+    from .assets import *
     from .eyeball import *
 
-except ImportError:
-    print('Note: vzgazetoolbox is not running under Vizard, or Vizard packages could not be imported. Only analysis tools will be available.')
+# Names exported by a star import. Vizard names are resolved by the lazy __getattr__ above.
+__all__ = (data.__all__ + stats.__all__ + datalog.__all__ + samplestream.__all__ +
+           trajectory.__all__ + tracing.__all__)
+if _HAS_VIZARD:
+    __all__ += [n for sub in sorted(_VIZARD_EXPORTS.keys()) for n in _VIZARD_EXPORTS[sub]]
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Vizard gaze tracking toolbox
+# Shared model template cache
+
+import os
+import sys
+
+if sys.version_info[0] == 3:
+    from time import perf_counter
+else:
+    from time import clock as perf_counter
+
+import viz
+
+# Loaded template nodes, by absolute model file path
+_templates = {}
+
+
+def getModelTemplate(model_file):
+    """ Return the (hidden) template node for a model file, such as
+    a glTF / GLB / OSGB file. The file is only loaded and parsed on first use.
+
+    Args:
+        model_file (str): Path to model file
+    """
+    key = os.path.abspath(model_file)
+    if key not in _templates:
+        t_start = perf_counter()
+        node = viz.addChild(key)
+        node.visible(False)
+        _templates[key] = {'node': node,
+                           'load_time': (perf_counter() - t_start) * 1000.0,
+                           'instances': 0}
+    return _templates[key]['node']
+
+
+def addModelInstance(model_file, parent=viz.WORLD, visible=True):
+    """ Add a new instance of a model file to the scene. The model is copied
+    from the cached template node, so geometry and textures are shared and the file
+    is parsed only once. Each instance has its own sub-nodes, so e.g. colors
+    can be changed per instance.
+
+    Args:
+        model_file (str): Path to model file
+        parent: Parent node of the new instance
+        visible (bool): if False, instance starts out invisible
+    """
+    template = getModelTemplate(model_file)
+    node = template.copy(parent=parent)
+    node.visible(visible)
+    _templates[os.path.abspath(model_file)]['instances'] += 1
+    return node
+
+
+def getModelCacheInfo():
+    """ Return load time (ms) and instance count of all cached models,
+    as a dict of model file -> {'load_time': ..., 'instances': ...}
+    """
+    info = {}
+    for key, t in _templates.items():
+        info[key] = {'load_time': t['load_time'], 'instances': t['instances']}
+    return info
+
+
+def clearModelCache():
+    """ Remove all template nodes. Existing instances are not affected. """
+    for t in _templates.values():
+        t['node'].remove()
+    _templates.clear()
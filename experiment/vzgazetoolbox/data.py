@@ -3,20 +3,26 @@
 # Vizard gaze tracking toolbox
 # Data structures and classes that do not depend on Vizard
 
+import sys
 import json
 import copy
 import pickle
+import itertools
+from array import array
 
-try:
-    # Some functionality such as plotting is only available when a scientific 
-    # Python stack is installed, which by default is not the case in Vizard.
-    import numpy as np
-    import pandas as pd
-    import matplotlib.pyplot as plt
-    _HAS_SCI_PKGS = True
+from .lazy import LazyModule, modulesAvailable
+from .samplestream import _convert_value, _open_sample_file, _text_reader
 
-except ImportError:
-    _HAS_SCI_PKGS = False
+# Some functionality such as plotting is only available when a scientific 
+# Python stack is installed, which by default is not the case in Vizard.
+# The packages are only imported when first used.
+_HAS_SCI_PKGS = modulesAvailable('numpy', 'pandas', 'matplotlib')
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+plt = LazyModule('matplotlib.pyplot')
+
+__all__ = ['VAL_TAR_C', 'VAL_TAR_CR5', 'VAL_TAR_SQ5', 'VAL_TAR_CR10', 'VAL_TAR_SQ10', 'VAL_TAR_CR15',
+           'VAL_TAR_SQ15', 'ParamSet', 'readTrialTable', 'SampleTable', 'ValidationResult']
 
 
 # single central target (default)
@@ -166,20 +172,50 @@ VAL_TAR_SQ15 = [[0.0,  0.0,   6.0],
 
 
 
+_SCALAR_TYPES = frozenset([type(None), bool, int, float, str, type(u'')])
+_param_versions = itertools.count(1)
+
+
 class ParamSet(object):
     """ Stores study or trial parameters that can be accessed 
     using both key (x['key']) and dot notation (x.key) for 
-    convenience. Supports JSON im-/export. """
+    convenience. Supports JSON im-/export.
+
+    snapshot() returns a copy in O(1), which shares the parameters until
+    either object is changed. Each change assigns a new version number
+    (see getVersion), so consumers can cheaply check whether anything
+    changed since they last looked.
+
+    A parameter with the same name as a method (e.g. 'keys' or 'update')
+    hides that method on the instance. Code that handles arbitrary
+    parameters should call methods through the class, e.g. ParamSet.keys(p). """
+
+    # Parameters are kept in the instance __dict__ so that reading them is
+    # as fast as regular attribute access; only writes are intercepted.
+    __slots__ = ('__dict__', '_shared', '_version')
 
     def __init__(self, input_dict=None):
+        _set = object.__setattr__
+        _set(self, '_shared', False)
         if input_dict is not None:
             if type(input_dict) not in [dict, ParamSet]:
                 raise ValueError('input_dict must be a dict or ParamSet!')
             
             if type(input_dict) == ParamSet:
-                self.__dict__ = input_dict.__dict__.copy()
+                _set(self, '__dict__', input_dict.__dict__)
+                _set(self, '_shared', True)
+                _set(input_dict, '_shared', True)
             else:
-                self.__dict__ = input_dict.copy()
+                _set(self, '__dict__', input_dict.copy())
+        _set(self, '_version', next(_param_versions))
+
+
+    def _changed(self):
+        """ Unshare parameters before writing and assign a new version """
+        if self._shared:
+            object.__setattr__(self, '__dict__', self.__dict__.copy())
+            object.__setattr__(self, '_shared', False)
+        _set_version(self, next(_param_versions))
     
     
     def __getitem__(self, key):
@@ -187,8 +223,39 @@ class ParamSet(object):
     
     
     def __setitem__(self, key, value):
+        self._changed()
         self.__dict__[key] = value
 
+
+    def __delitem__(self, key):
+        if key not in self.__dict__:
+            raise KeyError(key)
+        self._changed()
+        del self.__dict__[key]
+
+
+    def __setattr__(self, key, value):
+        # Inlined _changed(), as this is the common case for per-frame updates
+        if self._shared:
+            self._changed()
+        self.__dict__[key] = value
+        _set_version(self, next(_param_versions))
+
+
+    def __delattr__(self, key):
+        if key not in self.__dict__:
+            raise AttributeError(key)
+        self._changed()
+        del self.__dict__[key]
+
+
+    def __reduce__(self):
+        return (ParamSet, (self.__dict__.copy(),))
+
+
+    def __copy__(self):
+        return ParamSet.snapshot(self)
+
     
     def __repr__(self):
         return repr(self.__dict__)
@@ -222,15 +289,52 @@ class ParamSet(object):
 
 
     def __contains__(self, key):
-        if key in self.__dict__.keys():
-            return True
-        else:
-            return False
+        return key in self.__dict__
+
+
+    def getVersion(self):
+        """ Return the version number, which changes whenever a parameter is
+        set or removed. Changes within mutable values (e.g. appending to a list
+        parameter) are not detected. """
+        return self._version
+
+
+    def keys(self):
+        """ Return a list of parameter names """
+        return list(self.__dict__.keys())
+
+
+    def update(self, params):
+        """ Set multiple parameters at once
+
+        Args:
+            params: dict or ParamSet of parameters to set
+        """
+        if type(params) == ParamSet:
+            params = params.__dict__
+        self._changed()
+        self.__dict__.update(params)
+
+
+    def snapshot(self):
+        """ Return a copy of this ParamSet in O(1). Parameters are shared until
+        either ParamSet is changed, mutable values are not copied. """
+        ps = ParamSet.__new__(ParamSet)
+        _set = object.__setattr__
+        _set(ps, '__dict__', self.__dict__)
+        _set(ps, '_shared', True)
+        _set(ps, '_version', self._version)
+        _set(self, '_shared', True)
+        return ps
 
 
     def toDict(self):
         """ Return a copy of all attributes as a dict """
-        return copy.deepcopy(self.__dict__)
+        d = self.__dict__.copy()
+        for key, value in d.items():
+            if type(value) not in _SCALAR_TYPES:
+                d[key] = copy.deepcopy(value)
+        return d
 
     
     def toJSON(self):
@@ -248,6 +352,12 @@ class ParamSet(object):
             jf.write(json.dumps(self.__dict__))
 
 
+    @classmethod
+    def fromJSON(cls, json_str):
+        """ Create a new ParamSet from a JSON string """
+        return ParamSet(input_dict=json.loads(json_str))
+
+
     @classmethod
     def fromJSONFile(cls, json_file):
         """ Create a new ParamSet from a JSON file """
@@ -255,6 +365,217 @@ class ParamSet(object):
             return ParamSet(input_dict=json.load(jf))
 
 
+_set_version = ParamSet._version.__set__
+
+
+
+def _convert_cells(values):
+    """ Convert a column of string cells to int, float or str per cell, like
+    _convert_value. Each distinct cell value is only converted once, which is fast
+    for typical trial table columns with few distinct values (factor levels). """
+    try:
+        return [int(v) for v in values]
+    except ValueError:
+        pass
+    cache = dict([(v, _convert_value(v)) for v in set(values)])
+    return [cache[v] for v in values]
+
+
+def _convert_typed(values, dtype):
+    """ Convert a column of string cells to a declared data type """
+    if dtype in ['int', int]:
+        return [int(v) for v in values]
+    elif dtype in ['float', float]:
+        return [float(v) for v in values]
+    elif dtype in ['str', str]:
+        return list(values)
+    elif dtype == 'category':
+        # Share one string object per distinct value
+        levels = {}
+        return [levels.setdefault(v, v) for v in values]
+    elif dtype in ['bool', bool]:
+        return [v.strip().lower() in ['1', 'true', 'yes'] for v in values]
+    raise ValueError('Unknown dtype specified: {:s}'.format(str(dtype)))
+
+
+def readTrialTable(file_name, sep='\t', dtypes=None, required=None, encoding=None):
+    """ Read a trial parameter table (.tsv, .csv, optionally gzip-compressed)
+    column by column. Without a declared dtype, each cell is converted to int or
+    float where possible, otherwise kept as str (as in Experiment.addTrialsFromCSV).
+
+    Args:
+        file_name (str): Input file name
+        sep (str): Field separator in input file
+        dtypes (dict): Optional column name -> data type, one of
+            'int', 'float', 'str', 'category' (str with shared values) or 'bool'
+        required (list): Column names that must be present in the file
+        encoding (str): Text encoding, None for the system default
+
+    Returns: tuple (list of column names, dict of column name -> list of values)
+    """
+    with _open_sample_file(file_name) as f:
+        reader = _text_reader(f, sep, encoding=encoding)
+        try:
+            header = next(reader)
+        except StopIteration:
+            header = []
+        missing = [c for c in list(required or []) + list((dtypes or {}).keys()) if c not in header]
+        if len(missing) > 0:
+            raise ValueError('Required columns missing in trial file {:s}: {:s}'.format(file_name, ', '.join(missing)))
+        rows = [r for r in reader if len(r) > 0]
+
+    # Transpose rows to columns, padding short rows with empty cells
+    n_cols = len(header)
+    if any([len(r) != n_cols for r in rows]):
+        rows = [(r + [''] * n_cols)[0:n_cols] for r in rows]
+    cols = list(zip(*rows)) if len(rows) > 0 else [()] * n_cols
+
+    columns = {}
+    for c, values in zip(header, cols):
+        if dtypes is not None and c in dtypes:
+            columns[c] = _convert_typed(values, dtypes[c])
+        else:
+            columns[c] = _convert_cells(values)
+    return (header, columns)
+
+
+
+# Typed array codes for numeric sample columns
+_FLOAT_TYPECODE = 'd'
+if sys.version_info[0] == 3:
+    _INT_TYPECODE = 'q'
+else:
+    _INT_TYPECODE = 'l'
+
+# Placeholder for fields that are missing in some samples
+_NO_VALUE = object()
+
+
+class SampleTable(object):
+    """ Read-only columnar storage for a list of sample dicts, e.g. the raw
+    samples of one validation target. Columns that contain only floats or
+    only ints are stored as typed arrays, all others as lists. Tables with
+    the same fields share one field tuple.
+
+    Indexing and iteration return samples as dicts, so a SampleTable can be
+    used like the list of dicts it was created from.
+    """
+
+    __slots__ = ('fields', '_columns', '_len')
+
+    # Recently used field tuples, shared between tables
+    _schemas = {}
+
+    def __init__(self, fields=(), columns=None, length=0):
+        """ Create a table from field names and column data. Use
+        SampleTable.fromSamples() to convert a list of sample dicts.
+
+        Args:
+            fields (tuple): Field names
+            columns (list): One array or list per field
+            length (int): Number of samples
+        """
+        fields = tuple(fields)
+        self.fields = SampleTable._schemas.setdefault(fields, fields)
+        self._columns = list(columns) if columns is not None else []
+        self._len = length
+
+
+    @classmethod
+    def fromSamples(cls, samples):
+        """ Convert a list of sample dicts to a SampleTable
+
+        Args:
+            samples (list): List of dicts, one per sample
+        """
+        if type(samples) == SampleTable:
+            return samples
+        fields = []
+        seen = set()
+        for sam in samples:
+            for key in sam:
+                if key not in seen:
+                    seen.add(key)
+                    fields.append(key)
+
+        columns = []
+        for key in fields:
+            values = [sam.get(key, _NO_VALUE) for sam in samples]
+            columns.append(_typedColumn(values))
+        return cls(fields, columns, len(samples))
+
+
+    def __len__(self):
+        return self._len
+
+
+    def __getitem__(self, idx):
+        """ Return sample idx as a new dict, or a list of dicts for a slice """
+        if type(idx) == slice:
+            return [self[i] for i in range(*idx.indices(self._len))]
+        if idx < 0:
+            idx += self._len
+        if idx < 0 or idx >= self._len:
+            raise IndexError('SampleTable index out of range')
+        s = {}
+        for key, col in zip(self.fields, self._columns):
+            v = col[idx]
+            if v is not _NO_VALUE:
+                s[key] = v
+        return s
+
+
+    def __iter__(self):
+        for idx in range(0, self._len):
+            yield self[idx]
+
+
+    def __reduce__(self):
+        return (SampleTable, (self.fields, self._columns, self._len))
+
+
+    def __copy__(self):
+        return self
+
+
+    def __deepcopy__(self, memo):
+        # Immutable, so copies can share all data
+        return self
+
+
+    def __repr__(self):
+        return '<SampleTable: {:d} samples, {:d} fields>'.format(self._len, len(self.fields))
+
+
+    def column(self, field):
+        """ Return all values of a field as array or list (do not modify!)
+
+        Args:
+            field (str): Field name, e.g. 'targetGaze_X'
+        """
+        return self._columns[self.fields.index(field)]
+
+
+    def toList(self):
+        """ Return samples as a list of dicts """
+        return [self[idx] for idx in range(0, self._len)]
+
+
+
+def _typedColumn(values):
+    """ Return a typed array for lists of only floats or only ints
+    (booleans excluded), or the list itself otherwise """
+    types = set([type(v) for v in values])
+    try:
+        if types == set([float]):
+            return array(_FLOAT_TYPECODE, values)
+        elif types == set([int]):
+            return array(_INT_TYPECODE, values)
+    except OverflowError:
+        pass
+    return values
+
+
 
 class ValidationResult(object):
     """ Container to hold results and raw data of a gaze validation sequence 
@@ -263,7 +584,10 @@ class ValidationResult(object):
         result (dict): Dict of result measures
         metadata (dict): Participant metadata dict
         targets: List of result dicts per target
-        samples: List of raw sample data per target
+        samples: List of raw sample data per target (read-only SampleTable objects)
+
+    Raw samples are stored in columnar form and shared between copies, so
+    copy() is cheap. toDict() / toJSON() return samples as lists of dicts.
     """
     def __init__(self, result=None, metadata={}, targets=None, samples=None):
 
@@ -281,6 +605,8 @@ class ValidationResult(object):
         # By-target data
         self.targets = targets	# by-target list of validation result dicts
         self.samples = samples	# by-target list of raw sample data
+        if samples is not None:
+            self.samples = [SampleTable.fromSamples(s) for s in samples]
 
 
     def __str__(self):
@@ -293,14 +619,49 @@ class ValidationResult(object):
         return out
 
 
+    def copy(self):
+        """ Return a copy of this result. Raw sample tables are read-only
+        and shared with the copy. """
+        vr = copy.copy(self)
+        vr.metadata = copy.deepcopy(self.metadata)
+        vr.targets = copy.deepcopy(self.targets)
+        if self.samples is not None:
+            vr.samples = list(self.samples)
+        return vr
+
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+
     def toDict(self):
         """ Return a copy of all results as a dict """
-        return copy.deepcopy(self.__dict__)
+        d = {}
+        for key, value in self.__dict__.items():
+            if key == 'samples' and value is not None:
+                d[key] = [SampleTable.fromSamples(s).toList() for s in value]
+            else:
+                d[key] = copy.deepcopy(value)
+        return d
+
+
+    @classmethod
+    def fromDict(cls, val_dict):
+        """ Create a ValidationResult from a dict created by toDict()
+
+        Args:
+            val_dict (dict): Validation result dict, e.g. loaded from JSON
+        """
+        vr = cls()
+        vr.__dict__.update(val_dict)
+        if vr.samples is not None:
+            vr.samples = [SampleTable.fromSamples(s) for s in vr.samples]
+        return vr
 
     
     def toJSON(self):
         """ Return JSON representation of validation data """
-        return json.dumps(self.__dict__)
+        return json.dumps(self.toDict())
 
 
     def toJSONFile(self, json_file):
@@ -310,7 +671,7 @@ class ValidationResult(object):
             json_file (str): Output file name
         """
         with open(json_file, 'w') as jf:
-            jf.write(json.dumps(self.__dict__))
+            jf.write(self.toJSON())
 
 
     def toPickleFile(self, pickle_file='val_result.pkl'):
@@ -393,15 +754,10 @@ class ValidationResult(object):
                 ax.set_ylabel('Vertical Position (degrees)')
 
                 for idx, t in enumerate(self.targets):
-                    sam = self.samples[idx]
+                    sam = SampleTable.fromSamples(self.samples[idx])
                     if t['d'] == d:
                         ax.plot(t['x'], t['y'], 'k+', markersize=12)
-                        tar_samX = []
-                        tar_samY = []
-                        for s in sam:
-                            tar_samX.append(s['targetGaze_X'])
-                            tar_samY.append(s['targetGaze_Y'])
-                        ax.plot(tar_samX, tar_samY, '.',  markersize=3)
+                        ax.plot(sam.column('targetGaze_X'), sam.column('targetGaze_Y'), '.',  markersize=3)
                         ax.plot(t['avgX'], t['avgY'], 'k.', markersize=6)
                         ax.annotate('{:.2f}'.format(t[measure]), xy=(t['x'], t['y']), xytext=(0, 10),
                                     textcoords='offset points', ha='center')
@@ -419,12 +775,90 @@ class ValidationResult(object):
 
 
         def getSamplesDataFrame(self, target):
-            """ Return pandas.DataFrame of raw sample data for given target 
+            """ Return pandas.DataFrame of raw sample data for given target.
+            Numeric columns are read-only views of the stored sample data.
             
             Args:
                 target (int): Target index in self.targets to retrieve
             """
-            return pd.DataFrame(self.samples[target])
+            table = SampleTable.fromSamples(self.samples[target])
+            cols = {}
+            for field in table.fields:
+                cols[field] = _columnArray(table.column(field))
+            return pd.DataFrame(cols, columns=list(table.fields), copy=False)
+
+
+        def toNPZ(self, npz_file):
+            """ Save validation results to a compressed NumPy .npz file.
+            Numeric sample columns are stored as binary arrays, everything
+            else as JSON. Use ValidationResult.fromNPZ() to load.
+
+            Args:
+                npz_file (str): Output file name
+            """
+            d = self.toDict()
+            del d['samples']
+            arrays = {}
+            tables = []
+            if self.samples is not None:
+                for t, table in enumerate(self.samples):
+                    table = SampleTable.fromSamples(table)
+                    other = {}
+                    missing = {}
+                    for c, field in enumerate(table.fields):
+                        col = table.column(field)
+                        if type(col) == array:
+                            arrays['s{:d}_{:d}'.format(t, c)] = _columnArray(col)
+                        else:
+                            other[field] = [None if v is _NO_VALUE else v for v in col]
+                            idx = [i for i, v in enumerate(col) if v is _NO_VALUE]
+                            if len(idx) > 0:
+                                missing[field] = idx
+                    tables.append({'fields': list(table.fields), 'length': len(table),
+                                   'columns': other, 'missing': missing})
+                d['samples'] = tables
+            arrays['result'] = np.array(json.dumps(d))
+            np.savez_compressed(npz_file, **arrays)
+
+
+        @classmethod
+        def fromNPZ(cls, npz_file):
+            """ Load validation results saved using toNPZ()
+
+            Args:
+                npz_file (str): Input file name
+            """
+            with np.load(npz_file, allow_pickle=False) as data:
+                d = json.loads(str(data['result']))
+                tables = d.pop('samples', None)
+                vr = cls()
+                vr.__dict__.update(d)
+                if tables is not None:
+                    vr.samples = []
+                    for t, td in enumerate(tables):
+                        columns = []
+                        for c, field in enumerate(td['fields']):
+                            if field in td['columns']:
+                                col = td['columns'][field]
+                                for i in td['missing'].get(field, []):
+                                    col[i] = _NO_VALUE
+                                columns.append(col)
+                            else:
+                                arr = data['s{:d}_{:d}'.format(t, c)]
+                                tc = _FLOAT_TYPECODE if arr.dtype.kind == 'f' else _INT_TYPECODE
+                                columns.append(array(tc, arr.astype(tc).tobytes()))
+                        vr.samples.append(SampleTable(td['fields'], columns, td['length']))
+            return vr
+
             
 
 
+
+if _HAS_SCI_PKGS:
+    def _columnArray(col):
+        """ Read-only NumPy view of a typed array column, or the list itself """
+        if type(col) == array:
+            a = np.frombuffer(col, dtype=col.typecode)
+            a.flags.writeable = False
+            return a
+        return col
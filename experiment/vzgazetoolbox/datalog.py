@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+# Vizard gaze tracking toolbox
+# Append-only data logs that do not depend on Vizard
+
+import os
+import sys
+import csv
+import gzip
+import json
+
+if sys.version_info[0] == 3:
+    from time import perf_counter
+else:
+    from time import clock as perf_counter
+
+__all__ = ['TrialLog', 'ExperimentArchive', 'readExperimentArchive', 'ExperimentJournal', 'readExperimentJournal']
+
+
+def _open_log(file_name, mode):
+    """ Open a plain or gzip-compressed log file in binary mode """
+    if file_name.lower().endswith('.gz'):
+        return gzip.open(file_name, mode)
+    return open(file_name, mode)
+
+
+def _read_json_lines(f):
+    """ Read all records from an open JSON Lines file. An incomplete last line
+    or compressed block (e.g. after a crash during writing) is ignored. """
+    records = []
+    while True:
+        try:
+            line = f.readline()
+        except (EOFError, IOError, OSError):
+            break
+        if not line:
+            break
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            break
+    return records
+
+
+def _json_keys(obj):
+    """ Return a copy of obj in which all dict keys are strings """
+    if isinstance(obj, dict):
+        return dict([(k if isinstance(k, str) else str(k), _json_keys(v)) for (k, v) in obj.items()])
+    if isinstance(obj, (list, tuple)):
+        return [_json_keys(v) for v in obj]
+    return obj
+
+
+def _json_dumps(obj, sort_keys=False):
+    """ Serialize a record to JSON. Keys and values JSON cannot store (e.g. tuples,
+    numpy scalars) are converted using str(), as when writing the trial table. """
+    try:
+        return json.dumps(obj, sort_keys=sort_keys, default=str)
+    except TypeError:
+        return json.dumps(_json_keys(obj), sort_keys=sort_keys, default=str)
+
+
+
+class TrialLog(object):
+    """ Append-only log of finished trials, stored as one JSON record per
+    line (JSON Lines). Each trial is written exactly once when it ends, so the
+    cost of saving does not grow with the number of trials. New parameter or
+    result keys can appear in any record; the consolidated table with the
+    superset of all keys is produced by finalize().
+    """
+
+    def __init__(self, log_file):
+        """ Open (or continue) a trial log
+
+        Args:
+            log_file (str): Log file name, e.g. 'Experiment1_trials.jsonl'
+        """
+        self.log_file = log_file
+        self._file = None
+
+
+    def append(self, record):
+        """ Append a single trial record and flush it to disk
+
+        Args:
+            record (dict): Flat dict of trial parameters, results and timing
+        """
+        if self._file is None:
+            self._file = open(self.log_file, 'a')
+        self._file.write(_json_dumps(record) + '\n')
+        self._file.flush()
+
+
+    def close(self):
+        """ Close the log file. Further records can still be appended. """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+    def read(self):
+        """ Return all records in the log as a list of dicts """
+        with open(self.log_file, 'r') as lf:
+            return _read_json_lines(lf)
+
+
+    def finalize(self, file_name, sep='\t', key='_original_idx'):
+        """ Write the consolidated trial table with the sorted superset of all keys
+        as columns, in the same format as Experiment.saveTrialDataToCSV. Contains one
+        row per logged trial; trials that were never run are not in the log.
+        If a trial was logged more than once (repeated trial), its last record is used.
+
+        Args:
+            file_name (str): Name of CSV file to write to
+            sep (str): Field separator string (default: Tab)
+            key (str): Record field identifying a trial, rows are sorted by this field.
+                Records without this field follow in log order.
+        """
+        self.close()
+        trials = {}
+        unkeyed = []
+        all_keys = set()
+        for record in self.read():
+            if record.get(key) is None:
+                unkeyed.append(record)
+            else:
+                trials[record[key]] = record
+            all_keys.update(record.keys())
+
+        all_keys = sorted(all_keys)
+        with open(file_name, 'w') as of:
+            writer = csv.DictWriter(of, delimiter=sep, lineterminator='\n',
+                                    fieldnames=all_keys)
+            writer.writeheader()
+            for idx in sorted(trials.keys()):
+                writer.writerow(trials[idx])
+            for record in unkeyed:
+                writer.writerow(record)
+        return file_name
+
+
+
+class ExperimentArchive(object):
+    """ Streaming writer for complete experiment data (config, participant,
+    trials and eye tracker validations). Records are written as JSON Lines
+    (gzip-compressed if the file name ends in .gz) as soon as they are
+    produced, so no single large JSON document has to be built at the end
+    of a session and a crash loses at most the data since the last checkpoint.
+
+    Use readExperimentArchive() to get the same dict layout as Experiment.toDict().
+    """
+
+    def __init__(self, archive_file):
+        """ Create a new archive file
+
+        Args:
+            archive_file (str): Output file name, e.g. 'Experiment1_all.jsonl.gz'
+        """
+        self.archive_file = archive_file
+        self._file = _open_log(archive_file, 'wb')
+        self._last = {}
+
+
+    def write(self, rtype, data=None, **fields):
+        """ Append a record to the archive
+
+        Args:
+            rtype (str): Record type ('experiment', 'config', 'participant', 'trial', 'validation')
+            data (dict): Record data
+            **fields: Additional record fields, e.g. trial position
+        """
+        record = {'type': rtype, 'data': data}
+        record.update(fields)
+        self._file.write((_json_dumps(record) + '\n').encode('utf-8'))
+
+
+    def update(self, rtype, data):
+        """ Append a record only if it changed since it was last written,
+        e.g. for config or participant data
+
+        Args:
+            rtype (str): Record type
+            data (dict): Record data
+        """
+        js = _json_dumps(data, sort_keys=True)
+        if self._last.get(rtype) != js:
+            self.write(rtype, data)
+            self._last[rtype] = js
+
+
+    def checkpoint(self):
+        """ Flush all records written so far to disk. For compressed archives, this
+        ends the current compressed block so that all data up to here can be read back. """
+        self._file.flush()
+
+
+    def close(self):
+        """ Checkpoint and close the archive """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+
+def readExperimentArchive(archive_file):
+    """ Read an experiment archive written by ExperimentArchive
+
+    Args:
+        archive_file (str): Archive file name
+
+    Returns: dict in the same layout as Experiment.toDict() (and saveExperimentData files)
+    """
+    e = {}
+    trials = {}
+    validations = []
+    with _open_log(archive_file, 'rb') as af:
+        for record in _read_json_lines(af):
+            if record['type'] == 'experiment':
+                e.update(record['data'])
+            elif record['type'] in ['config', 'participant']:
+                e[record['type']] = record['data']
+            elif record['type'] == 'trial':
+                trials[record['pos']] = record['data']
+            elif record['type'] == 'validation':
+                validations.append(record['data'])
+
+    if len(trials) > 0:
+        e['trials'] = [trials[pos] for pos in sorted(trials.keys())]
+    if len(validations) > 0:
+        e['eye_tracker_validations'] = validations
+    return e
+
+
+
+class ExperimentJournal(ExperimentArchive):
+    """ Write-ahead journal of experiment state changes (trial list, trial
+    start and end, results, validations and saved recording files), used to
+    resume an interrupted session (see Experiment.resume).
+
+    Every record is flushed immediately. Syncing to disk (fsync) is batched:
+    it happens at most every sync_interval seconds, and always for records
+    written with sync=True, such as finished trials.
+    """
+
+    def __init__(self, journal_file, sync_interval=1.0, append=False):
+        """ Create a new journal or continue an existing one
+
+        Args:
+            journal_file (str): Journal file name, e.g. 'Experiment1_journal.jsonl'
+            sync_interval (float): Maximum time between disk syncs, in seconds
+            append (bool): if True, append to an existing journal file
+        """
+        self.archive_file = journal_file
+        self._file = open(journal_file, 'ab' if append else 'wb')
+        self._last = {}
+        self.sync_interval = sync_interval
+        self._last_sync = perf_counter()
+
+
+    def write(self, rtype, data=None, sync=False, **fields):
+        """ Append a record to the journal
+
+        Args:
+            rtype (str): Record type
+            data (dict): Record data
+            sync (bool): if True, sync the journal to disk immediately
+            **fields: Additional record fields, e.g. trial position
+        """
+        ExperimentArchive.write(self, rtype, data, **fields)
+        self._file.flush()
+        if sync or perf_counter() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+
+    def sync(self):
+        """ Flush and sync all records written so far to disk """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_sync = perf_counter()
+
+
+    def checkpoint(self):
+        self.sync()
+
+
+
+def readExperimentJournal(journal_file):
+    """ Replay an experiment journal written by ExperimentJournal
+
+    Args:
+        journal_file (str): Journal file name
+
+    Returns: dict of experiment state with keys 'experiment', 'config',
+        'participant', 'trials' (list of trial dicts), 'validations',
+        'recordings' (trial position -> (sample file, event file))
+        and 'current' (position of the last started trial, or None)
+    """
+    state = {'experiment': {},
+             'config': {},
+             'participant': {},
+             'trials': [],
+             'validations': [],
+             'recordings': {},
+             'current': None}
+    with open(journal_file, 'rb') as jf:
+        for record in _read_json_lines(jf):
+            rtype = record['type']
+            if rtype == 'experiment':
+                state['experiment'].update(record['data'])
+            elif rtype in ['config', 'participant', 'trials']:
+                state[rtype] = record['data']
+            elif rtype == 'trial_start':
+                state['current'] = record['pos']
+            elif rtype == 'trial_end':
+                state['trials'][record['pos']] = record['data']
+            elif rtype == 'validation':
+                state['validations'].append(record['data'])
+            elif rtype == 'recording':
+                state['recordings'][record['pos']] = (record['samples'], record['events'])
+    return state
@@ -11,6 +11,7 @@ import time
 import json
 import random
 import itertools
+from array import array
 
 if sys.version_info[0] == 3:
     from time import perf_counter
@@ -22,8 +23,11 @@ import vizinfo
 import viztask
 import vizinput
 
-from .data import ParamSet
+from .data import ParamSet, ValidationResult, readTrialTable
+from .datalog import TrialLog, ExperimentArchive, ExperimentJournal, readExperimentJournal
 from .recorder import SampleRecorder
+from .samplestream import SampleStream
+from .tracing import Tracer
 
 STATE_NEW = 0
 STATE_RUNNING = 10
@@ -43,6 +47,7 @@ class Experiment(object):
             debug (bool): it True, print additional debug output
             output_file (str): Base file name (without extension) for output files
             auto_save (bool): if True, automatically save data after each trial
+                (appended to <output_file>_trials.jsonl, see finalizeTrialData)
         """
         if name is None:
             print('Note: Experiment name is not set, using "Experiment1". You can specify the name='' argument when creating an Experiment() object.')
@@ -52,7 +57,6 @@ class Experiment(object):
 
         self.trials = []
         self._blocks = []
-        self._block_trials = {}
 
         if config is not None:
             if type(config) == str:
@@ -73,6 +77,15 @@ class Experiment(object):
         self.debug = debug
         self._base_filename = output_file
         self._auto_save = auto_save
+        self._trial_log = None
+        self._trial_log_finalized = True
+        self._archive = None
+        self._archived_trials = set()
+        self._archived_validations = 0
+        self._journal = None
+        self._journal_trials_dirty = True
+        self._journaled_validations = 0
+        self._tracer = Tracer(name=self.name)
         
         self._recorder = None
         self._auto_record = True
@@ -127,10 +140,9 @@ class Experiment(object):
                 estr = 'Values in list_params must have the same length as num_trials! [{:s}]'
                 raise ValueError(estr.format(key))
 
-        for t in range(0, num_trials):
-            tparams = copy.copy(params)
-            tparams.update({key:val[t] for key, val in list_params.iteritems()})
-            self.trials.append(Trial(params=tparams, index=t, block=block))
+        columns = {key: [val] * num_trials for key, val in params.items()}
+        columns.update({key: list(val) for key, val in list_params.items()})
+        self.trials.addRows(columns, num_trials, block=block)
 
         self._updateBlocks()
         self._dlog('Adding {:d} trials: {:s}'.format(num_trials, str(params)))
@@ -164,31 +176,34 @@ class Experiment(object):
                 iters[key] = levels[key]
             factors.append(iters[key])
 
-        design = list(itertools.product(*factors)) * repeat
-        for ix, entry in enumerate(design):
-            tparams = {}
-            for var, lev in zip(variables, entry):
-                tparams[var] = lev
-            tparams.update(params)
-            self.trials.append(Trial(params=tparams, index=ix, block=block))
+        # Build parameter columns directly, Trial objects are created on first access
+        design = list(zip(*itertools.product(*factors)))
+        n_design = len(design[0]) if len(design) > 0 else 0
+        columns = {}
+        for var, col in zip(variables, design):
+            columns[var] = list(col) * repeat
+        for key, val in params.items():
+            columns[key] = [val] * (n_design * repeat)
+        self.trials.addRows(columns, n_design * repeat, block=block)
         self._updateBlocks()
 
         # Debug: print design description
         design_str = []
         for key in variables:
-            design_str.append(str(len(levels[key])))
+            design_str.append(str(len(iters[key])))
         design_str = 'x'.join(design_str)
         rep_str = ''
         if repeat != 1:
             rep_str = ', {:d} reps'.format(repeat)
-        self._dlog('Adding {:d} trials ({:s} design{:s}): {:s}'.format(len(design), design_str, rep_str, str(params)))
+        self._dlog('Adding {:d} trials ({:s} design{:s}): {:s}'.format(n_design * repeat, design_str, rep_str, str(params)))
 
 
     def addTrialsFromCSV(self, file_name=None, sep='\t', block=None, 
-                         block_col=None, params={}):
+                         block_col=None, params={}, dtypes=None, required=None):
         """ Read a list of trials from a CSV file, adding the columns
         as parameter values to each trial (one trial per row). If no file is 
-        specified, show Vizard file selection dialog.
+        specified, show Vizard file selection dialog. The file is read column 
+        by column and may be gzip-compressed (.gz).
 
         Args:
             file_name (str): name of CSV file to read, or None to show selection dialog
@@ -197,59 +212,47 @@ class Experiment(object):
             block_col (str): Column name to use for block numbering
             params (dict): Parameter values to set in all trials
                 (Caution: Will override identically named columns from input file!)
+            dtypes (dict): Optional data types of columns, e.g. {'object': 'category', 
+                'table_height': 'float'}. Columns without a declared type are converted
+                to int or float where possible (see readTrialTable).
+            required (list): Column names that must be present in the file
         """
         if file_name is None:
             # Show file dialog and pick a reasonable default for the separator
-            file_name = vizinput.fileOpen(filter=[('Trial files', '*.csv;*.tsv;*.dat;*.txt')])
+            file_name = vizinput.fileOpen(filter=[('Trial files', '*.csv;*.tsv;*.dat;*.txt;*.gz')])
             ext = os.path.splitext(file_name)[1]
+            if ext.upper() == '.GZ':
+                ext = os.path.splitext(os.path.splitext(file_name)[0])[1]
             if ext.upper() in ['.CSV', '.DAT']:
                 sep=';'
 
-        trial_no = 0
-        with open(file_name, 'r') as tf:
-            reader = csv.DictReader(tf, delimiter=sep)
-            for row in reader:
-                cparams = {}
-                for h in reader.fieldnames:
-
-                    # Convert numeric values
-                    data = row[h]
-                    try:
-                        cparams[h] = int(data)
-                    except ValueError:
-                        try:
-                            cparams[h] = float(data)
-                        except ValueError:
-                            cparams[h] = data
-
-                if block is None:
-                    if block_col is not None:
-                        # Use column if no block number specified
-                        if block_col not in cparams.keys():
-                            s = 'addTrialsFromCSV: Block variable "{:s}" not found in input file!'
-                            raise ValueError(s.format(block_col))
-                        else:
-                            bl = int(cparams[block_col])
-
-                    elif block_col is None:
-                        # Nothing specified, use default (0)
-                        bl = 0
-                else:
-                    # Use block argument if present (overrides column)
-                    bl = int(block)
-
-                # Add any other params specified in function call
-                cparams.update(params)
+        (header, columns) = readTrialTable(file_name, sep=sep, dtypes=dtypes, required=required)
+        num_trials = len(columns[header[0]]) if len(header) > 0 else 0
+
+        if block is not None:
+            # Use block argument if present (overrides column)
+            bl = int(block)
+        elif block_col is not None:
+            # Use column if no block number specified
+            if block_col not in header:
+                s = 'addTrialsFromCSV: Block variable "{:s}" not found in input file!'
+                raise ValueError(s.format(block_col))
+            bl = [int(b) for b in columns[block_col]]
+        else:
+            # Nothing specified, use default (0)
+            bl = 0
 
-                self.trials.append(Trial(params=cparams, index=trial_no, block=bl))
-                trial_no += 1
+        # Add any other params specified in function call
+        for key, val in params.items():
+            columns[key] = [val] * num_trials
 
+        self.trials.addRows(columns, num_trials, block=bl)
         self._updateBlocks()
 
         if '_trial_input_files' not in self.config:
             self.config['_trial_input_files'] = []
         self.config['_trial_input_files'].append(file_name)
-        self._dlog('Adding {:d} trials from file: {:s}'.format(trial_no, file_name))
+        self._dlog('Adding {:d} trials from file: {:s}'.format(num_trials, file_name))
 
 
     def clearTrials(self):
@@ -259,29 +262,23 @@ class Experiment(object):
         self._dlog('Trials cleared.')
 
     
-    def randomizeTrials(self, across_blocks=False):
+    def randomizeTrials(self, across_blocks=False, seed=None):
         """ Shuffle trial order globally or within blocks 
         
         Args:
             across_blocks (bool): if True, shuffle all trials 
                 irrespective of their block number
+            seed: Optional random seed for a reproducible trial order
         """
         if self._state == STATE_RUNNING:
             raise ValueError('Cannot randomize trials while experiment is in progress!')
         else:
+            self.trials.shuffle(within_blocks=not across_blocks, seed=seed)
             self._updateBlocks()
-            if self.trials is not None:
-                if across_blocks:
-                    random.shuffle(self.trials)
-                    self._dlog('Trials randomized across blocks.')
-                else:
-                    shuffled_trials = []
-                    for block in copy.deepcopy(self._blocks):
-                        btrials = self._block_trials[block]
-                        random.shuffle(btrials)
-                        shuffled_trials.extend(btrials)
-                    self.trials = shuffled_trials
-                    self._dlog('Trials randomized.')
+            if across_blocks:
+                self._dlog('Trials randomized across blocks.')
+            else:
+                self._dlog('Trials randomized.')
     
 
     def requestParticipantData(self, questions={}, session=True, age=True, 
@@ -350,22 +347,48 @@ class Experiment(object):
             **kwargs: any valid argument to SampleRecorder()
         """
         self._recorder = SampleRecorder(DEBUG=self.debug, **kwargs)
+        self._recorder._tracer = self._tracer
         self._auto_record = auto_record
 
+
+    @property
+    def tracer(self):
+        """ Timeline tracer (see enableTracing). Can be used to add spans
+        for experiment phases, e.g.:
+            with exp.tracer.span('fixation', cat='phase'):
+                yield waitForFixation() """
+        return self._tracer
+
+
+    def enableTracing(self):
+        """ Record a timeline of trials, experiment phases and toolbox
+        operations (saving, validation, ...) which can be saved using saveTrace()
+        and viewed in chrome://tracing or ui.perfetto.dev. Adds no per-frame
+        cost while disabled. """
+        self._tracer.enable()
+        self._dlog('Tracing enabled.')
+
+
+    def saveTrace(self, file_name=None):
+        """ Save the recorded timeline as Chrome trace JSON file
+
+        Args:
+            file_name (str): Output file name, default: <output_file>_trace.json
+        """
+        if len(self._tracer) == 0:
+            self._dlog('No trace events recorded, was enableTracing() called?')
+            return None
+        if file_name is None:
+            file_name = self.output_file_name + '_trace.json'
+        self._tracer.save(file_name)
+        self._dlog('Saved trace to {:s}.'.format(file_name))
+        return file_name
+
     
     def _updateBlocks(self):
-        """ Rebuild experiment list of blocks and corresponding trials """
-        self._blocks = []
-        self._block_trials = {}
-
-        if self.trials is not None and len(self.trials) > 0:
-            for t in self.trials:
-                if t.block not in self._blocks:
-                    self._blocks.append(t.block)
-                if t.block not in self._block_trials.keys():
-                    self._block_trials[t.block] = []
-                self._block_trials[t.block].append(t)
-            self._blocks.sort()
+        """ Update experiment list of blocks from the trial store's block index """
+        self._journal_trials_dirty = True
+        self._blocks = self.trials.blocks
     
 
     def __repr__(self):
@@ -385,6 +408,20 @@ class Experiment(object):
         return iter(self.trials)
 
 
+    @property
+    def trials(self):
+        """ All trials in presentation order. Supports list-like iteration, 
+        indexing and appending (see TrialStore). """
+        return self._trials
+
+
+    @trials.setter
+    def trials(self, trials):
+        if trials is getattr(self, '_trials', None):
+            return # e.g. experiment.trials += [...]
+        self._trials = TrialStore(trials)
+
+
     @property
     def recorder(self):
         if self._recorder is not None:
@@ -410,7 +447,7 @@ class Experiment(object):
     @property
     def blocks(self):
         """ List of trial blocks in this experiment """
-        self._updateBlocks()
+        self._blocks = self.trials.blocks
         return copy.deepcopy(self._blocks)
 
 
@@ -470,15 +507,21 @@ class Experiment(object):
             s = 'Trial {:d} has already been run, set repeat=True to force repeat!'.format(trial_idx)
             raise RuntimeError(s)
 
+        span = self._tracer.span('startTrial', cat='toolbox', track='toolbox', trial=trial_idx)
         self._cur_trial = trial_idx
         if self._state < STATE_RUNNING:
             self._state = STATE_RUNNING
         self.trials[trial_idx]._start(index=trial_idx)
         self._trial_running = True
+        if self._journal is not None:
+            self._journalState()
+            self._journal.write('trial_start', pos=trial_idx)
 
         if self._recorder is not None and self._auto_record:
+            self._recorder.resetDataQuality()
             self._recorder.startRecording()
             self._recorder.recordEvent('TRIAL_START {:d}'.format(trial_idx))
+        span.end()
 
         if print_summary:
             print(self.trials[self._cur_trial].summary)
@@ -494,15 +537,25 @@ class Experiment(object):
         """
         if not self._trial_running:
             raise RuntimeError('There is no running trial to be ended!')
+        tr = self._tracer
+        span = tr.span('endCurrentTrial', cat='toolbox', track='toolbox', trial=self._cur_trial)
 
         if self._recorder is not None and self._auto_record:
             self._recorder.recordEvent('TRIAL_END {:d}'.format(self.trials[self._cur_trial].index))
             self._recorder.stopRecording()
-            sam, ev = self._recorder._getRawRecording(clear=True)
+            with tr.span('getRawRecording', cat='toolbox', track='toolbox'):
+                sam, ev = self._recorder._getRawRecording(clear=True)
             self.trials[self._cur_trial].samples = sam
             self.trials[self._cur_trial].events = ev
+            if self._recorder.data_quality:
+                ParamSet.update(self.trials[self._cur_trial].results, self._recorder.getDataQuality())
 
         self.trials[self._cur_trial]._end()
+        if tr.enabled:
+            # Whole trial as one span, phases added by the experiment script nest inside
+            t = self.trials[self._cur_trial]
+            tr.complete('Trial {:d}'.format(t.number), t._start_time / 1000.0, t._end_time / 1000.0,
+                        cat='trial', block=t.block, params=t.params.toDict())
         if self._cur_trial + 1 >= len(self.trials):
             # Stop experiment if this was the last trial
             self._state = STATE_DONE
@@ -510,7 +563,15 @@ class Experiment(object):
         self._trial_running = False
 
         if self._auto_save:
-            self.saveTrialData('{:s}.tsv'.format(self.output_file_name), rec_data='separate')
+            with tr.span('saveTrialIncremental', cat='io', track='toolbox'):
+                self._saveTrialIncremental(self.trials[self._cur_trial])
+        if self._archive is not None:
+            with tr.span('checkpointArchive', cat='io', track='toolbox'):
+                self._checkpointArchive(trial_pos=self._cur_trial)
+        if self._journal is not None:
+            with tr.span('journalTrial', cat='io', track='toolbox'):
+                self._journalTrial(self._cur_trial)
+        span.end()
 
         if print_summary:
             print(self.trials[self._cur_trial].summary)
@@ -518,6 +579,65 @@ class Experiment(object):
             self._dlog(self.trials[self._cur_trial].summary)
 
 
+    def _saveTrialIncremental(self, trial):
+        """ Append a finished trial to the trial log and save its recorded
+        data, without rewriting data of previous trials """
+        if self._trial_log is None:
+            self._trial_log = TrialLog('{:s}_trials.jsonl'.format(self.output_file_name))
+        self._trial_log.append(trial._record())
+        self._trial_log_finalized = False
+        if self._recorder is not None:
+            self._saveTrialRecording(trial, self.output_file_name)
+
+
+    def _saveTrialRecording(self, trial, base_name):
+        """ Save sample and event data of a single trial to separate files.
+        Returns the tuple of file names, or None if the trial has no recorded data. """
+        try:
+            file_name_s = '{:s}_samples_{:d}.tsv'.format(base_name, trial.number)
+            file_name_e = '{:s}_events_{:d}.tsv'.format(base_name, trial.number)
+            if getattr(trial, '_recording_files', None) == (file_name_s, file_name_e):
+                return (file_name_s, file_name_e) # Saved before resuming
+            if os.path.isfile(file_name_s) and os.path.isfile(file_name_e):
+                return (file_name_s, file_name_e) # Called after each trial, so skip existing files
+            self.recorder.saveRecording(sample_file=file_name_s, event_file=file_name_e, 
+                                        _data=(trial.samples, trial.events), meta_cols={'trial_number': trial.number})
+            return (file_name_s, file_name_e)
+        except AttributeError:
+            return None # Skip trials without recorded data
+
+
+    def _loadTrialRecording(self, trial):
+        """ Load sample and event data of a resumed trial from its saved files """
+        if not hasattr(trial, 'samples') and hasattr(trial, '_recording_files'):
+            data = []
+            for file_name in trial._recording_files:
+                stream = SampleStream(file_name)
+                data.append(list(stream))
+                stream.close()
+            (trial.samples, trial.events) = data
+
+
+    def finalizeTrialData(self, file_name=None, sep='\t'):
+        """ Write the consolidated trial data file from the trial log
+        written during the session (auto_save=True). Contains one row per
+        finished trial, in the same format as saveTrialData.
+
+        Args:
+            file_name (str): Name of CSV file to write to
+            sep (str): Field separator string (default: Tab)
+        """
+        if self._trial_log is None:
+            raise RuntimeError('No trial log available, was auto_save enabled and any trial finished?')
+        if file_name is None:
+            file_name = '{:s}.tsv'.format(self.output_file_name)
+        with self._tracer.span('finalizeTrialData', cat='io', track='toolbox'):
+            self._trial_log.finalize(file_name, sep=sep)
+        if file_name == '{:s}.tsv'.format(self.output_file_name):
+            self._trial_log_finalized = True
+        self._dlog('Finalized trial data to {:s}.'.format(file_name))
+
+
     def saveTrialData(self, file_name=None, sep='\t', rec_data='single'):
         """ Shortcut to saveTrialDataToCSV 
         
@@ -556,16 +676,11 @@ class Experiment(object):
 
         # Trial data
         self._dlog('Saving trial data...')
+        span = self._tracer.span('saveTrialData', cat='io', track='toolbox', rec_data=rec_data)
         all_keys = []
         tdicts = []
         for t in self.trials:
-            td = dict(t.params)
-            td.update(dict(t.results))
-            td['_start_tick'] = t._start_tick
-            td['_end_tick'] = t._end_tick
-            td['_start_time'] = t._start_time
-            td['_end_time'] = t._end_time
-            td['_original_idx'] = t._index
+            td = t._record()
 
             # Collect superset of all param and result keys
             for key in list(td.keys()):
@@ -580,6 +695,8 @@ class Experiment(object):
             writer.writeheader()
             for td in tdicts:
                 writer.writerow(td)
+        if file_name == '{:s}.tsv'.format(self.output_file_name):
+            self._trial_log_finalized = True # Default trial data file is up to date
 
         # Sample and event data
         if rec_data.lower() == 'single' and self._recorder is not None:
@@ -588,6 +705,7 @@ class Experiment(object):
 
             first = True
             for t in self.trials:
+                self._loadTrialRecording(t)
                 # Write all trials to same file, but ensure not to append to old data
                 if first:
                     self.recorder.saveRecording(sample_file=file_name_s, event_file=file_name_e, _append=False,
@@ -599,17 +717,8 @@ class Experiment(object):
 
         elif rec_data.lower() == 'separate' and self._recorder is not None:
             for t in self.trials:
-                try:
-                    file_name_s = '{:s}_samples_{:d}.tsv'.format(os.path.splitext(file_name)[0], t.number)
-                    file_name_e = '{:s}_events_{:d}.tsv'.format(os.path.splitext(file_name)[0], t.number)
-                    if os.path.isfile(file_name_s) and os.path.isfile(file_name_e):
-                        continue # This is called on each trial, so skip existing files
-                    
-                    self.recorder.saveRecording(sample_file=file_name_s, event_file=file_name_e, 
-                                                _data=(t.samples, t.events), meta_cols={'trial_number': t.number})
-                
-                except AttributeError:
-                    pass # Skip trials without recorded data
+                self._saveTrialRecording(t, os.path.splitext(file_name)[0])
+        span.end()
 
 
     def toDict(self):
@@ -629,17 +738,506 @@ class Experiment(object):
         return e
 
 
+    def openArchive(self, file_name=None, compress=True):
+        """ Start streaming all experiment data to an archive file
+        (see ExperimentArchive). Config, participant data and new eye tracker
+        validations are written when opening the archive and after each trial,
+        together with the finished trial. saveExperimentData() then only needs
+        to write the remaining trials and close the archive.
+
+        Trials that are already finished, e.g. after resume(), are written to the
+        new archive right away, so it always holds the complete session.
+
+        Args:
+            file_name (str): Archive file name, default: <output_file>_all.jsonl(.gz)
+            compress (bool): if True and no file name given, use gzip compression
+        """
+        if self._archive is not None:
+            self.closeArchive()
+        if file_name is None:
+            file_name = self.output_file_name + '_all.jsonl'
+            if compress:
+                file_name += '.gz'
+        self._archive = ExperimentArchive(file_name)
+        self._archived_trials = set()
+        self._archived_validations = 0
+        for pos in self.trials.finishedPositions():
+            self._archive.write('trial', self.trials[pos].toDict(), pos=pos)
+            self._archived_trials.add(pos)
+        self._checkpointArchive()
+        self._dlog('Streaming experiment data to {:s}.'.format(file_name))
+
+
+    def _checkpointArchive(self, trial_pos=None):
+        """ Write changed and new data to the experiment archive and flush it
+
+        Args:
+            trial_pos (int): Position in trial list of a trial to write
+        """
+        self._archive.update('experiment', {'name': self.name})
+        self._archive.update('config', self.config.toDict())
+        self._archive.update('participant', self.participant.toDict())
+        if self._recorder is not None:
+            for v in self._recorder._validation_results[self._archived_validations:]:
+                self._archive.write('validation', v.toDict())
+                self._archived_validations += 1
+        if trial_pos is not None:
+            self._archive.write('trial', self.trials[trial_pos].toDict(), pos=trial_pos)
+            self._archived_trials.add(trial_pos)
+        self._archive.checkpoint()
+
+
+    def closeArchive(self):
+        """ Write all remaining data (including trials that were not run)
+        to the experiment archive and close it """
+        if self._archive is None:
+            return
+        for pos in range(len(self.trials)):
+            if pos not in self._archived_trials:
+                self._archive.write('trial', self.trials[pos].toDict(), pos=pos)
+                self._archived_trials.add(pos)
+        self._checkpointArchive()
+        self._archive.close()
+        self._dlog('Closed experiment archive {:s}.'.format(self._archive.archive_file))
+        self._archive = None
+
+
+    def openJournal(self, file_name=None, sync_interval=1.0):
+        """ Start a write-ahead journal of experiment state changes, which allows
+        to resume the session after a crash using resume(). When a trial ends, its
+        sample and event data are saved to separate files and referenced in the journal.
+
+        Args:
+            file_name (str): Journal file name, default: <output_file>_journal.jsonl
+            sync_interval (float): Maximum time between disk syncs, in seconds.
+                Finished trials are always synced immediately.
+        """
+        if file_name is None:
+            file_name = self.output_file_name + '_journal.jsonl'
+        self._journal = ExperimentJournal(file_name, sync_interval=sync_interval)
+        self._journal_trials_dirty = True
+        self._journaled_validations = 0
+        self._journal.write('experiment', {'name': self.name, 'output_file': self.output_file_name})
+        self._journalState()
+        self._journal.sync()
+        self._dlog('Journaling experiment state to {:s}.'.format(file_name))
+
+
+    def _journalState(self):
+        """ Write changed config, participant data, trial list and new validations to the journal """
+        self._journal.update('config', self.config.toDict())
+        self._journal.update('participant', self.participant.toDict())
+        if self._journal_trials_dirty:
+            self._journal.write('trials', [t.toDict() for t in self.trials])
+            self._journal_trials_dirty = False
+        if self._recorder is not None:
+            for v in self._recorder._validation_results[self._journaled_validations:]:
+                self._journal.write('validation', v.toDict())
+                self._journaled_validations += 1
+
+
+    def _journalTrial(self, pos):
+        """ Journal a finished trial, including references to its recorded data """
+        trial = self.trials[pos]
+        if self._recorder is not None:
+            files = self._saveTrialRecording(trial, self.output_file_name)
+            if files is not None:
+                self._journal.write('recording', pos=pos, samples=files[0], events=files[1])
+        self._journalState()
+        self._journal.write('trial_end', trial.toDict(), pos=pos, sync=True)
+
+
+    def resume(self, journal_file, continue_journal=True):
+        """ Restore the state of an interrupted session from its journal (see openJournal):
+        trial list and results, current trial, config, participant data and eye tracker
+        validations. Trials that were started but not finished are reset, so calling
+        startNextTrial() continues with the next unfinished trial. Recorded data of
+        finished trials is loaded from the referenced files only when saving.
+
+        Args:
+            journal_file (str): Journal file written by openJournal()
+            continue_journal (bool): if True, append further changes to the same journal
+        """
+        if self._trial_running:
+            raise RuntimeError('Cannot resume while a trial is in progress!')
+        t_start = perf_counter()
+        span = self._tracer.span('resume', cat='io', track='toolbox')
+        state = readExperimentJournal(journal_file)
+
+        if 'name' in state['experiment']:
+            self.name = state['experiment']['name']
+        if 'output_file' in state['experiment']:
+            self._base_filename = state['experiment']['output_file']
+        self.config = ParamSet(input_dict=state['config'])
+        self.participant = ParamSet(input_dict=state['participant'])
+
+        self.trials = [Trial.fromDict(td) for td in state['trials']]
+        for pos, files in state['recordings'].items():
+            if self.trials[pos].done:
+                self.trials[pos]._recording_files = tuple(files)
+        self._updateBlocks()
+
+        done = [pos for pos, t in enumerate(self.trials) if t.done]
+        self._trial_running = False
+        if len(done) == 0:
+            self._cur_trial = 0
+            self._state = STATE_NEW
+        else:
+            self._cur_trial = max(done)
+            self._state = STATE_RUNNING
+            if len(done) == len(self.trials):
+                self._state = STATE_DONE
+
+        validations = []
+        for vd in state['validations']:
+            validations.append(ValidationResult.fromDict(vd))
+        if self._recorder is not None:
+            self._recorder._validation_results = validations
+        elif len(validations) > 0:
+            print('Warning: No sample recorder set up, {:d} validation results not restored!'.format(len(validations)))
+
+        if continue_journal:
+            self._journal = ExperimentJournal(journal_file, append=True)
+            self._journal_trials_dirty = False
+            self._journaled_validations = len(validations)
+
+        span.end(trials=len(done))
+        s = 'Resumed {:d}/{:d} finished trials from {:s} in {:.1f} ms.'
+        print(s.format(len(done), len(self.trials), journal_file, (perf_counter() - t_start) * 1000.0))
+
+
     def saveExperimentData(self, json_file=None):
-        """ Save all experimental data to JSON file """
+        """ Save all experimental data to JSON file. If an archive was opened
+        using openArchive(), close the archive instead and only write a JSON file
+        if a file name is specified. With auto_save, the trial data file is also
+        written from the trial log, unless saveTrialData() already saved it. """
+        if self._trial_log is not None and not self._trial_log_finalized:
+            self.finalizeTrialData()
+        if self._archive is not None:
+            with self._tracer.span('closeArchive', cat='io', track='toolbox'):
+                self.closeArchive()
+            if json_file is None:
+                return
         if json_file is None:
             json_file = self.output_file_name + '.json'
 
-        with open(json_file, 'w') as jf:
-            jf.write(json.dumps(self.toDict()))
+        with self._tracer.span('saveExperimentData', cat='io', track='toolbox'):
+            with open(json_file, 'w') as jf:
+                jf.write(json.dumps(self.toDict()))
         self._dlog('Saved experiment data to {:s}.'.format(str(json_file)))
 
 
 
+# Placeholder for parameters that are not set in a trial
+_MISSING = object()
+
+# Number of block changes of any Trial, so that trial stores only need to
+# rescan their trials' blocks after a change (see Trial.block)
+_block_changes = 0
+
+
+class TrialStore(object):
+    """ List-like container of an Experiment's trials.
+
+    Trial parameters are stored as one list per parameter (column), and Trial
+    objects are only created when a trial is first accessed, which keeps large
+    designs compact. Once a trial's object exists, its parameters are only
+    kept in the object. The store also keeps an index of the number of trials
+    per block, so adding trials does not require rescanning all existing trials.
+    """
+
+    def __init__(self, trials=None):
+        """ Create a new trial store
+
+        Args:
+            trials: Optional iterable of Trial objects to add
+        """
+        self._cols = {}           # param name -> list of values by row
+        self._col_rows = 0        # number of rows whose params are only stored in columns
+        self._index = array('l')  # initial trial index by row
+        self._block = []          # block number by row
+        self._order = array('l')  # row by trial position
+        self._views = []          # Trial object by row, or None if not created yet
+        self._block_count = {}    # block -> number of rows
+        self._block_list = []     # sorted list of blocks
+        self._block_sync = _block_changes
+
+        if trials is not None:
+            for t in trials:
+                self.append(t)
+
+
+    def _new_row(self, trial):
+        """ Allocate a row for an existing Trial object and update the block index.
+        The row is not added to the trial order. """
+        row = len(self._index)
+        self._index.append(trial.index)
+        self._block.append(trial.block)
+        for col in self._cols.values():
+            col.append(_MISSING)
+        self._views.append(trial)
+        self._count_block(trial.block, 1)
+        return row
+
+
+    def _drop_row(self, row):
+        """ Release a row that was removed from the trial order """
+        self._count_block(self._block[row], -1)
+        if self._views[row] is None:
+            self._drop_params(row)
+        self._views[row] = None
+
+
+    def _drop_params(self, row):
+        """ Release the parameter column values of a row """
+        for col in self._cols.values():
+            col[row] = _MISSING
+        self._col_rows -= 1
+        if self._col_rows == 0:
+            self._cols = {}
+
+
+    def _count_block(self, block, n):
+        """ Update the number of trials in a block """
+        if block not in self._block_count:
+            self._block_count[block] = 0
+            self._block_list.append(block)
+            self._block_list.sort()
+        self._block_count[block] += n
+        if self._block_count[block] == 0:
+            del self._block_count[block]
+            self._block_list.remove(block)
+
+
+    def _sync_blocks(self):
+        """ Update the block index for created trials whose block was changed """
+        if self._block_sync == _block_changes:
+            return
+        for row, t in enumerate(self._views):
+            if t is not None and t.block != self._block[row]:
+                self._count_block(self._block[row], -1)
+                self._count_block(t.block, 1)
+                self._block[row] = t.block
+        self._block_sync = _block_changes
+
+
+    def _trial(self, row):
+        """ Return the Trial object of a row, creating it on first access """
+        if self._views[row] is None:
+            params = {}
+            for key, col in self._cols.items():
+                if col[row] is not _MISSING:
+                    params[key] = col[row]
+            self._views[row] = Trial(params=params, index=self._index[row], block=self._block[row])
+            self._drop_params(row)
+        return self._views[row]
+
+
+    def _rows(self, pos):
+        """ Return list of rows at a position or slice of positions """
+        if isinstance(pos, slice):
+            return self._order[pos]
+        return [self._order[pos]]
+
+
+    def addRow(self, params, index=-1, block=None):
+        """ Add a single trial from a dict of parameters
+
+        Args:
+            params (dict): Trial parameters
+            index (int): Initial trial index
+            block (int): Block number of this trial
+        """
+        self.addRows({key: [val] for key, val in params.items()}, 1, block=block, index=index)
+
+
+    def addRows(self, columns, num_trials, block=None, index=0):
+        """ Add trials from parameter columns
+
+        Args:
+            columns (dict): Parameter name -> list of num_trials values
+            num_trials (int): Number of trials to add
+            block: Block number of all added trials, or list of block numbers per trial
+            index (int): Initial trial index of the first added trial
+        """
+        n_rows = len(self._index)
+        for key, values in columns.items():
+            if len(values) != num_trials:
+                raise ValueError('Parameter column "{:s}" must have {:d} values!'.format(str(key), num_trials))
+            if key not in self._cols:
+                self._cols[key] = [_MISSING] * n_rows
+            self._cols[key].extend(values)
+        for key, col in self._cols.items():
+            if key not in columns:
+                col.extend([_MISSING] * num_trials)
+        self._col_rows += num_trials
+        self._views.extend([None] * num_trials)
+
+        self._index.extend(range(index, index + num_trials))
+        self._order.extend(range(n_rows, n_rows + num_trials))
+        if isinstance(block, list):
+            if len(block) != num_trials:
+                raise ValueError('Block list must have {:d} values!'.format(num_trials))
+            self._block.extend(block)
+            counts = {}
+            for bl in block:
+                counts[bl] = counts.get(bl, 0) + 1
+            for bl, n in counts.items():
+                self._count_block(bl, n)
+        else:
+            self._block.extend([block] * num_trials)
+            if num_trials > 0:
+                self._count_block(block, num_trials)
+
+
+    def append(self, trial):
+        """ Add an existing Trial object """
+        if not isinstance(trial, Trial):
+            raise ValueError('Only Trial objects can be added to a TrialStore!')
+        self._order.append(self._new_row(trial))
+
+
+    def extend(self, trials):
+        """ Add multiple existing Trial objects """
+        for t in trials:
+            self.append(t)
+
+
+    def insert(self, pos, trial):
+        """ Insert an existing Trial object before a position """
+        if not isinstance(trial, Trial):
+            raise ValueError('Only Trial objects can be added to a TrialStore!')
+        self._order.insert(pos, self._new_row(trial))
+
+
+    def pop(self, pos=-1):
+        """ Remove and return the trial at a position (default: last) """
+        trial = self[pos]
+        del self[pos]
+        return trial
+
+
+    def index(self, trial):
+        """ Return the position of a Trial object, without creating other trials """
+        for pos, row in enumerate(self._order):
+            if self._views[row] is trial:
+                return pos
+        raise ValueError('Trial is not in this TrialStore!')
+
+
+    def remove(self, trial):
+        """ Remove a Trial object """
+        del self[self.index(trial)]
+
+
+    def sort(self, key=None, reverse=False):
+        """ Sort trials in place
+
+        Args:
+            key: Function returning the sort key of a Trial object.
+                Default: initial trial index, which restores the order after shuffle()
+            reverse (bool): if True, sort in descending order
+        """
+        if key is None:
+            order = sorted(self._order, key=lambda row: self._trial(row).index, reverse=reverse)
+        else:
+            order = sorted(self._order, key=lambda row: key(self._trial(row)), reverse=reverse)
+        self._order = array('l', order)
+
+
+    def shuffle(self, within_blocks=True, seed=None):
+        """ Shuffle trial order in O(n), optionally only within blocks. 
+        When shuffling within blocks, trials are also sorted by block.
+
+        Args:
+            within_blocks (bool): if True, keep trials grouped by block
+            seed: Optional random seed for a reproducible order, otherwise
+                the global random number generator is used
+        """
+        rng = random if seed is None else random.Random(seed)
+        if not within_blocks:
+            rng.shuffle(self._order)
+            return
+
+        self._sync_blocks()
+        by_block = {}
+        for row in self._order:
+            by_block.setdefault(self._block[row], []).append(row)
+        order = []
+        for block in self._block_list:
+            rows = by_block[block]
+            rng.shuffle(rows)
+            order.extend(rows)
+        self._order = array('l', order)
+
+
+    def finishedPositions(self):
+        """ Return positions of all finished trials. Trials that were never
+        accessed cannot have been run, so no Trial objects are created. """
+        return [pos for (pos, row) in enumerate(self._order)
+                if self._views[row] is not None and self._views[row].done]
+
+
+    @property
+    def blocks(self):
+        """ Sorted list of blocks """
+        self._sync_blocks()
+        return list(self._block_list)
+
+
+    def blockSize(self, block):
+        """ Number of trials in a block """
+        self._sync_blocks()
+        return self._block_count.get(block, 0)
+
+
+    def __len__(self):
+        return len(self._order)
+
+
+    def __iter__(self):
+        for row in self._order:
+            yield self._trial(row)
+
+
+    def __contains__(self, trial):
+        return any(self._views[row] is trial for row in self._order)
+
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self._trial(row) for row in self._order[pos]]
+        return self._trial(self._order[pos])
+
+
+    def __setitem__(self, pos, trial):
+        """ Replace the trial at a position in the trial list """
+        if not isinstance(trial, Trial):
+            raise ValueError('Only Trial objects can be added to a TrialStore!')
+        self._sync_blocks()
+        row = self._order[pos]
+        self._drop_row(row)
+        self._order[pos] = self._new_row(trial)
+
+
+    def __delitem__(self, pos):
+        """ Remove the trial(s) at a position or slice of positions """
+        self._sync_blocks()
+        for row in self._rows(pos):
+            self._drop_row(row)
+        del self._order[pos]
+
+
+    def __iadd__(self, trials):
+        self.extend(trials)
+        return self
+
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+
 class Trial(object):
 
     def __init__(self, params=None, index=-1, block=None):
@@ -659,7 +1257,7 @@ class Trial(object):
         self._index = index
         self._state = STATE_NEW
 
-        self.block = block
+        self._block = block
 
         # Trial results, to be set by Vizard script
         self.results = ParamSet()
@@ -702,6 +1300,19 @@ class Trial(object):
         self._state = STATE_DONE
 
 
+    @property
+    def block(self):
+        """ Presentation block this trial belongs to """
+        return self._block
+
+
+    @block.setter
+    def block(self, block):
+        global _block_changes
+        self._block = block
+        _block_changes += 1
+
+
     @property
     def index(self):
         """ Return current trial index at runtime """
@@ -783,6 +1394,40 @@ class Trial(object):
         return d
 
 
+    def _record(self):
+        """ Return params, results and timing as a flat dict (one row of trial data) """
+        td = dict(self.params)
+        td.update(dict(self.results))
+        td['_start_tick'] = self._start_tick
+        td['_end_tick'] = self._end_tick
+        td['_start_time'] = self._start_time
+        td['_end_time'] = self._end_time
+        td['_original_idx'] = self._index
+        return td
+
+
+    @classmethod
+    def fromDict(cls, trial_dict):
+        """ Create a Trial from a dict created by toDict(). Trials that were
+        started but not finished are restored as not run. Index and block numbers
+        that were stored as strings (e.g. numpy integers in a journal) are converted back. """
+        block = trial_dict['block']
+        if block is not None and not isinstance(block, (int, float)):
+            try:
+                block = int(block)
+            except ValueError:
+                block = float(block)
+        t = cls(params=trial_dict['params'], index=int(trial_dict['index']), block=block)
+        t.results = ParamSet(input_dict=trial_dict['results'])
+        if trial_dict['status'] == 'done':
+            t._start_time = trial_dict['times']['start_time']
+            t._start_tick = trial_dict['times']['start_tick']
+            t._end_time = trial_dict['times']['end_time']
+            t._end_tick = trial_dict['times']['end_tick']
+            t._state = STATE_DONE
+        return t
+
+
     def toJSON(self):
         """ Return all trial information as JSON """
         return json.dumps(self.toDict())
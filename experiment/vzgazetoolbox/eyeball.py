@@ -7,6 +7,8 @@ import os
 import viz
 import vizshape
 
+from .assets import addModelInstance
+
 _module_path = os.path.split(os.path.abspath(__file__))[0]
 
 class Eyeball(viz.VizNode):
@@ -28,8 +30,7 @@ class Eyeball(viz.VizNode):
                           'green': [0.109, 0.469, 0.277],
                           'grey':  [0.285, 0.461, 0.395]}
         
-        eye = viz.addChild(os.path.join(_module_path, 'models', 'unit_eye.gltf'))
-        eye.visible(visible)
+        eye = addModelInstance(os.path.join(_module_path, 'models', 'unit_eye.gltf'), visible=visible)
         viz.VizNode.__init__(self, eye.id)
         
         # Add gaze direction pointer (invisible by default)
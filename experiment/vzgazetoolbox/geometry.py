@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+# Vizard gaze tracking toolbox
+# Vectorized 3D geometry following Vizard conventions (does not depend on Vizard)
+
+from .lazy import LazyModule
+
+np = LazyModule('numpy')
+
+__all__ = ['normalize', 'vectorToPoint', 'angleBetween', 'eulerToMatrix', 'matrixToEuler',
+           'quatToMatrix', 'matrixToQuat', 'eulerToQuat', 'quatToEuler', 'eulerToForward',
+           'quatToForward', 'vecRotVecMatrix', 'vecRotVecEuler', 'slerp']
+
+# Conventions (same as viz.Matrix / vizmat.Transform):
+# - Left-handed coordinates, X right, Y up, Z forward
+# - Euler angles as [yaw, pitch, roll] in degrees. Positive pitch looks down.
+# - Quaternions as [x, y, z, w]
+# - Row vectors, i.e. rotation matrix rows are the local right, up and forward axes
+#
+# All functions operate on arrays with arbitrary leading dimensions, e.g. (N, 3)
+# Euler angles or (N, 3, 3) matrices, and also accept single values as lists.
+# Rotation matrices can be given as (..., 3, 3), (..., 4, 4) or (..., 16) arrays,
+# the latter as returned by viz.Matrix.get().
+
+# Pitch sine above which orientation is treated as gimbal lock
+_GIMBAL_LIMIT = 0.999999
+
+
+def _rotation(m):
+    """ Return rotation part of a matrix array as (..., 3, 3) """
+    m = np.asarray(m, dtype=np.float64)
+    if m.shape[-1] == 16:
+        m = m.reshape(m.shape[:-1] + (4, 4))
+    return m[..., 0:3, 0:3]
+
+
+def normalize(v):
+    """ Scale vectors to unit length. Zero-length vectors are returned as zeros.
+
+    Args:
+        v: array of vectors, shape (..., 3)
+    """
+    v = np.asarray(v, dtype=np.float64)
+    l = np.sqrt(np.sum(v * v, axis=-1, keepdims=True))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(l > 0.0, v / l, 0.0)
+
+
+def vectorToPoint(begin, end):
+    """ Unit vectors pointing from begin to end (see vizmat.VectorToPoint)
+
+    Args:
+        begin: array of start points, shape (..., 3)
+        end: array of end points, shape (..., 3)
+    """
+    return normalize(np.asarray(end, dtype=np.float64) - np.asarray(begin, dtype=np.float64))
+
+
+def angleBetween(v1, v2):
+    """ Angle between vectors in degrees (see vizmat.AngleBetweenVector)
+
+    Args:
+        v1, v2: arrays of vectors, shape (..., 3)
+    """
+    d = np.sum(normalize(v1) * normalize(v2), axis=-1)
+    return np.degrees(np.arccos(np.clip(d, -1.0, 1.0)))
+
+
+def eulerToMatrix(euler):
+    """ Convert Euler angles to rotation matrices
+
+    Args:
+        euler: array of [yaw, pitch, roll] angles in degrees, shape (..., 3)
+
+    Returns (..., 3, 3) array
+    """
+    e = np.radians(np.asarray(euler, dtype=np.float64))
+    cy, sy = np.cos(e[..., 0]), np.sin(e[..., 0])
+    cp, sp = np.cos(e[..., 1]), np.sin(e[..., 1])
+    cr, sr = np.cos(e[..., 2]), np.sin(e[..., 2])
+    m = np.empty(e.shape[:-1] + (3, 3))
+    m[..., 0, 0] = cr * cy + sr * sp * sy
+    m[..., 0, 1] = sr * cp
+    m[..., 0, 2] = -cr * sy + sr * sp * cy
+    m[..., 1, 0] = -sr * cy + cr * sp * sy
+    m[..., 1, 1] = cr * cp
+    m[..., 1, 2] = sr * sy + cr * sp * cy
+    m[..., 2, 0] = cp * sy
+    m[..., 2, 1] = -sp
+    m[..., 2, 2] = cp * cy
+    return m
+
+
+def matrixToEuler(m):
+    """ Convert rotation matrices to Euler angles (see viz.Matrix.getEuler). At pitch
+    +/-90 deg, all rotation around the vertical axis is returned as yaw.
+
+    Args:
+        m: array of rotation or transform matrices
+
+    Returns (..., 3) array of [yaw, pitch, roll] in degrees
+    """
+    m = _rotation(m)
+    sp = np.clip(-m[..., 2, 1], -1.0, 1.0)
+    gimbal = np.abs(sp) > _GIMBAL_LIMIT
+    e = np.empty(m.shape[:-2] + (3,))
+    e[..., 0] = np.where(gimbal, np.arctan2(-m[..., 0, 2], m[..., 0, 0]), np.arctan2(m[..., 2, 0], m[..., 2, 2]))
+    e[..., 1] = np.arcsin(sp)
+    e[..., 2] = np.where(gimbal, 0.0, np.arctan2(m[..., 0, 1], m[..., 1, 1]))
+    return np.degrees(e)
+
+
+def quatToMatrix(quat):
+    """ Convert quaternions to rotation matrices
+
+    Args:
+        quat: array of [x, y, z, w] quaternions, shape (..., 4)
+
+    Returns (..., 3, 3) array
+    """
+    q = np.asarray(quat, dtype=np.float64)
+    x, y, z, w = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    m = np.empty(q.shape[:-1] + (3, 3))
+    m[..., 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    m[..., 0, 1] = 2.0 * (x * y + z * w)
+    m[..., 0, 2] = 2.0 * (x * z - y * w)
+    m[..., 1, 0] = 2.0 * (x * y - z * w)
+    m[..., 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    m[..., 1, 2] = 2.0 * (y * z + x * w)
+    m[..., 2, 0] = 2.0 * (x * z + y * w)
+    m[..., 2, 1] = 2.0 * (y * z - x * w)
+    m[..., 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    return m
+
+
+def matrixToQuat(m):
+    """ Convert rotation matrices to quaternions (see viz.Matrix.getQuat)
+
+    Args:
+        m: array of rotation or transform matrices
+
+    Returns (..., 4) array of [x, y, z, w]
+    """
+    m = _rotation(m)
+    m00, m01, m02 = m[..., 0, 0], m[..., 0, 1], m[..., 0, 2]
+    m10, m11, m12 = m[..., 1, 0], m[..., 1, 1], m[..., 1, 2]
+    m20, m21, m22 = m[..., 2, 0], m[..., 2, 1], m[..., 2, 2]
+    tr = m00 + m11 + m22
+
+    # Four numerically stable cases, depending on the largest diagonal term
+    cases = [tr > 0.0,
+             (m00 > m11) & (m00 > m22),
+             m11 > m22]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        s = np.select(cases, [np.sqrt(np.maximum(tr + 1.0, 0.0)),
+                              np.sqrt(np.maximum(1.0 + m00 - m11 - m22, 0.0)),
+                              np.sqrt(np.maximum(1.0 + m11 - m00 - m22, 0.0))],
+                      np.sqrt(np.maximum(1.0 + m22 - m00 - m11, 0.0))) * 2.0
+        q = np.empty(m.shape[:-2] + (4,))
+        q[..., 0] = np.select(cases, [(m12 - m21) / s, 0.25 * s, (m10 + m01) / s], (m20 + m02) / s)
+        q[..., 1] = np.select(cases, [(m20 - m02) / s, (m10 + m01) / s, 0.25 * s], (m21 + m12) / s)
+        q[..., 2] = np.select(cases, [(m01 - m10) / s, (m20 + m02) / s, (m21 + m12) / s], 0.25 * s)
+        q[..., 3] = np.select(cases, [0.25 * s, (m12 - m21) / s, (m20 - m02) / s], (m01 - m10) / s)
+    return q
+
+
+def eulerToQuat(euler):
+    """ Convert Euler angles ([yaw, pitch, roll], degrees) to [x, y, z, w] quaternions
+
+    Args:
+        euler: array of Euler angles, shape (..., 3)
+    """
+    return matrixToQuat(eulerToMatrix(euler))
+
+
+def quatToEuler(quat):
+    """ Convert [x, y, z, w] quaternions to Euler angles ([yaw, pitch, roll], degrees)
+
+    Args:
+        quat: array of quaternions, shape (..., 4)
+    """
+    return matrixToEuler(quatToMatrix(quat))
+
+
+def eulerToForward(euler):
+    """ Forward (local +Z) direction vectors for Euler angles, e.g. gaze direction
+    from recorded gaze_dirX/Y/Z columns (see viz.Matrix.getForward)
+
+    Args:
+        euler: array of [yaw, pitch, roll] angles in degrees, shape (..., 3) or (..., 2)
+    """
+    e = np.radians(np.asarray(euler, dtype=np.float64))
+    cp = np.cos(e[..., 1])
+    return np.stack([cp * np.sin(e[..., 0]), -np.sin(e[..., 1]), cp * np.cos(e[..., 0])], axis=-1)
+
+
+def quatToForward(quat):
+    """ Forward (local +Z) direction vectors for [x, y, z, w] quaternions
+
+    Args:
+        quat: array of quaternions, shape (..., 4)
+    """
+    q = np.asarray(quat, dtype=np.float64)
+    x, y, z, w = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    return np.stack([2.0 * (x * z + y * w), 2.0 * (y * z - x * w), 1.0 - 2.0 * (x * x + y * y)], axis=-1)
+
+
+def vecRotVecMatrix(v1, v2):
+    """ Rotation matrices that rotate vectors v1 onto v2 along the shortest arc
+    (see vizmat.Transform.makeVecRotVec)
+
+    Args:
+        v1, v2: arrays of vectors, shape (..., 3)
+
+    Returns (..., 3, 3) array
+    """
+    a = normalize(v1)
+    b = normalize(v2)
+    a, b = np.broadcast_arrays(a, b)
+    axis = np.cross(a, b)
+    s = np.sqrt(np.sum(axis * axis, axis=-1))
+    c = np.clip(np.sum(a * b, axis=-1), -1.0, 1.0)
+
+    # Opposite vectors: rotate 180 deg around any perpendicular axis
+    opposite = (s < 1e-12) & (c <= 0.0)
+    if np.any(opposite):
+        ref = np.where(np.abs(a[..., 0:1]) < 0.9, [1.0, 0.0, 0.0], [0.0, 1.0, 0.0])
+        axis = np.where(opposite[..., None], np.cross(a, ref), axis)
+    (x, y, z) = np.moveaxis(normalize(axis), -1, 0)
+    t = np.arctan2(s, c)
+    ct, st = np.cos(t), np.sin(t)
+    C = 1.0 - ct
+
+    # Row-vector form (transpose of Rodrigues' rotation matrix). Parallel vectors
+    # have a zero axis, which yields the identity matrix.
+    m = np.empty(a.shape[:-1] + (3, 3))
+    m[..., 0, 0] = ct + x * x * C
+    m[..., 0, 1] = y * x * C + z * st
+    m[..., 0, 2] = z * x * C - y * st
+    m[..., 1, 0] = x * y * C - z * st
+    m[..., 1, 1] = ct + y * y * C
+    m[..., 1, 2] = z * y * C + x * st
+    m[..., 2, 0] = x * z * C + y * st
+    m[..., 2, 1] = y * z * C - x * st
+    m[..., 2, 2] = ct + z * z * C
+    return m
+
+
+def vecRotVecEuler(v1, v2):
+    """ Euler angles of the rotation from vectors v1 onto v2, e.g. horizontal and
+    vertical gaze error relative to a target as computed in validateEyeTracker().
+    Note that pitch is positive downwards, i.e. vertical angles need to be inverted.
+
+    Args:
+        v1, v2: arrays of vectors, shape (..., 3)
+
+    Returns (..., 3) array of [yaw, pitch, roll] in degrees
+    """
+    return matrixToEuler(vecRotVecMatrix(v1, v2))
+
+
+def slerp(q1, q2, t):
+    """ Spherical linear interpolation between quaternions along the shorter arc
+
+    Args:
+        q1, q2: arrays of [x, y, z, w] quaternions, shape (..., 4)
+        t: interpolation factor(s), 0 = q1 and 1 = q2, scalar or shape (...)
+
+    Returns (..., 4) array of unit quaternions
+    """
+    q1 = normalize(np.asarray(q1, dtype=np.float64))
+    q2 = normalize(np.asarray(q2, dtype=np.float64))
+    t = np.asarray(t, dtype=np.float64)[..., None]
+    d = np.sum(q1 * q2, axis=-1, keepdims=True)
+    q2 = np.where(d < 0.0, -q2, q2)
+    d = np.abs(d)
+
+    # Nearly identical rotations: fall back to linear interpolation
+    theta = np.arccos(np.clip(d, -1.0, 1.0))
+    st = np.sin(theta)
+    close = st < 1e-6
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w1 = np.where(close, 1.0 - t, np.sin((1.0 - t) * theta) / st)
+        w2 = np.where(close, t, np.sin(t * theta) / st)
+    return normalize(w1 * q1 + w2 * q2)
@@ -0,0 +1,1776 @@
+# -*- coding: utf-8 -*-
+
+# Vizard gaze tracking toolbox
+# Headless simulation backend (simulated clock, frame loop, tasks and devices)
+
+import sys
+import math
+import types
+import random
+import bisect
+import inspect
+
+if sys.version_info[0] == 3:
+    from time import perf_counter
+else:
+    from time import clock as perf_counter
+
+
+# Vizard constants used by the toolbox. Values are arbitrary but unique,
+# except for priorities, which define the order of per-frame updates.
+_CONSTANTS = {'ON': 1, 'OFF': 0, 'TOGGLE': -1,
+              'ABS_PARENT': 0, 'REL_PARENT': 1, 'ABS_GLOBAL': 2, 'REL_GLOBAL': 3, 'REL_LOCAL': 4,
+              'BOTH_EYE': 0, 'LEFT_EYE': 1, 'RIGHT_EYE': 2,
+              'INTERSECTION': 1, 'LIGHTING': 2, 'CULLING': 3, 'DEPTH_TEST': 4, 'BLEND': 5,
+              'PRIORITY_PLUGINS': -10, 'PRIORITY_LINKS': -5, 'PRIORITY_DEFAULT': 0,
+              'UPDATE_PLUGINS': 1, 'UPDATE_LINKS': 2,
+              'POINTS': 0, 'LINES': 1, 'LINE_STRIP': 3, 'TRIANGLES': 4, 'QUADS': 7,
+              'STEREO_LEFT': 1, 'STEREO_RIGHT': 2, 'STEREO_HORZ': 4,
+              'ALIGN_LEFT_TOP': 0, 'ALIGN_LEFT_CENTER': 1, 'ALIGN_LEFT_BOTTOM': 2,
+              'ALIGN_CENTER_TOP': 3, 'ALIGN_CENTER_CENTER': 4, 'ALIGN_CENTER_BOTTOM': 5,
+              'ALIGN_RIGHT_TOP': 6, 'ALIGN_RIGHT_CENTER': 7, 'ALIGN_RIGHT_BOTTOM': 8,
+              'ALIGN_CENTER': 4, 'KEY_RETURN': 'KEY_RETURN', 'KEY_ESCAPE': 'KEY_ESCAPE',
+              'WHITE': [1.0, 1.0, 1.0], 'BLACK': [0.0, 0.0, 0.0], 'GRAY': [0.5, 0.5, 0.5],
+              'RED': [1.0, 0.0, 0.0], 'GREEN': [0.0, 1.0, 0.0], 'BLUE': [0.0, 0.0, 1.0],
+              'YELLOW': [1.0, 1.0, 0.0], 'ORANGE': [1.0, 0.5, 0.0], 'PURPLE': [0.5, 0.0, 1.0],
+              'CYAN': [0.0, 1.0, 1.0], 'SKYBLUE': [0.5, 0.75, 1.0]}
+
+# vizshape axis constants and the corresponding local axis vectors
+AXIS_X = 1
+AXIS_Y = 2
+AXIS_Z = 3
+_AXES = {AXIS_X: 0, AXIS_Y: 1, AXIS_Z: 2, -AXIS_X: 0, -AXIS_Y: 1, -AXIS_Z: 2}
+
+# Module names provided by install()
+_MODULES = ['viz', 'vizact', 'viztask', 'vizmat', 'vizshape', 'vizinfo', 'vizdlg', 'vizinput']
+
+# Currently installed simulator
+_sim = None
+
+
+# Vector helpers (3-tuples)
+
+def _vec(args):
+    """ Accept either (x, y, z) or a single 3-element sequence """
+    if len(args) == 1:
+        return [float(v) for v in args[0]]
+    return [float(v) for v in args]
+
+
+def _vec_mode(args, kwargs):
+    """ Split node setter arguments into vector and mode, which Vizard
+    accepts as keyword or as last positional argument """
+    mode = kwargs.get('mode', _CONSTANTS['ABS_PARENT'])
+    if len(args) in (2, 4):
+        mode = args[-1]
+        args = args[0:-1]
+    return (_vec(args), mode)
+
+
+def _sub(a, b):
+    return [a[0] - b[0], a[1] - b[1], a[2] - b[2]]
+
+
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def _cross(a, b):
+    return [a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]]
+
+
+def _norm(a):
+    l = math.sqrt(_dot(a, a))
+    if l == 0.0:
+        return [0.0, 0.0, 0.0]
+    return [a[0] / l, a[1] / l, a[2] / l]
+
+
+def VectorToPoint(begin, end):
+    """ Unit vector pointing from begin to end (vizmat.VectorToPoint) """
+    return _norm(_sub(end, begin))
+
+
+def AngleBetweenVector(v1, v2):
+    """ Angle between two vectors in degrees (vizmat.AngleBetweenVector) """
+    d = _dot(_norm(v1), _norm(v2))
+    return math.degrees(math.acos(max(-1.0, min(1.0, d))))
+
+
+def MoveAlongVector(pos, vec, distance):
+    """ Point at a distance along a direction vector (vizmat.MoveAlongVector) """
+    v = _norm(vec)
+    return [pos[0] + v[0] * distance, pos[1] + v[1] * distance, pos[2] + v[2] * distance]
+
+
+def Interpolate(begin, end, t):
+    """ Linear interpolation of numbers or sequences (vizmat.Interpolate) """
+    if isinstance(begin, (list, tuple)):
+        return [b + (e - b) * t for (b, e) in zip(begin, end)]
+    return begin + (end - begin) * t
+
+
+def Distance(a, b):
+    """ Euclidean distance between two points (vizmat.Distance) """
+    d = _sub(a, b)
+    return math.sqrt(_dot(d, d))
+
+
+
+class SimLine(object):
+    """ Line segment as returned by Transform.getLineForward() """
+
+    def __init__(self, begin, end):
+        self.begin = begin
+        self.end = end
+        self.dir = _norm(_sub(end, begin))
+
+
+
+class SimMatrix(object):
+    """ 4x4 transform matrix following Vizard conventions (row vectors, left-handed,
+    Y up, Euler angles as [yaw, pitch, roll] in degrees, quaternions as [x, y, z, w]).
+    Provides the subset of viz.Matrix / vizmat.Transform used by the toolbox.
+    """
+
+    def __init__(self, m=None):
+        if m is None:
+            self._m = [1.0, 0.0, 0.0, 0.0,
+                       0.0, 1.0, 0.0, 0.0,
+                       0.0, 0.0, 1.0, 0.0,
+                       0.0, 0.0, 0.0, 1.0]
+        elif isinstance(m, SimMatrix):
+            self._m = list(m._m)
+        else:
+            self._m = [float(v) for v in m]
+
+
+    def __deepcopy__(self, memo):
+        return SimMatrix(self._m)
+
+
+    def __repr__(self):
+        return 'SimMatrix(pos={:s}, euler={:s})'.format(str(self.getPosition()), str(self.getEuler()))
+
+
+    def __mul__(self, other):
+        m = SimMatrix(self)
+        m.postMult(other)
+        return m
+
+
+    def copy(self):
+        return SimMatrix(self._m)
+
+
+    def get(self):
+        return list(self._m)
+
+
+    def set(self, m):
+        self._m = [float(v) for v in (m._m if isinstance(m, SimMatrix) else m)]
+
+
+    def makeIdent(self):
+        self._m = SimMatrix()._m
+
+
+    def getPosition(self):
+        return self._m[12:15]
+
+
+    def setPosition(self, *pos):
+        self._m[12:15] = _vec(pos)
+
+
+    def makeTrans(self, *pos):
+        self.makeIdent()
+        self.setPosition(*pos)
+
+
+    def getEuler(self):
+        m = self._m
+        sp = max(-1.0, min(1.0, -m[9]))
+        pitch = math.asin(sp)
+        if abs(sp) > 0.999999:
+            # Gimbal lock: attribute all rotation around Y to yaw
+            yaw = math.atan2(-m[2], m[0])
+            roll = 0.0
+        else:
+            yaw = math.atan2(m[8], m[10])
+            roll = math.atan2(m[1], m[5])
+        return [math.degrees(yaw), math.degrees(pitch), math.degrees(roll)]
+
+
+    def setEuler(self, *euler):
+        (y, p, r) = [math.radians(v) for v in _vec(euler)]
+        cy, sy = math.cos(y), math.sin(y)
+        cp, sp = math.cos(p), math.sin(p)
+        cr, sr = math.cos(r), math.sin(r)
+        # Rows of R(roll) * R(pitch) * R(yaw)
+        self._m[0:3] = [cr * cy + sr * sp * sy, sr * cp, -cr * sy + sr * sp * cy]
+        self._m[4:7] = [-sr * cy + cr * sp * sy, cr * cp, sr * sy + cr * sp * cy]
+        self._m[8:11] = [cp * sy, -sp, cp * cy]
+
+
+    def makeEuler(self, *euler):
+        self.makeIdent()
+        self.setEuler(*euler)
+
+
+    def getQuat(self):
+        m = self._m
+        tr = m[0] + m[5] + m[10]
+        if tr > 0.0:
+            s = math.sqrt(tr + 1.0) * 2.0
+            q = [(m[6] - m[9]) / s, (m[8] - m[2]) / s, (m[1] - m[4]) / s, 0.25 * s]
+        elif m[0] > m[5] and m[0] > m[10]:
+            s = math.sqrt(1.0 + m[0] - m[5] - m[10]) * 2.0
+            q = [0.25 * s, (m[4] + m[1]) / s, (m[8] + m[2]) / s, (m[6] - m[9]) / s]
+        elif m[5] > m[10]:
+            s = math.sqrt(1.0 + m[5] - m[0] - m[10]) * 2.0
+            q = [(m[4] + m[1]) / s, 0.25 * s, (m[9] + m[6]) / s, (m[8] - m[2]) / s]
+        else:
+            s = math.sqrt(1.0 + m[10] - m[0] - m[5]) * 2.0
+            q = [(m[8] + m[2]) / s, (m[9] + m[6]) / s, 0.25 * s, (m[1] - m[4]) / s]
+        return q
+
+
+    def setQuat(self, *quat):
+        (x, y, z, w) = _vec(quat)
+        self._m[0:3] = [1 - 2 * (y * y + z * z), 2 * (x * y + z * w), 2 * (x * z - y * w)]
+        self._m[4:7] = [2 * (x * y - z * w), 1 - 2 * (x * x + z * z), 2 * (y * z + x * w)]
+        self._m[8:11] = [2 * (x * z + y * w), 2 * (y * z - x * w), 1 - 2 * (x * x + y * y)]
+
+
+    def getForward(self):
+        return _norm(self._m[8:11])
+
+
+    def getUp(self):
+        return _norm(self._m[4:7])
+
+
+    def getRight(self):
+        return _norm(self._m[0:3])
+
+
+    def getLineForward(self, length=1.0):
+        p = self.getPosition()
+        return SimLine(p, MoveAlongVector(p, self.getForward(), length))
+
+
+    def makeVecRotVec(self, v1, v2):
+        """ Set rotation that rotates vector v1 onto vector v2 """
+        a = _norm(v1)
+        b = _norm(v2)
+        axis = _cross(a, b)
+        s = math.sqrt(_dot(axis, axis))
+        c = max(-1.0, min(1.0, _dot(a, b)))
+        self.makeIdent()
+        if s < 1e-12:
+            if c > 0.0:
+                return
+            # Opposite vectors: rotate 180 deg around any perpendicular axis
+            axis = _cross(a, [1.0, 0.0, 0.0]) if abs(a[0]) < 0.9 else _cross(a, [0.0, 1.0, 0.0])
+        (x, y, z) = _norm(axis)
+        t = math.atan2(s, c)
+        ct, st = math.cos(t), math.sin(t)
+        C = 1.0 - ct
+        # Row-vector form (transpose of Rodrigues' rotation matrix)
+        self._m[0:3] = [ct + x * x * C, y * x * C + z * st, z * x * C - y * st]
+        self._m[4:7] = [x * y * C - z * st, ct + y * y * C, z * y * C + x * st]
+        self._m[8:11] = [x * z * C + y * st, y * z * C - x * st, ct + z * z * C]
+
+
+    def postMult(self, other):
+        """ self = self * other (i.e., apply other after self) """
+        (b0, b1, b2, b3, b4, b5, b6, b7, b8, b9, b10, b11, b12, b13, b14, b15) = other._m
+        a = self._m
+        m = []
+        for r in (0, 4, 8, 12):
+            (a0, a1, a2, a3) = a[r:r + 4]
+            m += [a0 * b0 + a1 * b4 + a2 * b8 + a3 * b12,
+                  a0 * b1 + a1 * b5 + a2 * b9 + a3 * b13,
+                  a0 * b2 + a1 * b6 + a2 * b10 + a3 * b14,
+                  a0 * b3 + a1 * b7 + a2 * b11 + a3 * b15]
+        self._m = m
+
+
+    def preMult(self, other):
+        """ self = other * self (i.e., apply other before self) """
+        m = SimMatrix(other)
+        m.postMult(self)
+        self._m = m._m
+
+
+    def preTrans(self, *pos):
+        t = SimMatrix()
+        t.setPosition(*pos)
+        self.preMult(t)
+
+
+    def preEuler(self, *euler):
+        r = SimMatrix()
+        r.setEuler(*euler)
+        self.preMult(r)
+
+
+    def postTrans(self, *pos):
+        p = _vec(pos)
+        self._m[12] += p[0]
+        self._m[13] += p[1]
+        self._m[14] += p[2]
+
+
+    def inverse(self):
+        """ Inverse of a rigid (rotation and translation) transform """
+        m = self._m
+        inv = SimMatrix([m[0], m[4], m[8], 0.0,
+                         m[1], m[5], m[9], 0.0,
+                         m[2], m[6], m[10], 0.0,
+                         0.0, 0.0, 0.0, 1.0])
+        p = inv.transformPoint(m[12:15])
+        inv._m[12:15] = [-p[0], -p[1], -p[2]]
+        return inv
+
+
+    def invert(self):
+        self._m = self.inverse()._m
+
+
+    def transformPoint(self, p):
+        m = self._m
+        return [p[0] * m[0] + p[1] * m[4] + p[2] * m[8] + m[12],
+                p[0] * m[1] + p[1] * m[5] + p[2] * m[9] + m[13],
+                p[0] * m[2] + p[1] * m[6] + p[2] * m[10] + m[14]]
+
+
+    def transformVector(self, v):
+        m = self._m
+        return [v[0] * m[0] + v[1] * m[4] + v[2] * m[8],
+                v[0] * m[1] + v[1] * m[5] + v[2] * m[9],
+                v[0] * m[2] + v[1] * m[6] + v[2] * m[10]]
+
+
+
+class SimIntersection(object):
+    """ Intersection test result (see SimScene.intersect) """
+
+    def __init__(self, valid=False, point=None, normal=None, obj=None):
+        self.valid = valid
+        self.point = point if point is not None else [0.0, 0.0, 0.0]
+        self.normal = normal if normal is not None else [0.0, 0.0, 0.0]
+        self.object = obj
+        self.name = '' if obj is None else obj.name
+
+
+
+class SimScene(object):
+    """ Simulated Vizard scene, used for ray intersections and to
+    decide which nodes are visible to the simulated participant """
+
+    def __init__(self, sim, scene_id):
+        self._sim = sim
+        self.id = scene_id
+
+
+    def __repr__(self):
+        return 'SimScene({:d})'.format(self.id)
+
+
+    def getChildren(self):
+        return [n for n in self._sim._nodes.values() if n._parent is None and self in n._scenes]
+
+
+    def intersect(self, begin, end, ignoreBackFace=True, all=False, **kwargs):
+        """ Intersect a line segment with sphere and plane nodes in this scene
+
+        Args:
+            begin (3-tuple): Line start point
+            end (3-tuple): Line end point
+            all (bool): if True, return all intersections sorted by distance
+        """
+        hits = []
+        for node in list(self._sim._nodes.values()):
+            if node._shape is None or not node._intersectable() or not node.inScene(self):
+                continue
+            hit = node._intersect(begin, end)
+            if hit is not None:
+                hits.append(hit)
+        hits.sort(key=lambda h: h[0])
+        if all:
+            return [h[1] for h in hits]
+        if len(hits) > 0:
+            return hits[0][1]
+        return SimIntersection()
+
+
+
+class SimNode(object):
+    """ Simulated Vizard Node3d (groups, shapes, models and text). Keeps a
+    transform hierarchy, visibility and basic appearance state, but does not render.
+    """
+
+    def __init__(self, node_id=None, sim=None, parent=None, scene=None, shape=None, name=None):
+        if sim is None:
+            sim = _sim
+        if node_id is not None and node_id in sim._nodes:
+            # Wrap an existing node (as when subclassing viz.VizNode)
+            self.__dict__ = sim._nodes[node_id].__dict__
+            return
+
+        self._sim = sim
+        self.id = sim._next_id()
+        self.name = name if name is not None else 'node{:d}'.format(self.id)
+        self._local = SimMatrix()
+        self._scale = [1.0, 1.0, 1.0]
+        self._visible = True
+        self._disabled = set()
+        self._color = [1.0, 1.0, 1.0]
+        self._alpha = 1.0
+        self._shape = shape
+        self._children = []
+        self._parent = None
+        self._scenes = set()
+        self._removed = False
+        self._actions = []
+        sim._nodes[self.id] = self
+        self.setParent(parent, scene=scene)
+
+
+    def __repr__(self):
+        return '<SimNode {:d} {:s}>'.format(self.id, self.name)
+
+
+    def __str__(self):
+        return self.name
+
+
+    def setParent(self, parent=None, scene=None):
+        if self._parent is not None and self in self._parent._children:
+            self._parent._children.remove(self)
+        if parent is None or parent is self._sim.WORLD:
+            self._parent = None
+            self._scenes = set([scene if scene is not None else self._sim.MainScene])
+        else:
+            self._parent = parent
+            parent._children.append(self)
+
+
+    def addParent(self, parent, scene=None):
+        if parent is None or parent is self._sim.WORLD:
+            self._scenes.add(scene if scene is not None else self._sim.MainScene)
+        else:
+            self.setParent(parent)
+
+
+    def removeParent(self, parent, scene=None):
+        if parent is None or parent is self._sim.WORLD:
+            self._scenes.discard(scene if scene is not None else self._sim.MainScene)
+
+
+    def getParents(self):
+        return [self._parent] if self._parent is not None else [self._sim.WORLD]
+
+
+    def getChildren(self):
+        return list(self._children)
+
+
+    def getChild(self, name):
+        for c in self._children:
+            if c.name == name:
+                return c
+        # Sub-nodes of model files are not loaded, so create them on request
+        return SimNode(sim=self._sim, parent=self, name=name)
+
+
+    def inScene(self, scene):
+        node = self
+        while node._parent is not None:
+            node = node._parent
+        return scene in node._scenes
+
+
+    def remove(self, children=True):
+        for c in list(self._children):
+            c.remove(children=children)
+        if self._parent is not None and self in self._parent._children:
+            self._parent._children.remove(self)
+        self._removed = True
+        self._sim._nodes.pop(self.id, None)
+
+
+    def copy(self, parent=None, scene=None):
+        n = SimNode(sim=self._sim, parent=parent, scene=scene, shape=self._shape, name=self.name)
+        n._local = SimMatrix(self._local)
+        n._scale = list(self._scale)
+        n._color = list(self._color)
+        n._alpha = self._alpha
+        n._visible = self._visible
+        for c in self._children:
+            c.copy(parent=n)
+        return n
+
+
+    def dynamic(self):
+        pass
+
+
+    def getMatrix(self, mode=0):
+        if mode in (_CONSTANTS['ABS_GLOBAL'], _CONSTANTS['REL_GLOBAL']) and self._parent is not None:
+            m = SimMatrix(self._local)
+            m.postMult(self._parent.getMatrix(mode=_CONSTANTS['ABS_GLOBAL']))
+            return m
+        return SimMatrix(self._local)
+
+
+    def setMatrix(self, matrix, mode=0):
+        m = SimMatrix(matrix)
+        if mode == _CONSTANTS['ABS_GLOBAL'] and self._parent is not None:
+            m.postMult(self._parent.getMatrix(mode=_CONSTANTS['ABS_GLOBAL']).inverse())
+        self._local = m
+
+
+    def getPosition(self, mode=0):
+        return self.getMatrix(mode=mode).getPosition()
+
+
+    def setPosition(self, *pos, **kwargs):
+        (p, mode) = _vec_mode(pos, kwargs)
+        if mode == _CONSTANTS['ABS_GLOBAL']:
+            m = self.getMatrix(mode=mode)
+            m.setPosition(p)
+            self.setMatrix(m, mode=mode)
+        elif mode == _CONSTANTS['REL_PARENT']:
+            self._local.postTrans(p)
+        elif mode == _CONSTANTS['REL_LOCAL']:
+            self._local.preTrans(p)
+        else:
+            self._local.setPosition(p)
+
+
+    def getEuler(self, mode=0):
+        return self.getMatrix(mode=mode).getEuler()
+
+
+    def setEuler(self, *euler, **kwargs):
+        (e, mode) = _vec_mode(euler, kwargs)
+        if mode == _CONSTANTS['ABS_GLOBAL']:
+            m = self.getMatrix(mode=mode)
+            m.setEuler(e)
+            self.setMatrix(m, mode=mode)
+        elif mode in (_CONSTANTS['REL_PARENT'], _CONSTANTS['REL_LOCAL']):
+            self._local.preEuler(e)
+        else:
+            self._local.setEuler(e)
+
+
+    def getQuat(self, mode=0):
+        return self.getMatrix(mode=mode).getQuat()
+
+
+    def setQuat(self, *quat, **kwargs):
+        self._local.setQuat(*quat)
+
+
+    def getForward(self, mode=0):
+        return self.getMatrix(mode=mode).getForward()
+
+
+    def getLineForward(self, mode=0, length=1.0):
+        return self.getMatrix(mode=mode).getLineForward(length)
+
+
+    def setScale(self, *scale, **kwargs):
+        self._scale = _vec(scale)
+
+
+    def getScale(self, mode=0):
+        return list(self._scale)
+
+
+    def visible(self, state=True):
+        if state == _CONSTANTS['TOGGLE']:
+            state = not self._visible
+        self._visible = bool(state)
+        if self._visible:
+            self._sim._attend(self)
+
+
+    def getVisible(self):
+        return self._visible
+
+
+    def isVisibleInTree(self):
+        node = self
+        while node is not None:
+            if not node._visible:
+                return False
+            node = node._parent
+        return True
+
+
+    def color(self, *color, **kwargs):
+        if len(color) > 0:
+            self._color = _vec(color[0:3]) if len(color) >= 3 else _vec(color[0:1])
+
+
+    def getColor(self):
+        return list(self._color)
+
+
+    def alpha(self, value, **kwargs):
+        self._alpha = float(value)
+
+
+    def getAlpha(self):
+        return self._alpha
+
+
+    def disable(self, flag, **kwargs):
+        self._disabled.add(flag)
+
+
+    def enable(self, flag, **kwargs):
+        self._disabled.discard(flag)
+
+
+    def addAction(self, action, pool=0):
+        action._start = self._sim.time
+        self._actions.append(action)
+
+
+    def clearActions(self, pool=0):
+        self._actions = []
+
+
+    def __getattr__(self, name):
+        # Rendering-only methods (text, materials, lighting...) have no effect
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _noop
+
+
+    def _intersectable(self):
+        node = self
+        while node is not None:
+            if _CONSTANTS['INTERSECTION'] in node._disabled or node._removed:
+                return False
+            node = node._parent
+        return self.isVisibleInTree()
+
+
+    def _intersect(self, begin, end):
+        """ Intersect line segment with this shape, returns (distance, SimIntersection) or None """
+        (kind, size, axis) = self._shape
+        w = self.getMatrix(mode=_CONSTANTS['ABS_GLOBAL'])
+        center = w.getPosition()
+        seg = _sub(end, begin)
+        seg_len = math.sqrt(_dot(seg, seg))
+        if seg_len == 0.0:
+            return None
+        d = [v / seg_len for v in seg]
+
+        if kind == 'sphere':
+            r = size * max(self._scale)
+            oc = _sub(begin, center)
+            b = _dot(oc, d)
+            disc = b * b - (_dot(oc, oc) - r * r)
+            if disc < 0.0:
+                return None
+            t = -b - math.sqrt(disc)
+            if t < 0.0:
+                t = -b + math.sqrt(disc)
+            if t < 0.0 or t > seg_len:
+                return None
+            p = MoveAlongVector(begin, d, t)
+            return (t, SimIntersection(True, p, _norm(_sub(p, center)), self))
+
+        elif kind == 'plane':
+            ai = _AXES[axis]
+            n = [w._m[ai * 4], w._m[ai * 4 + 1], w._m[ai * 4 + 2]]
+            denom = _dot(d, n)
+            if abs(denom) < 1e-12:
+                return None
+            t = _dot(_sub(center, begin), n) / denom
+            if t < 0.0 or t > seg_len:
+                return None
+            p = MoveAlongVector(begin, d, t)
+            local = [_dot(_sub(p, center), w._m[i * 4:i * 4 + 3]) for i in range(0, 3)]
+            extent = [local[i] for i in range(0, 3) if i != ai]
+            if abs(extent[0]) > size[0] / 2.0 or abs(extent[1]) > size[1] / 2.0:
+                return None
+            return (t, SimIntersection(True, p, n, self))
+
+        return None
+
+
+
+class SimView(SimNode):
+    """ Simulated viewpoint (viz.MainView) """
+
+    def __init__(self, sim):
+        SimNode.__init__(self, sim=sim, name='MainView')
+        self._headlight = SimLight()
+
+
+    def getHeadLight(self):
+        return self._headlight
+
+
+
+class SimLight(object):
+    """ Simulated light source, only keeps its enabled state """
+
+    def __init__(self):
+        self._enabled = True
+
+
+    def enable(self):
+        self._enabled = True
+
+
+    def disable(self):
+        self._enabled = False
+
+
+    def getEnabled(self):
+        return self._enabled
+
+
+
+class SimWindow(object):
+    """ Simulated display window (viz.MainWindow) """
+
+    def __init__(self, sim):
+        self._sim = sim
+        self._scene = sim.MainScene
+
+
+    def getScene(self):
+        return self._scene
+
+
+    def setScene(self, scene):
+        self._scene = scene
+
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _noop
+
+
+
+def _noop(*args, **kwargs):
+    return None
+
+
+
+class SimWidget(object):
+    """ Placeholder for 2D GUI elements (panels, text boxes, buttons),
+    which keep their text and item state but are never displayed """
+
+    def __init__(self, *args, **kwargs):
+        self._message = str(args[0]) if len(args) > 0 and isinstance(args[0], str) else ''
+        self._value = False
+        self._items = []
+        self._selection = 0
+
+
+    def message(self, text):
+        self._message = str(text)
+
+
+    def getMessage(self):
+        return self._message
+
+
+    def set(self, value):
+        self._value = value
+
+
+    def get(self):
+        return self._value
+
+
+    def addItem(self, item, *args, **kwargs):
+        return item
+
+
+    def addLabelItem(self, label, item, *args, **kwargs):
+        return item
+
+
+    def addItems(self, items):
+        self._items.extend(items)
+
+
+    def getItems(self):
+        return list(self._items)
+
+
+    def select(self, index):
+        self._selection = index
+
+
+    def getSelection(self):
+        return self._selection
+
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: SimWidget()
+
+
+
+class SimAction(object):
+    """ Registered per-frame or event callback (returned by vizact.on*) """
+
+    def __init__(self, sim, func, args=(), priority=0, event=None, match=None, rate=None, repeats=None):
+        self._sim = sim
+        self.func = func
+        self.args = args
+        self.priority = priority
+        self.event = event
+        self.match = match
+        self.rate = rate
+        self.repeats = repeats
+        self._next = None if rate is None else sim.time + rate
+        self._enabled = True
+        self._removed = False
+
+
+    def setEnabled(self, state=True):
+        if state == _CONSTANTS['TOGGLE']:
+            state = not self._enabled
+        self._enabled = bool(state)
+
+
+    def getEnabled(self):
+        return self._enabled
+
+
+    def remove(self):
+        self._removed = True
+        self._enabled = False
+        self._sim._removeAction(self)
+
+
+    def _call(self, *extra):
+        return self.func(*(self.args + extra))
+
+
+    def _timer(self):
+        """ Per-frame check for timer actions """
+        if self._sim.time + 1e-9 >= self._next:
+            self._next += self.rate if self.rate > 0 else 0.0
+            self._call()
+            if self.repeats is not None:
+                self.repeats -= 1
+                if self.repeats < 0:
+                    self.remove()
+
+
+
+class SimLink(object):
+    """ Simulated viz.link: copies the source transform to the destination node on
+    each frame, with optional pre-multiplied linkables and offsets """
+
+    def __init__(self, sim, src, dst, enabled=True, offset=None, **kwargs):
+        self._sim = sim
+        self.src = src
+        self.dst = dst
+        self._enabled = enabled
+        self._pre = []
+        self._post = SimMatrix()
+        if offset is not None:
+            self._post.setPosition(offset)
+        self._action = sim._addAction(SimAction(sim, self.update, priority=_CONSTANTS['PRIORITY_LINKS']))
+        if enabled:
+            self.update()
+
+
+    def update(self):
+        if not self._enabled or not isinstance(self.dst, SimNode) or self.dst._removed:
+            return
+        if not hasattr(self.src, 'getMatrix'):
+            return
+        m = SimMatrix()
+        for pre in self._pre:
+            m.postMult(pre.getMatrix() if hasattr(pre, 'getMatrix') and not isinstance(pre, SimMatrix) else pre)
+        m.postMult(self.src.getMatrix(mode=_CONSTANTS['ABS_GLOBAL']))
+        m.postMult(self._post)
+        self.dst.setMatrix(m, mode=_CONSTANTS['ABS_GLOBAL'])
+
+
+    def preMultLinkable(self, linkable):
+        self._pre.append(linkable)
+
+
+    def preTrans(self, *pos):
+        t = SimMatrix()
+        t.setPosition(*pos)
+        self._pre.append(t)
+
+
+    def preEuler(self, *euler):
+        r = SimMatrix()
+        r.setEuler(*euler)
+        self._pre.append(r)
+
+
+    def postTrans(self, *pos):
+        self._post.postTrans(*pos)
+
+
+    def setEnabled(self, state=True):
+        self._enabled = bool(state)
+
+
+    def getEnabled(self):
+        return self._enabled
+
+
+    def remove(self):
+        self._enabled = False
+        self._action.remove()
+
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _noop
+
+
+
+class SimInputEvent(object):
+    """ Simulated input event (key press, GUI button or sensor button) """
+
+    def __init__(self, kind, key=None, obj=None, time=0.0, seq=0):
+        self.kind = kind
+        self.key = key
+        self.button = key
+        self.object = obj
+        self.sensor = obj
+        self.time = time
+        self._seq = seq
+
+
+
+class SimCondition(object):
+    """ Base class for task wait conditions (viztask.wait*). A condition
+    starts when a task yields it and is polled once per frame. """
+
+    def start(self, sim):
+        pass
+
+
+    def check(self, sim):
+        """ Returns (ready, value) """
+        return (True, None)
+
+
+
+class _WaitTime(SimCondition):
+
+    def __init__(self, seconds):
+        self.seconds = float(seconds)
+
+
+    def start(self, sim):
+        self._end = sim.time + self.seconds
+
+
+    def check(self, sim):
+        return (sim.time + 1e-9 >= self._end, None)
+
+
+
+class _WaitFrame(SimCondition):
+
+    def __init__(self, frames=1):
+        self.frames = int(frames)
+
+
+    def start(self, sim):
+        self._end = sim.frame + self.frames
+
+
+    def check(self, sim):
+        return (sim.frame >= self._end, None)
+
+
+
+class _WaitInput(SimCondition):
+
+    def __init__(self, kind, key=None, obj=None):
+        self.kind = kind
+        self.key = key
+        self.obj = obj
+
+
+    def start(self, sim):
+        self._seq = sim._event_seq
+        sim._respond(self)
+
+
+    def matches(self, ev):
+        if ev.kind != self.kind:
+            return False
+        if self.obj is not None and ev.object is not self.obj:
+            return False
+        if self.key is None:
+            return True
+        if isinstance(self.key, (list, tuple)):
+            return ev.key in self.key
+        return ev.key == self.key
+
+
+    def check(self, sim):
+        for ev in sim._frame_events:
+            if ev._seq > self._seq and self.matches(ev):
+                return (True, ev)
+        return (False, None)
+
+
+
+class _WaitTask(SimCondition):
+
+    def __init__(self, task):
+        self.task = task
+
+
+    def check(self, sim):
+        return (not self.task.alive(), self.task.result)
+
+
+
+class _WaitMulti(SimCondition):
+
+    def __init__(self, conditions, any_ready=True):
+        self.conditions = [_as_condition(c) for c in conditions]
+        self.any_ready = any_ready
+
+
+    def start(self, sim):
+        self._done = {}
+        for c in self.conditions:
+            c.start(sim)
+
+
+    def check(self, sim):
+        for i, c in enumerate(self.conditions):
+            if i not in self._done:
+                (ready, value) = c.check(sim)
+                if ready:
+                    self._done[i] = value
+                    if self.any_ready:
+                        return (True, value)
+        if not self.any_ready and len(self._done) == len(self.conditions):
+            return (True, [self._done[i] for i in range(0, len(self.conditions))])
+        return (False, None)
+
+
+
+class _TaskReturn(Exception):
+    """ Raised by viztask.returnValue() to end a task with a return value """
+
+    def __init__(self, value):
+        Exception.__init__(self)
+        self.value = value
+
+
+
+def returnValue(value=None):
+    """ End the current task and return a value to the waiting task """
+    raise _TaskReturn(value)
+
+
+
+def _as_condition(obj):
+    """ Convert a yielded object into a wait condition """
+    if obj is None:
+        return _WaitFrame(1)
+    if isinstance(obj, SimCondition):
+        return obj
+    if isinstance(obj, SimTask):
+        return _WaitTask(obj)
+    if inspect.isgenerator(obj):
+        return _WaitTask(SimTask(_sim, obj))
+    raise TypeError('Cannot wait for object of type {:s} in headless task'.format(type(obj).__name__))
+
+
+
+class SimTask(object):
+    """ Generator-based task (viztask.schedule). Yielded generators run as
+    sub-tasks in the same frame, their return value is sent back to the caller. """
+
+    def __init__(self, sim, gen):
+        self._sim = sim
+        self._stack = [gen]
+        self._cond = None
+        self._value = None
+        self.result = None
+        sim._tasks.append(self)
+
+
+    def alive(self):
+        return len(self._stack) > 0
+
+
+    def kill(self):
+        self._stack = []
+
+
+    def _step(self):
+        value = self._value
+        while len(self._stack) > 0:
+            if self._cond is not None:
+                (ready, value) = self._cond.check(self._sim)
+                if not ready:
+                    return
+                self._cond = None
+
+            try:
+                y = self._stack[-1].send(value)
+            except _TaskReturn as r:
+                value = r.value
+                self._stack.pop()
+                continue
+            except StopIteration as s:
+                value = getattr(s, 'value', None)
+                self._stack.pop()
+                continue
+
+            value = None
+            if inspect.isgenerator(y):
+                self._stack.append(y)
+            else:
+                self._cond = _as_condition(y)
+                self._cond.start(self._sim)
+
+        self.result = value
+
+
+
+class SimEyeTracker(object):
+    """ Synthetic binocular eye tracker sensor. Gaze is directed at an explicit
+    target, or else at the most recently shown node in the active scene
+    (e.g., a fixation or validation target), or straight ahead. Gaze direction includes
+    a constant offset (accuracy) and Gaussian noise (precision).
+    """
+
+    def __init__(self, sim, offset=(0.5, -0.3), noise=0.15, missing=0.0, ipd=0.063,
+                 pupil=3.5, calibration_time=2.0, seed=None):
+        """ Create a synthetic eye tracker (usually via Simulator.addEyeTracker)
+
+        Args:
+            sim: Simulator instance
+            offset (2-tuple): Systematic gaze offset (yaw, pitch) in degrees
+            noise (float): SD of sample-to-sample gaze noise in degrees
+            missing (float): Probability of a missing sample (closed eyes) per frame
+            ipd (float): Inter-pupillary distance in m
+            pupil (float): Mean pupil diameter in mm
+            calibration_time (float): Duration of simulated calibration, in s
+            seed: Random seed for gaze noise
+        """
+        self._sim = sim
+        self.offset = offset
+        self.noise = noise
+        self.missing = missing
+        self.ipd = ipd
+        self.pupil = pupil
+        self.calibration_time = calibration_time
+        self.target = None
+        self._rng = random.Random(seed)
+        self._mats = {}
+        self._open = True
+        self.update()
+        sim._addAction(SimAction(sim, self.update, priority=_CONSTANTS['PRIORITY_PLUGINS']))
+
+
+    def setTarget(self, target=None):
+        """ Set gaze target as a node or world position, or None to follow visible nodes """
+        self.target = target
+
+
+    def _target_point(self):
+        """ Current gaze target in world coordinates, or None """
+        t = self.target
+        if t is None:
+            t = self._sim.getAttendedNode()
+        if t is None:
+            return None
+        if isinstance(t, SimNode):
+            return t.getPosition(mode=_CONSTANTS['ABS_GLOBAL'])
+        return list(t)
+
+
+    def update(self):
+        """ Compute new gaze samples for the current frame """
+        self._open = self._rng.random() >= self.missing
+        head = self._sim.MainView.getMatrix(mode=_CONSTANTS['ABS_GLOBAL'])
+        target = self._target_point()
+        if target is not None:
+            target = head.inverse().transformPoint(target)
+        noise_yaw = self._rng.gauss(0.0, self.noise)
+        noise_pitch = self._rng.gauss(0.0, self.noise)
+        for (flag, x) in ((_CONSTANTS['BOTH_EYE'], 0.0),
+                          (_CONSTANTS['LEFT_EYE'], -self.ipd / 2.0),
+                          (_CONSTANTS['RIGHT_EYE'], self.ipd / 2.0)):
+            m = SimMatrix()
+            if self._open:
+                if target is not None:
+                    v = _norm(_sub(target, [x, 0.0, 0.0]))
+                    yaw = math.degrees(math.atan2(v[0], v[2]))
+                    pitch = math.degrees(math.atan2(-v[1], math.sqrt(v[0] ** 2 + v[2] ** 2)))
+                else:
+                    yaw, pitch = 0.0, 0.0
+                m.setEuler([yaw + self.offset[0] + noise_yaw, pitch + self.offset[1] + noise_pitch, 0.0])
+                m.setPosition([x, 0.0, 0.0])
+            self._mats[flag] = m
+
+
+    def getMatrix(self, flag=0):
+        return SimMatrix(self._mats[flag])
+
+
+    def getPosition(self, flag=0):
+        return self._mats[flag].getPosition()
+
+
+    def getEuler(self, flag=0):
+        return self._mats[flag].getEuler()
+
+
+    def getPupilDiameter(self, flag=0):
+        if not self._open:
+            return -1.0
+        return self.pupil + self._rng.gauss(0.0, 0.05)
+
+
+    def getEyeOpen(self, flag=0):
+        return 1.0 if self._open else 0.0
+
+
+    def calibrate(self):
+        """ Simulated calibration, returns a wait condition """
+        return _WaitTime(self.calibration_time)
+
+
+
+class ViveProEyeTracker(SimEyeTracker):
+    """ Synthetic eye tracker with the class name of Vizard's Vive Pro Eye sensor,
+    so that SampleRecorder records it like the real device (monocular data via
+    the eye flag, pupil size and eye openness).
+    """
+    pass
+
+
+
+def sinusoidMotion(pos=(0.0, 1.7, 0.0), euler=(0.0, 0.0, 0.0), pos_amp=(0.005, 0.005, 0.005),
+                   euler_amp=(1.0, 0.5, 0.2), period=4.0):
+    """ Create a smooth periodic motion function, e.g. for head or hand sway.
+
+    Args:
+        pos (3-tuple): Center position
+        euler (3-tuple): Center orientation (yaw, pitch, roll)
+        pos_amp (3-tuple): Position amplitude in m, per axis
+        euler_amp (3-tuple): Orientation amplitude in degrees, per axis
+        period (float): Period of the slowest component in s
+
+    Returns: function of simulation time returning (position, euler)
+    """
+    def motion(t):
+        p = [pos[i] + pos_amp[i] * math.sin(2.0 * math.pi * t / (period * (1.0 + 0.37 * i))) for i in range(0, 3)]
+        e = [euler[i] + euler_amp[i] * math.sin(2.0 * math.pi * t / (period * (1.0 + 0.29 * i)) + i) for i in range(0, 3)]
+        return (p, e)
+    return motion
+
+
+
+class Simulator(object):
+    """ Headless execution backend for the toolbox. Provides a simulated clock
+    and frame loop, the Vizard task scheduler and event callbacks, a minimal
+    scene graph, and synthetic tracker and node sources. Frames are simulated
+    as fast as possible instead of in real time.
+
+    Use install() to create a Simulator and make it available as the
+    viz, vizact, viztask (...) modules.
+    """
+
+    def __init__(self, frame_rate=90.0, seed=None):
+        """ Create a new simulator
+
+        Args:
+            frame_rate (float): Simulated display refresh rate in Hz
+            seed: Random seed for synthetic sources and responses
+        """
+        self.frame_rate = float(frame_rate)
+        self.frame = 0
+        self.time = 0.0
+        self.WORLD = SimWidget()
+        self._rng = random.Random(seed)
+        self._id = 0
+        self._nodes = {}
+        self._actions = []
+        self._action_seq = 0
+        self._tasks = []
+        self._inputs = []
+        self._frame_events = []
+        self._event_seq = 0
+        self._attention = []
+        self._ignored = set()
+        self._responder = None
+        self._quit = False
+        self._wall_time = 0.0
+
+        self.MainScene = SimScene(self, 1)
+        self._scenes = [self.MainScene]
+        self.MainWindow = SimWindow(self)
+        self.MainView = SimView(self)
+        self._addAction(SimAction(self, self._runTasks, priority=_CONSTANTS['PRIORITY_DEFAULT']))
+
+
+    def _next_id(self):
+        self._id += 1
+        return self._id
+
+
+    def _addAction(self, action):
+        self._action_seq += 1
+        bisect.insort(self._actions, (action.priority, self._action_seq, action))
+        return action
+
+
+    def _removeAction(self, action):
+        self._actions = [a for a in self._actions if a[2] is not action]
+
+
+    def _attend(self, node):
+        """ Remember a node that was just made visible (see getAttendedNode) """
+        if node in self._ignored:
+            return
+        if node in self._attention:
+            self._attention.remove(node)
+        self._attention.append(node)
+
+
+    def ignoreNode(self, node):
+        """ Never direct simulated gaze at a node, e.g. a gaze or pointing cursor """
+        self._ignored.add(node)
+        if node in self._attention:
+            self._attention.remove(node)
+
+
+    def getAttendedNode(self):
+        """ Return the node most recently made visible that is still visible in
+        the current scene, i.e. the simulated participant's point of regard, or None """
+        scene = self.MainWindow.getScene()
+        for node in reversed(self._attention):
+            if node._removed:
+                self._attention.remove(node)
+            elif node.isVisibleInTree() and node.inScene(scene):
+                return node
+        return None
+
+
+    # Clock
+
+    def tick(self):
+        """ Simulated time since start, in seconds (viz.tick) """
+        return self.time
+
+
+    def getFrameNumber(self):
+        return self.frame
+
+
+    def getFrameElapsed(self):
+        return 1.0 / self.frame_rate
+
+
+    # Frame loop
+
+    def step(self, frames=1):
+        """ Simulate one or more display frames
+
+        Args:
+            frames (int): Number of frames to simulate
+        """
+        t_start = perf_counter()
+        for f in range(0, frames):
+            self.frame += 1
+            self.time = self.frame / self.frame_rate
+            self._dispatchInput()
+            for (priority, seq, action) in list(self._actions):
+                if action._enabled:
+                    if action.event is None and action.rate is None:
+                        action._call()
+                    elif action.rate is not None:
+                        action._timer()
+        self._wall_time += perf_counter() - t_start
+
+
+    def run(self, task=None, duration=None, max_frames=None):
+        """ Run the frame loop as fast as possible
+
+        Args:
+            task: Optional task (generator, generator function or scheduled task)
+                to run. The loop stops when this task has finished.
+            duration (float): Maximum simulated time to run, in seconds
+            max_frames (int): Maximum number of frames to simulate
+
+        Returns: return value of task, if any
+        """
+        if task is not None and not isinstance(task, SimTask):
+            task = self.schedule(task)
+        t_end = None if duration is None else self.time + duration
+        f_end = None if max_frames is None else self.frame + max_frames
+        self._quit = False
+
+        while not self._quit:
+            if task is not None and not task.alive():
+                break
+            if task is None and t_end is None and f_end is None and len(self._tasks) == 0:
+                break
+            if (t_end is not None and self.time >= t_end) or (f_end is not None and self.frame >= f_end):
+                break
+            self.step()
+
+        if task is not None:
+            return task.result
+
+
+    def quit(self):
+        """ Stop the frame loop after the current frame (viz.quit) """
+        self._quit = True
+
+
+    def stats(self):
+        """ Return simulated frames and time, wall-clock time spent in the
+        frame loop and the resulting speed-up factor relative to real time """
+        return {'frames': self.frame,
+                'sim_time': self.time,
+                'wall_time': self._wall_time,
+                'speedup': self.time / self._wall_time if self._wall_time > 0 else 0.0}
+
+
+    def update(self, flags=0):
+        """ Force an immediate update of sources and/or links (viz.update) """
+        for (priority, seq, action) in list(self._actions):
+            if not action._enabled or action.event is not None:
+                continue
+            if priority == _CONSTANTS['PRIORITY_PLUGINS'] and flags & _CONSTANTS['UPDATE_PLUGINS']:
+                action._call()
+            elif priority == _CONSTANTS['PRIORITY_LINKS'] and flags & _CONSTANTS['UPDATE_LINKS']:
+                action._call()
+
+
+    # Tasks
+
+    def schedule(self, task, *args, **kwargs):
+        """ Schedule a task (viztask.schedule)
+
+        Args:
+            task: Generator, or function returning a generator
+        """
+        if isinstance(task, SimTask):
+            return task
+        if not inspect.isgenerator(task):
+            task = task(*args, **kwargs)
+            if not inspect.isgenerator(task):
+                return None
+        return SimTask(self, task)
+
+
+    def _runTasks(self):
+        for t in list(self._tasks):
+            t._step()
+            if not t.alive() and t in self._tasks:
+                self._tasks.remove(t)
+
+
+    # Input
+
+    def _dispatchInput(self):
+        self._frame_events = []
+        due = [i for i in self._inputs if i[0] <= self.time + 1e-9]
+        if len(due) == 0:
+            return
+        self._inputs = [i for i in self._inputs if i[0] > self.time + 1e-9]
+        for (t, kind, key, obj) in due:
+            self._event_seq += 1
+            ev = SimInputEvent(kind, key=key, obj=obj, time=self.time, seq=self._event_seq)
+            self._frame_events.append(ev)
+            for (priority, seq, action) in list(self._actions):
+                if action._enabled and action.event == kind and (action.match is None or action.match(ev)):
+                    action._call()
+
+
+    def _queueInput(self, kind, key=None, obj=None, delay=0.0):
+        self._inputs.append((self.time + delay, kind, key, obj))
+
+
+    def pressKey(self, key, delay=0.0):
+        """ Simulate a key press (keydown and keyup events)
+
+        Args:
+            key (str): Key code, e.g. ' '
+            delay (float): Delay in s before the key is pressed
+        """
+        self._queueInput('keydown', key=key, delay=delay)
+        self._queueInput('keyup', key=key, delay=delay + 1.0 / self.frame_rate)
+
+
+    def pressButton(self, button, delay=0.0):
+        """ Simulate a click on a GUI button """
+        self._queueInput('buttondown', obj=button, delay=delay)
+        self._queueInput('buttonup', obj=button, delay=delay + 1.0 / self.frame_rate)
+
+
+    def pressSensorButton(self, sensor, button, delay=0.0):
+        """ Simulate pressing a button on a sensor, e.g. a VR controller """
+        self._queueInput('sensordown', key=button, obj=sensor, delay=delay)
+        self._queueInput('sensorup', key=button, obj=sensor, delay=delay + 1.0 / self.frame_rate)
+
+
+    def setResponder(self, rt=(0.3, 0.8)):
+        """ Automatically respond to any task waiting for a key, GUI button or
+        sensor button after a random response time, simulating a participant.
+
+        Args:
+            rt (2-tuple): Range of response times in s, or None to disable
+        """
+        self._responder = rt
+
+
+    def _respond(self, cond):
+        if self._responder is None:
+            return
+        delay = self._rng.uniform(self._responder[0], self._responder[1])
+        key = cond.key
+        if isinstance(key, (list, tuple)):
+            key = key[0]
+        elif key is None and cond.kind in ['keydown', 'keyup']:
+            key = ' '
+        self._queueInput(cond.kind, key=key, obj=cond.obj, delay=delay)
+
+
+    # Sources and devices
+
+    def addSource(self, node, motion):
+        """ Drive a node's position and orientation from a function of simulated time,
+        updated on each frame before sample recording
+
+        Args:
+            node: Node to move
+            motion: function t -> (position, euler), see sinusoidMotion()
+        """
+        def update():
+            (p, e) = motion(self.time)
+            node.setPosition(p)
+            node.setEuler(e)
+        update()
+        return self._addAction(SimAction(self, update, priority=_CONSTANTS['PRIORITY_PLUGINS']))
+
+
+    def addEyeTracker(self, **kwargs):
+        """ Create a synthetic Vive Pro Eye tracker, see SimEyeTracker for arguments """
+        return ViveProEyeTracker(self, **kwargs)
+
+
+    # Module functions (viz, vizact, viztask, vizshape)
+
+    def addGroup(self, parent=None, scene=None, **kwargs):
+        return SimNode(sim=self, parent=parent, scene=scene)
+
+
+    def addChild(self, file_name='', parent=None, scene=None, **kwargs):
+        return SimNode(sim=self, parent=parent, scene=scene, name=str(file_name))
+
+
+    def addText3D(self, text='', parent=None, scene=None, **kwargs):
+        return SimNode(sim=self, parent=parent, scene=scene, name=str(text))
+
+
+    def addShape(self, kind, size, axis=AXIS_Y, parent=None, scene=None, color=None, alpha=None, pos=None, **kwargs):
+        node = SimNode(sim=self, parent=parent, scene=scene, shape=(kind, size, axis))
+        if color is not None:
+            node.color(color)
+        if alpha is not None:
+            node.alpha(alpha)
+        if pos is not None:
+            node.setPosition(pos)
+        return node
+
+
+    def addScene(self, **kwargs):
+        scene = SimScene(self, len(self._scenes) + 1)
+        self._scenes.append(scene)
+        return scene
+
+
+    def link(self, src, dst, **kwargs):
+        return SimLink(self, src, dst, **kwargs)
+
+
+    def intersect(self, begin, end, **kwargs):
+        return self.MainWindow.getScene().intersect(begin, end, **kwargs)
+
+
+    def onupdate(self, priority, func, *args):
+        return self._addAction(SimAction(self, func, args, priority=priority))
+
+
+    def ontimer(self, rate, func, *args):
+        return self._addAction(SimAction(self, func, args, rate=rate))
+
+
+    def ontimer2(self, rate, repeats, func, *args):
+        return self._addAction(SimAction(self, func, args, rate=rate, repeats=repeats))
+
+
+    def _onInput(self, kind, cond, func, args):
+        return self._addAction(SimAction(self, func, args, event=kind, match=cond.matches))
+
+
+    def _module(self, name):
+        """ Create or update a module namespace provided by this simulator """
+        mod = sys.modules.get(name)
+        if not isinstance(mod, _HeadlessModule):
+            mod = _HeadlessModule(name)
+        for key in list(mod.__dict__.keys()):
+            if not key.startswith('__'):
+                delattr(mod, key)
+
+        if name == 'viz':
+            mod.__dict__.update(_CONSTANTS)
+            mod.__dict__.update({'tick': self.tick, 'getFrameNumber': self.getFrameNumber,
+                                 'getFrameElapsed': self.getFrameElapsed, 'update': self.update,
+                                 'quit': self.quit, 'go': _noop, 'setMultiSample': _noop,
+                                 'addGroup': self.addGroup, 'addChild': self.addChild, 'add': self.addChild,
+                                 'addText3D': self.addText3D, 'addScene': self.addScene, 'link': self.link,
+                                 'intersect': self.intersect, 'addLight': self.addGroup,
+                                 'addText': SimWidget, 'addTextbox': SimWidget, 'addDropList': SimWidget,
+                                 'addButtonLabel': SimWidget, 'addCheckbox': SimWidget,
+                                 'addProgressBar': SimWidget, 'addSlider': SimWidget,
+                                 'startLayer': _noop, 'endLayer': self.addGroup, 'vertex': _noop,
+                                 'vertexColor': _noop, 'pointSize': _noop, 'lineWidth': _noop,
+                                 'Matrix': SimMatrix, 'VizNode': SimNode, 'WORLD': self.WORLD,
+                                 'MainView': self.MainView, 'MainWindow': self.MainWindow,
+                                 'MainScene': self.MainScene, 'RightTop': SimWidget(),
+                                 'LeftTop': SimWidget(), 'CenterCenter': SimWidget()})
+
+        elif name == 'vizact':
+            waitinput = lambda kind, wrap: lambda key, func, *args: self._onInput(kind, wrap(key), func, args)
+            mod.__dict__.update({'onupdate': self.onupdate, 'ontimer': self.ontimer, 'ontimer2': self.ontimer2,
+                                 'onkeydown': waitinput('keydown', lambda k: _WaitInput('keydown', key=k)),
+                                 'onkeyup': waitinput('keyup', lambda k: _WaitInput('keyup', key=k)),
+                                 'onbuttondown': waitinput('buttondown', lambda b: _WaitInput('buttondown', obj=b)),
+                                 'onbuttonup': waitinput('buttonup', lambda b: _WaitInput('buttonup', obj=b)),
+                                 'onsensordown': lambda sensor, button, func, *args: self._onInput(
+                                     'sensordown', _WaitInput('sensordown', key=button, obj=sensor), func, args),
+                                 'onsensorup': lambda sensor, button, func, *args: self._onInput(
+                                     'sensorup', _WaitInput('sensorup', key=button, obj=sensor), func, args),
+                                 'waittime': _WaitTime, 'fadeTo': SimWidget})
+
+        elif name == 'viztask':
+            mod.__dict__.update({'schedule': self.schedule, 'returnValue': returnValue,
+                                 'waitTime': _WaitTime, 'waitFrame': _WaitFrame, 'waitTask': _WaitTask,
+                                 'waitKeyDown': lambda key=None, **kw: _WaitInput('keydown', key=key),
+                                 'waitKeyUp': lambda key=None, **kw: _WaitInput('keyup', key=key),
+                                 'waitButtonDown': lambda button=None, **kw: _WaitInput('buttondown', obj=button),
+                                 'waitButtonUp': lambda button=None, **kw: _WaitInput('buttonup', obj=button),
+                                 'waitSensorDown': lambda sensor=None, button=None, **kw: _WaitInput('sensordown', key=button, obj=sensor),
+                                 'waitSensorUp': lambda sensor=None, button=None, **kw: _WaitInput('sensorup', key=button, obj=sensor),
+                                 'waitActionEnd': lambda node=None, action=None: _WaitFrame(1),
+                                 'waitAny': lambda conditions: _WaitMulti(conditions, any_ready=True),
+                                 'waitAll': lambda conditions: _WaitMulti(conditions, any_ready=False)})
+
+        elif name == 'vizmat':
+            mod.__dict__.update({'Transform': SimMatrix, 'VectorToPoint': VectorToPoint,
+                                 'AngleBetweenVector': AngleBetweenVector, 'MoveAlongVector': MoveAlongVector,
+                                 'Interpolate': Interpolate, 'Distance': Distance})
+
+        elif name == 'vizshape':
+            mod.__dict__.update({'AXIS_X': AXIS_X, 'AXIS_Y': AXIS_Y, 'AXIS_Z': AXIS_Z,
+                                 'addSphere': lambda radius=0.5, **kw: self.addShape('sphere', radius, **kw),
+                                 'addCylinder': lambda height=1.0, radius=0.5, **kw: self.addShape('cylinder', radius, **kw),
+                                 'addPlane': lambda size=(1.0, 1.0), **kw: self.addShape('plane', size, **kw),
+                                 'addBox': lambda size=(1.0, 1.0, 1.0), **kw: self.addShape('box', size, **kw),
+                                 'addCube': lambda size=1.0, **kw: self.addShape('box', size, **kw),
+                                 'addQuad': lambda size=(1.0, 1.0), **kw: self.addShape('plane', size, axis=AXIS_Z, **kw),
+                                 'addAxes': lambda **kw: self.addGroup(**kw)})
+
+        elif name in ['vizinfo', 'vizdlg']:
+            mod.__dict__.update({'InfoPanel': SimWidget, 'TabPanel': SimWidget,
+                                 'GridPanel': SimWidget, 'Panel': SimWidget})
+
+        elif name == 'vizinput':
+            mod.__dict__.update({'fileOpen': lambda *args, **kwargs: '',
+                                 'fileSave': lambda *args, **kwargs: '',
+                                 'input': lambda *args, **kwargs: ''})
+
+        return mod
+
+
+
+class _HeadlessModule(types.ModuleType):
+    """ Module object for the simulated Vizard modules. Accessing an attribute
+    that the headless backend does not provide raises a descriptive error. """
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        raise AttributeError('{:s}.{:s} is not supported by the headless backend'.format(self.__name__, name))
+
+
+
+def install(frame_rate=90.0, seed=None, force=False):
+    """ Create a Simulator and install it as the viz, vizact, viztask, vizmat,
+    vizshape, vizinfo, vizdlg and vizinput modules, so that Experiment, SampleRecorder
+    and experiment scripts run without Vizard. Also makes the Vizard-dependent
+    toolbox classes available in the vzgazetoolbox namespace.
+
+    Calling install() again replaces the previous simulator (e.g. between test runs).
+
+    Args:
+        frame_rate (float): Simulated display refresh rate in Hz
+        seed: Random seed for synthetic sources and responses
+        force (bool): if True, install even if Vizard itself is available
+
+    Returns: Simulator instance
+    """
+    global _sim
+    viz = sys.modules.get('viz')
+    if viz is None and not force:
+        try:
+            import viz
+        except ImportError:
+            viz = None
+    if viz is not None and not isinstance(viz, _HeadlessModule) and not force:
+        raise RuntimeError('Vizard is available, use force=True to run headless anyway.')
+
+    _sim = Simulator(frame_rate=frame_rate, seed=seed)
+    for name in _MODULES:
+        sys.modules[name] = _sim._module(name)
+
+    # Toolbox modules that depend on Vizard (see __init__.py)
+    package = sys.modules[__name__.rsplit('.', 1)[0]]
+    for sub, names in package._VIZARD_EXPORTS.items():
+        module = __import__('{:s}.{:s}'.format(package.__name__, sub), fromlist=['*'])
+        for n in names:
+            setattr(package, n, getattr(module, n))
+            if n not in package.__all__:
+                package.__all__.append(n)
+    return _sim
+
+
+def getSimulator():
+    """ Return the currently installed Simulator, or None """
+    return _sim
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+# Vizard gaze tracking toolbox
+# Deferred imports of optional packages (does not depend on Vizard)
+
+import sys
+import importlib
+
+
+class LazyModule(object):
+    """ Placeholder for a module that is imported on first attribute access,
+    e.g. np = LazyModule('numpy'). Importing numpy, pandas and matplotlib
+    takes most of a second, which would otherwise be spent whenever the
+    toolbox is imported, even if no analysis functions are used. """
+
+    def __init__(self, name):
+        """ Create a module placeholder
+
+        Args:
+            name (str): Full module name, e.g. 'matplotlib.pyplot'
+        """
+        self._name = name
+        self._module = None
+
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+    def __repr__(self):
+        state = 'imported' if self._module is not None else 'not imported'
+        return '<LazyModule {:s} ({:s})>'.format(self._name, state)
+
+
+# Results of module lookups, as searching sys.path takes a few ms per module
+_available = {}
+
+
+def _moduleAvailable(name):
+    """ Check whether a single top-level module can be imported """
+    if name not in _available:
+        if name in sys.modules:
+            _available[name] = True
+        else:
+            try:
+                from importlib.util import find_spec
+                _available[name] = find_spec(name) is not None
+            except ImportError:
+                # Python 2
+                import imp
+                try:
+                    imp.find_module(name)
+                    _available[name] = True
+                except ImportError:
+                    _available[name] = False
+    return _available[name]
+
+
+def modulesAvailable(*names):
+    """ Check whether top-level modules can be imported, without importing them
+
+    Args:
+        *names (str): Module names, e.g. 'numpy', 'pandas'
+    """
+    for name in names:
+        if not _moduleAvailable(name):
+            return False
+    return True
@@ -20,6 +20,7 @@ import vizshape
 from .data import *
 from .stats import *
 from .eyeball import Eyeball
+from .tracing import Tracer
 
 # Python version compatibility
 if sys.version_info[0] == 3:
@@ -89,8 +90,22 @@ class SampleRecorder(object):
         self._val_samples = []
         self._events = []
         self._customvars = ParamSet()
+        self._customvars_dict = {}
+        self._customvars_version = None
         self._recorder = vizact.onupdate(self.priority, self._onUpdate)
 
+        # Timeline tracing (replaced by the Experiment's tracer, see Experiment.enableTracing)
+        self._tracer = Tracer()
+        self.long_frame_factor = 1.5
+        self._min_frame_elapsed = None
+
+        # Streaming data quality measures, updated on each recorded frame (see getDataQuality)
+        self.data_quality = True
+        self._dq_x = RunningStats()
+        self._dq_y = RunningStats()
+        self._dq_acc = RunningStats()
+        self._dq_target = None
+
         # Gaze validation
         self._scene = viz.addScene()
         self.fix_size = 0.5 # radius in degrees
@@ -302,14 +317,14 @@ class SampleRecorder(object):
 
     def getValResults(self):
         """ Return results of all eye tracker validations performed as a list """
-        return copy.deepcopy(self._validation_results)
+        return [v.copy() for v in self._validation_results]
 
 
     def getLastValResult(self):
         """ Return a copy of the ValidationResult object resulting from the most
         recent gaze validation measurement. """
         if len(self._validation_results) > 0:
-            return copy.deepcopy(self._validation_results[-1])
+            return self._validation_results[-1].copy()
         else:
             return None
 
@@ -388,7 +403,7 @@ class SampleRecorder(object):
             value: Value to store
         """
         if type(variable) == dict:
-            self._customvars.__dict__.update(variable)
+            ParamSet.update(self._customvars, variable)
         else:    
             self._customvars[variable] = value
     
@@ -399,7 +414,7 @@ class SampleRecorder(object):
         Args:
             variable (str): Name of variable to set or change
         """
-        if variable in self._customvars.keys():
+        if variable in self._customvars:
             return self._customvars[variable]
         else:
             raise KeyError('The requested custom variable was never set!')
@@ -538,7 +553,8 @@ class SampleRecorder(object):
             raise RuntimeError('No eye tracker set up, calibrateEyeTracker() method not available!')
 
         self._dlog('Starting eye tracker calibration.')
-        yield self._tracker.calibrate()
+        with self._tracer.span('calibrateEyeTracker', cat='calibration', track='recorder'):
+            yield self._tracker.calibrate()
         self._dlog('Eye tracker calibration finished.')    
 
 
@@ -566,6 +582,9 @@ class SampleRecorder(object):
             else:
                 # Central target drift check (default)
                 targets = VAL_TAR_C
+        tr = self._tracer
+        span = tr.span('validateEyeTracker', cat='validation', track='recorder', targets=len(targets))
+        setup_span = tr.span('validation setup', cat='validation', track='recorder')
 
         # Set up targets in validation scene
         root = viz.addGroup(scene=self._scene)
@@ -617,6 +636,7 @@ class SampleRecorder(object):
         viz.MainWindow.setScene(self._scene)
         prev_headlight_state = viz.MainView.getHeadLight().getEnabled()
         viz.MainView.getHeadLight().enable()
+        setup_span.end()
         self._dlog('Validation scene set up complete')
 
         # Initialize validation recorder
@@ -637,6 +657,7 @@ class SampleRecorder(object):
             d = {}
 
             # Record gaze samples
+            tar_span = tr.span('validation target', cat='validation', track='recorder', target=c)
             yield viztask.waitTime(1.0)
             val_recorder.setEnabled(True)
             if self.recording:
@@ -746,55 +767,19 @@ class SampleRecorder(object):
                         gazeXM[eyei].append(gXM)
                         gazeYM[eyei].append(gYM)
 
-            # Gaze position and offset
-            d['avgX'] = mean(gazeX)
-            d['avgY'] = mean(gazeY)
-            d['medX'] = median(gazeX)
-            d['medY'] = median(gazeY)
-            d['offX'] = mean(deltaX)
-            d['offY'] = mean(deltaY)
-
-            # Accuracy 
-            d['acc'] = mean(delta)
-            d['accX'] = mean([abs(v) for v in deltaX])
-            d['accY'] = mean([abs(v) for v in deltaY])
-            d['medacc'] = median(delta)
-            d['medaccX'] = median([abs(v) for v in deltaX])
-            d['medaccY'] = median([abs(v) for v in deltaY])
-
-            # Precision
-            d['sd'] = sd(delta)
-            d['sdX'] = sd(deltaX)
-            d['sdY'] = sd(deltaY)
-            d['rmsi'] = rmsi(delta)
-            d['rmsiX'] = rmsi(deltaX)
-            d['rmsiY'] = rmsi(deltaY)
+            # Gaze position and offset, accuracy, precision
+            self._storeTargetMeasures(d, '', gazeX, gazeY, delta, deltaX, deltaY)
 
             # Monocular measures and IPD
             if self._tracker_has_eye_flag:
                 d['ipd'] = mean(ipdM)
                 for eyei, eye in enumerate(['L', 'R']):
-                    d['avgX_{:s}'.format(eye)] = mean(gazeXM[eyei])
-                    d['avgY_{:s}'.format(eye)] = mean(gazeYM[eyei])
-                    d['medX_{:s}'.format(eye)] = median(gazeXM[eyei])
-                    d['medY_{:s}'.format(eye)] = median(gazeYM[eyei])
-                    d['offX_{:s}'.format(eye)] = mean(deltaXM[eyei])
-                    d['offY_{:s}'.format(eye)] = mean(deltaYM[eyei])
-                    d['acc_{:s}'.format(eye)] = mean(deltaM[eyei])
-                    d['accX_{:s}'.format(eye)] = mean([abs(v) for v in deltaXM[eyei]])
-                    d['accY_{:s}'.format(eye)] = mean([abs(v) for v in deltaYM[eyei]])
-                    d['medacc_{:s}'.format(eye)] = median(deltaM[eyei])
-                    d['medaccX_{:s}'.format(eye)] = median([abs(v) for v in deltaXM[eyei]])
-                    d['medaccY_{:s}'.format(eye)] = median([abs(v) for v in deltaYM[eyei]])
-                    d['sd_{:s}'.format(eye)] = sd(deltaM[eyei])
-                    d['sdX_{:s}'.format(eye)] = sd(deltaXM[eyei])
-                    d['sdY_{:s}'.format(eye)] = sd(deltaYM[eyei])
-                    d['rmsi_{:s}'.format(eye)] = rmsi(deltaM[eyei])
-                    d['rmsiX_{:s}'.format(eye)] = rmsi(deltaXM[eyei])
-                    d['rmsiY_{:s}'.format(eye)] = rmsi(deltaYM[eyei])
+                    self._storeTargetMeasures(d, '_' + eye, gazeXM[eyei], gazeYM[eyei],
+                                              deltaM[eyei], deltaXM[eyei], deltaYM[eyei])
 
             tar_data.append(d)
             sam_data.append(s)
+            tar_span.end(acc=d['acc'], samples=len(s))
 
             self._dlog('VAL_END {:d} {:.1f} {:.1f} {:.1f}'.format(c, *tarpos))
 
@@ -813,10 +798,11 @@ class SampleRecorder(object):
             avg_data[var] = mean(avg_data[var])
 
         # Clear and return to previous scene
-        root.remove(children=True)
-        if not prev_headlight_state:
-            viz.MainView.getHeadLight().disable()
-        viz.MainWindow.setScene(prev_scene)
+        with tr.span('validation restore', cat='validation', track='recorder'):
+            root.remove(children=True)
+            if not prev_headlight_state:
+                viz.MainView.getHeadLight().disable()
+            viz.MainWindow.setScene(prev_scene)
         self._dlog('Original scene returned')
 
         # Store participant metadata
@@ -830,10 +816,52 @@ class SampleRecorder(object):
         if self.recording:
                 self.recordEvent('VAL_RESULT {:.2f} {:.2f} {:.2f}'.format(d['acc'], d['rmsi'], d['sd']))
 
-        self._validation_results.append(copy.deepcopy(rv))
+        self._validation_results.append(rv.copy())
+        span.end(acc=avg_data.get('acc'), sd=avg_data.get('sd'))
         viztask.returnValue(rv)
 
 
+    def _storeTargetMeasures(self, d, suffix, gazeX, gazeY, delta, deltaX, deltaY):
+        """ Compute per-target validation measures and store them in d
+
+        Args:
+            d (dict): Target result dict
+            suffix (str): Key suffix, e.g. '_L' for monocular measures
+            gazeX, gazeY: Gaze angles in HMD space
+            delta: Angular gaze-target errors
+            deltaX, deltaY: Horizontal and vertical gaze-target errors
+        """
+        gX = summary(gazeX)
+        gY = summary(gazeY)
+        err = summary(delta)
+        errX = summary(deltaX)
+        errY = summary(deltaY)
+
+        # Gaze position and offset
+        d['avgX' + suffix] = gX['mean']
+        d['avgY' + suffix] = gY['mean']
+        d['medX' + suffix] = gX['median']
+        d['medY' + suffix] = gY['median']
+        d['offX' + suffix] = errX['mean']
+        d['offY' + suffix] = errY['mean']
+
+        # Accuracy 
+        d['acc' + suffix] = err['mean']
+        d['accX' + suffix] = errX['absmean']
+        d['accY' + suffix] = errY['absmean']
+        d['medacc' + suffix] = err['median']
+        d['medaccX' + suffix] = errX['absmedian']
+        d['medaccY' + suffix] = errY['absmedian']
+
+        # Precision
+        d['sd' + suffix] = err['sd']
+        d['sdX' + suffix] = errX['sd']
+        d['sdY' + suffix] = errY['sd']
+        d['rmsi' + suffix] = err['rmsi']
+        d['rmsiX' + suffix] = errX['rmsi']
+        d['rmsiY' + suffix] = errY['rmsi']
+
+
     def checkEyeTrackerDrift(self, threshold=1.5, auto_calibrate=True):
         """ Run single-target validation to check for eye tracker drift. 
 
@@ -860,6 +888,8 @@ class SampleRecorder(object):
         """
         if self._force_update:
             viz.update(viz.UPDATE_PLUGINS | viz.UPDATE_LINKS)
+        if self._tracer.enabled:
+            self._traceFrame()
 
         time_ms = viz.tick() * 1000.0		# Vizard time
         frame = viz.getFrameNumber()		# Vizard frame number
@@ -915,6 +945,94 @@ class SampleRecorder(object):
             sample = ((time_ms, frame, clock), nodes)
             self.recordSample(sample=sample)
 
+            if self.data_quality and self._tracker is not None:
+                self._updateDataQuality(gT, gW)
+
+
+    def _updateDataQuality(self, gT, gW):
+        """ Add current gaze direction to the streaming data quality measures.
+        A sample counts as missing if the tracker reports closed eyes or an
+        identity gaze matrix (no data).
+
+        Args:
+            gT: Gaze-in-Tracker matrix
+            gW: Gaze-in-World matrix
+        """
+        v = gT.getForward()
+        missing = v[0] == 0.0 and v[1] == 0.0 and v[2] == 1.0
+        if not missing and self._tracker_type == 'ViveProEyeTracker':
+            missing = self._tracker.getEyeOpen(viz.BOTH_EYE) == 0.0
+        if missing:
+            self._dq_x.addMissing()
+            self._dq_y.addMissing()
+            if self._dq_target is not None:
+                self._dq_acc.addMissing()
+            return
+
+        # Head-referenced gaze angles (horizontal: right positive, vertical: up positive)
+        self._dq_x.add(math.degrees(math.atan2(v[0], v[2])))
+        self._dq_y.add(math.degrees(math.atan2(v[1], math.hypot(v[0], v[2]))))
+
+        if self._dq_target is not None:
+            target = self._dq_target
+            if not isinstance(target, (list, tuple)):
+                target = target.getPosition(viz.ABS_GLOBAL)
+            eyeTarVec = vizmat.VectorToPoint(gW.getPosition(), target)
+            self._dq_acc.add(vizmat.AngleBetweenVector(gW.getForward(), eyeTarVec))
+
+
+    def setDataQualityTarget(self, target=None):
+        """ Set a target that the participant is expected to fixate, e.g. a fixation
+        cross, to also compute streaming accuracy (angular gaze error) from now on.
+
+        Args:
+            target: 3D world position [x, y, z] or Vizard node, None to stop
+        """
+        self._dq_target = target
+
+
+    def resetDataQuality(self):
+        """ Clear streaming data quality measures and the accuracy target.
+        Called by the Experiment class at the start of each trial. """
+        self._dq_x.reset()
+        self._dq_y.reset()
+        self._dq_acc.reset()
+        self._dq_target = None
+
+
+    def getDataQuality(self):
+        """ Return data quality measures for samples recorded since the last
+        resetDataQuality(), computed incrementally on each frame. Available at any
+        time, e.g. to abort a trial with too much data loss. Angles are in degrees,
+        values that cannot be computed yet are None.
+
+        Returns dict with keys:
+            dq_samples: number of samples, dq_missing: missing samples,
+            dq_meanX/Y: mean gaze angle relative to head, dq_medX/Y: approx. median,
+            dq_sdX/Y: SD precision, dq_rmsiX/Y, dq_rmsi: RMS-S2S precision,
+            dq_acc, dq_accsd, dq_accmed: accuracy, if a target was set
+        """
+        x = self._dq_x
+        y = self._dq_y
+        ssdX, ndX = x.sumSquaredDiffs()
+        ssdY, ndY = y.sumSquaredDiffs()
+        dq = {'dq_samples': x.n + x.missing,
+              'dq_missing': x.missing,
+              'dq_meanX': x.mean,
+              'dq_meanY': y.mean,
+              'dq_medX': x.median,
+              'dq_medY': y.median,
+              'dq_sdX': x.sd,
+              'dq_sdY': y.sd,
+              'dq_rmsiX': x.rmsi,
+              'dq_rmsiY': y.rmsi,
+              'dq_rmsi': math.sqrt((ssdX + ssdY) / ndX) if ndX > 0 else None}
+        if self._dq_acc.n + self._dq_acc.missing > 0:
+            dq['dq_acc'] = self._dq_acc.mean
+            dq['dq_accsd'] = self._dq_acc.sd
+            dq['dq_accmed'] = self._dq_acc.median
+        return dq
+
 
     def recordSample(self, console=False, sample=None):
         """ Records transform matrices for head, gaze and tracked objects for the
@@ -1001,8 +1119,11 @@ class SampleRecorder(object):
                 s['eye_stateL'] = self._tracker.getEyeOpen(viz.LEFT_EYE)
                 s['eye_stateR'] = self._tracker.getEyeOpen(viz.RIGHT_EYE)
 
-        # Additional data fields
-        s.update(self._customvars)
+        # Additional data fields, only converted to dict when changed
+        if ParamSet.getVersion(self._customvars) != self._customvars_version:
+            self._customvars_dict = dict(self._customvars)
+            self._customvars_version = ParamSet.getVersion(self._customvars)
+        s.update(self._customvars_dict)
         
         # Add to preallocated list, or switch to appending if full
         if self._samples_idx < self._prealloc:
@@ -1028,6 +1149,17 @@ class SampleRecorder(object):
                 print(outformat.format(s['time'], s['frameno'], cWp[0], cWp[1], cWp[2], cWd[0], cWd[1], cWd[2]))
 
 
+    def _traceFrame(self):
+        """ Mark frames that took noticeably longer than the shortest frame
+        seen so far (i.e., the display refresh interval) on the trace timeline """
+        elapsed = viz.getFrameElapsed()
+        if self._min_frame_elapsed is None or elapsed < self._min_frame_elapsed:
+            self._min_frame_elapsed = elapsed
+        elif elapsed > self._min_frame_elapsed * self.long_frame_factor:
+            self._tracer.instant('long frame', cat='frame', track='frames', frame=viz.getFrameNumber(),
+                                 elapsed_ms=elapsed * 1000.0)
+
+
     def recordEvent(self, event=''):
         """ Record a time-stamped event string.
         This always works regardless of sample recording status.
@@ -1038,6 +1170,8 @@ class SampleRecorder(object):
         ev = {'time': viz.tick() * 1000,
                'message': str(event)}
         self._events.append(ev)
+        if self._tracer.enabled:
+            self._tracer.instant(ev['message'], cat='event', track='events')
 
 
     def startRecording(self, force_update=False):
@@ -1080,6 +1214,8 @@ class SampleRecorder(object):
             meta_cols (dict): Dict of values to add to each sample (e.g., trial number)
             _data: Tuple (samples, events) to save, None for current recording (mostly internal use)
         """
+        span = self._tracer.span('saveRecording', cat='io', track='toolbox')
+
         # Select data to save
         if _data is not None:
             samples, events = _data
@@ -1147,7 +1283,7 @@ class SampleRecorder(object):
         evfields += list(meta_cols.keys())
 
         # Custom sample variables
-        fields += list(self._customvars.__dict__.keys())
+        fields += ParamSet.keys(self._customvars)
 
         # Samples
         if sample_file is not None:
@@ -1170,6 +1306,7 @@ class SampleRecorder(object):
                     writer.writerow(event)
             self._dlog('Saved {:d} events to file: {:s}'.format(len(events), event_file))
 
+        span.end(samples=len(samples), events=len(events))
         if sample_file is None and event_file is None:
             self._dlog('Neither sample_file nor event_file were specified. No data saved.')
         else:
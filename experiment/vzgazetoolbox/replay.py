@@ -4,20 +4,29 @@
 # Gaze and object position and orientation replay class
 
 import csv
+import sys
+import math
+import bisect
 import random
 import colorsys
 
+if sys.version_info[0] == 3:
+    from time import perf_counter
+else:
+    from time import clock as perf_counter
+
 import viz
 import vizact
 import vizinfo
 import vizshape
 
 from .eyeball import Eyeball
+from .samplestream import SampleStream, ReplayFrames, readSampleColumns
 
 class SampleReplay(object):
     
     def __init__(self, recording=None, ui=True, eyeball=True, console=False, eye='BINOCULAR',
-                 replay_view=True):
+                 replay_view=True, stream=False, ui_rate=10.0):
         """ Gaze and object position and orientation replay class
         
         Args:
@@ -34,15 +43,20 @@ class SampleReplay(object):
                     Note: "BOTH_EYE" will be used if input file only contains averaged gaze data!
                 - None: do not replay gaze data, even if it is available in the recording
             replay_view (bool): if True, move the MainView with recorded sample data
+            stream (bool): if True, read the recording file in chunks during replay
+                instead of loading it completely (see loadRecording)
+            ui_rate (float): Maximum update rate of the status panel during replay, in Hz
         """
-        # Create gaze visualization nodes
+        t_start = perf_counter()
+
+        # Gaze visualization nodes are created on first use (see _gaze_node)
         self._gaze = {'L': {}, 'R': {}, '': {}}
         for eye_pos in list(self._gaze.keys()):
             self._gaze[eye_pos]['data'] = False
             self._gaze[eye_pos]['node'] = None
-            self._gaze[eye_pos]['eye'] = Eyeball(visible=False, pointer=True)
-            self._gaze[eye_pos]['axes'] = vizshape.addAxes(scale=[0.1, 0.1, 0.1])
-            self._gaze[eye_pos]['axes'].visible(False)
+            self._gaze[eye_pos]['track'] = 'gaze' + eye_pos
+            self._gaze[eye_pos]['eye'] = None
+            self._gaze[eye_pos]['axes'] = None
 
         # Initial state of each eye visualization
         if eye not in ['LEFT_EYE', 'RIGHT_EYE', 'BOTH_EYE', 'BINOCULAR', None]:
@@ -88,11 +102,15 @@ class SampleReplay(object):
         self._frame = 0
         self._samples = []
         self._sample_time_offset = 0.0
+        self._frames = None
+        self.load_latency = None
         self._player = None
         self.replaying = False
         self.finished = False
         self.console = console
         self.replay_view = replay_view
+        self.ui_rate = ui_rate
+        self._ui_last_update = 0.0
 
         self.replay_nodes = []
         self._nodes = {}
@@ -127,22 +145,57 @@ class SampleReplay(object):
         # Load recording
         if recording is not None:
             if type(recording) == str:
-                self.loadRecording(recording)
+                self.loadRecording(recording, stream=stream)
+            else:
+                self._samples = [s for s in recording._samples if s is not None]
+                self._prepare_replay()
+
+        self.startup_time = (perf_counter() - t_start) * 1000.0
+        print('* Replay startup time: {:.1f} ms'.format(self.startup_time))
+
+
+    def _gaze_node(self, eye_pos, kind):
+        """ Return the gaze visualization node ('eye' or 'axes') of an eye,
+        creating it when it is first shown """
+        gaze = self._gaze[eye_pos]
+        if gaze[kind] is None:
+            if kind == 'eye':
+                gaze[kind] = Eyeball(visible=False, pointer=True)
+            else:
+                gaze[kind] = vizshape.addAxes(scale=[0.1, 0.1, 0.1])
+                gaze[kind].visible(False)
+        return gaze[kind]
+
+
+    def _node_obj(self, node):
+        """ Return the visualization object of a replay node,
+        creating it when it is first shown """
+        nd = self._nodes[node]
+        if nd['obj'] is None:
+            if node == 'view':
+                nd['obj'] = vizshape.addAxes(scale=[0.1, 0.1, 0.1], color=nd['color'])
             else:
-                self._samples = recording._samples
+                nd['obj'] = vizshape.addSphere(radius=0.01, color=nd['color'])
+        return nd['obj']
 
 
     def _set_ui(self):
         """ Update GUI elements to display status (if enabled) """
         if self._ui is not None:
 
-            if len(self._samples) == 0:
+            n_frames = self._num_frames()
+            if n_frames == 0:
                 self._ui_bar.message('No data')
             else:
-                self._ui_bar.set(float(self._frame)/float(len(self._samples)))
-                self._ui_bar.message('{:d}/{:d}'.format(self._frame, len(self._samples)))
-
-                t = self._samples[self._frame]['time'] - self._sample_time_offset
+                frame = min(self._frame, n_frames - 1)
+                n_str = '{:d}'.format(n_frames)
+                if isinstance(self._samples, SampleStream) and not self._samples.complete:
+                    n_str += '+'
+                self._ui_bar.set(float(self._frame)/float(n_frames))
+                self._ui_bar.message('{:d}/{:s}'.format(self._frame, n_str))
+
+                (chunk, row) = self._frames.lookup(frame)
+                t = chunk['time'][row] - self._sample_time_offset
                 if t > 10000:
                     self._ui_time.message('{:.1f} s'.format(t/1000.0))
                 else:
@@ -154,11 +207,42 @@ class SampleReplay(object):
                 self._ui_play.message('Start Replay')
 
 
+    def _prepare_replay(self):
+        """ Precompute per-node transform arrays for the loaded samples """
+        nodes = ['view'] + [self._gaze[e]['track'] for e in self._gaze.keys()]
+        nodes += [n for n in self.replay_nodes if n not in nodes]
+        self._frames = ReplayFrames(self._samples, nodes)
+        if self._num_frames() > 0:
+            (chunk, row) = self._frames.lookup(0)
+            self._sample_time_offset = chunk['time'][row]
+
+
+    def _num_frames(self):
+        """ Number of replay frames. For streamed recordings this is the number
+        of frames known so far, to avoid scanning the whole file. """
+        if isinstance(self._samples, SampleStream):
+            return self._samples.known_length
+        return len(self._samples)
+
+
+    def _replay_end(self):
+        """ Returns True if the current frame is past the end of the recording """
+        return self._replay_end_at(self._frame)
+
+
+    def _replay_end_at(self, frame):
+        """ Returns True if a frame index is past the end of the recording """
+        if isinstance(self._samples, SampleStream) and not self._samples.complete:
+            return False
+        return frame >= self._num_frames()
+
+
     def _ui_set_node_visibility(self, node):
         """ Callback for node visibility checkboxes """
         check = self._nodes[node]['ui'].get()
         self._nodes[node]['visible'] = bool(check)
-        self._nodes[node]['obj'].visible(bool(check))
+        if self._nodes[node]['obj'] is not None:
+            self._nodes[node]['obj'].visible(bool(check))
 
 
     def _ui_toggle_replay(self):
@@ -173,14 +257,15 @@ class SampleReplay(object):
         """ Callback for gaze dropdown list """
         for eye_pos in ['L', 'R', '']:
             if event.object == self._gaze[eye_pos]['ui']:
-                self._gaze[eye_pos]['eye'].visible(False)
-                self._gaze[eye_pos]['axes'].visible(False)
+                for kind in ['eye', 'axes']:
+                    if self._gaze[eye_pos][kind] is not None:
+                        self._gaze[eye_pos][kind].visible(False)
                 if event.newSel == 1:
                     self._gaze[eye_pos]['node'] = 'eye'
-                    self._gaze[eye_pos]['eye'].visible(True)
+                    self._gaze_node(eye_pos, 'eye').visible(True)
                 elif event.newSel == 2:
                     self._gaze[eye_pos]['node'] = 'axes'
-                    self._gaze[eye_pos]['axes'].visible(True)
+                    self._gaze_node(eye_pos, 'axes').visible(True)
                 else:
                     self._gaze[eye_pos]['node'] = None
 
@@ -189,14 +274,17 @@ class SampleReplay(object):
         """ Create replay node objects and UI items """
         COLORS = {'gaze3d': viz.RED, 'view': viz.BLUE}
 
-        # Remove all previous checkbox UI objects
-        if self._ui is not None: 
-            for node in self._nodes.keys():
+        # Remove all previous node objects and checkbox UI objects
+        for node in self._nodes.keys():
+            if self._nodes[node]['obj'] is not None:
+                self._nodes[node]['obj'].remove()
+            if self._ui is not None:
                 self._nodes[node]['ui'].remove()
         self._nodes = {}
 
         for node in self.replay_nodes:
-            self._nodes[node] = {'visible': True}
+            # Node objects are created on first use (see _node_obj)
+            self._nodes[node] = {'visible': True, 'obj': None}
             if node in COLORS:
                 # Consistent colors for built-in nodes
                 self._nodes[node]['color'] = COLORS[node]
@@ -205,10 +293,6 @@ class SampleReplay(object):
                 self._nodes[node]['color'] = colorsys.hsv_to_rgb(random.uniform(0.0, 1.0), 
                                                                  random.uniform(0.4, 1.0), 
                                                                  random.uniform(0.5, 1.0))
-            if node == 'view':
-                self._nodes[node]['obj'] = vizshape.addAxes(scale=[0.1, 0.1, 0.1], color=self._nodes[node]['color'])
-            else:
-                self._nodes[node]['obj'] = vizshape.addSphere(radius=0.01, color=self._nodes[node]['color'])
 
             if self._ui is not None:
                 self._nodes[node]['ui'] = self._ui.addLabelItem(node, viz.addCheckbox())
@@ -231,34 +315,43 @@ class SampleReplay(object):
                 self._gaze[eye_pos]['ui'].disable()
 
 
-    def loadRecording(self, sample_file, sep='\t'):
+    def loadRecording(self, sample_file, sep='\t', stream=False, chunk_size=1024):
         """ Load a SampleRecorder sample file for replay
         
         Args:
             sample_file (str): Filename of CSV file to load
             sep (str): Field separator in CSV input file
+            stream (bool): if True, do not load the whole file up front, but read
+                (and decompress, for .gz files) it in chunks of chunk_size samples
+                around the current replay frame. Use for very long recordings.
+            chunk_size (int): Number of samples per chunk when streaming
         """
-        s = []
-        with open(sample_file, 'r') as sf:
-            reader = csv.DictReader(sf, delimiter=sep)
-            HEADER = reader.fieldnames
-            for row in reader:
-                sample = {}
-                for field in reader.fieldnames:
-
-                    # Convert numeric values
-                    data = row[field]
-                    try:
-                        sample[field] = int(data)
-                    except ValueError:
+        t_start = perf_counter()
+        if stream:
+            s = SampleStream(sample_file, sep=sep, chunk_size=chunk_size)
+            HEADER = s.fieldnames
+
+        else:
+            s = []
+            with open(sample_file, 'r') as sf:
+                reader = csv.DictReader(sf, delimiter=sep)
+                HEADER = reader.fieldnames
+                for row in reader:
+                    sample = {}
+                    for field in reader.fieldnames:
+
+                        # Convert numeric values
+                        data = row[field]
                         try:
-                            sample[field] = float(data)
+                            sample[field] = int(data)
                         except ValueError:
-                            sample[field] = data
-                s.append(sample)
+                            try:
+                                sample[field] = float(data)
+                            except ValueError:
+                                sample[field] = data
+                    s.append(sample)
 
         self._samples = s
-        self._sample_time_offset = s[0]['time']
 
         # Only enable gaze data present in the recording
         for eye_pos in list(self._gaze.keys()):
@@ -275,9 +368,15 @@ class SampleReplay(object):
         for field in HEADER:
             if field[-5:] == '_posX' and field[0:-5] not in _nodes_builtin:
                 self.replay_nodes.append(field[0:-5])
+        self._prepare_replay()
+        self.load_latency = (perf_counter() - t_start) * 1000.0
         self._update_nodes()
         self._set_ui()
-        print('* Loaded {:d} replay samples from {:s}.'.format(len(s), sample_file))
+        if stream:
+            print('* Streaming replay samples from {:s} ({:d} per chunk).'.format(sample_file, chunk_size))
+        else:
+            print('* Loaded {:d} replay samples from {:s}.'.format(len(s), sample_file))
+        print('* Load latency to first frame: {:.1f} ms'.format(self.load_latency))
         if len(self.replay_nodes) > 1:
             print('* Replay contains {:d} tracked nodes: {:s}.'.format(len(self.replay_nodes), ', '.join(self.replay_nodes)))
 
@@ -288,7 +387,7 @@ class SampleReplay(object):
         Args:
             from_start (bool): if True, start replay from first frame 
         """
-        if from_start or self._frame >= len(self._samples):
+        if from_start or self._replay_end():
             self._frame = 0
         if self._player is None:
             self._player = vizact.onupdate(0, self.replayCurrentFrame)
@@ -324,53 +423,84 @@ class SampleReplay(object):
         Args:
             advance (bool): if True, advance to next frame (default).
         """
-        f = self._samples[self._frame]
+        if isinstance(self._samples, SampleStream):
+            self._samples.prefetch(self._frame)
+            if self._replay_end():
+                self._finish_replay()
+                return
+        (chunk, row) = self._frames.lookup(self._frame)
 
         # Set up eye representation(s)
-        for eye_pos in list(self._gaze.keys()):
-            if self._gaze[eye_pos]['node'] is not None:
-                if self._gaze[eye_pos]['data']:
-                    node = self._gaze[eye_pos][self._gaze[eye_pos]['node']]
-                    eye_mat = viz.Matrix()
-                    eye_mat.setEuler([f['gaze{:s}_dirX'.format(eye_pos)],
-                                    f['gaze{:s}_dirY'.format(eye_pos)],
-                                    f['gaze{:s}_dirZ'.format(eye_pos)]])
-                    eye_mat.setPosition([f['gaze{:s}_posX'.format(eye_pos)],
-                                        f['gaze{:s}_posY'.format(eye_pos)],
-                                        f['gaze{:s}_posZ'.format(eye_pos)]])
-                    eye_mat.setScale(node.getScale())
-                    node.setMatrix(eye_mat)
+        for eye_pos, gaze in self._gaze.items():
+            if gaze['node'] is not None:
+                if gaze['data']:
+                    node = self._gaze_node(eye_pos, gaze['node'])
+                    (pos, ori) = chunk[gaze['track']]
+                    if self._frames.quat[gaze['track']]:
+                        node.setQuat(ori[row])
+                    else:
+                        node.setEuler(ori[row])
+                    node.setPosition(pos[row])
                     node.visible(True)
-                else:
-                   self._gaze[eye_pos][self._gaze[eye_pos]['node']].visible(False) 
+                elif gaze[gaze['node']] is not None:
+                    gaze[gaze['node']].visible(False)
 
         # Position the 3D gaze cursor and other nodes
-        for node in self._nodes.keys():
-            if self._nodes[node]['visible']:
-                self._nodes[node]['obj'].setPosition([f['{:s}_posX'.format(node)], f['{:s}_posY'.format(node)], f['{:s}_posZ'.format(node)]])
+        for node, nd in self._nodes.items():
+            if nd['visible']:
+                self._node_obj(node).setPosition(chunk[node][0][row])
 
         if self.replay_view:
-            viz.MainView.setEuler([f['view_dirX'], f['view_dirY'], f['view_dirZ']])
-            viz.MainView.setPosition([f['view_posX'], f['view_posY'], f['view_posZ']])
+            (pos, ori) = chunk['view']
+            if self._frames.quat['view']:
+                viz.MainView.setQuat(ori[row])
+            else:
+                viz.MainView.setEuler(ori[row])
+            viz.MainView.setPosition(pos[row])
 
-        self._set_ui()
+        # Status panel is refreshed at a lower rate than the display
+        now = perf_counter()
+        if now - self._ui_last_update >= 1.0 / self.ui_rate:
+            self._ui_last_update = now
+            self._set_ui()
+
+        t = chunk['time'][row] - self._sample_time_offset
         if self.console:
+            f = self._samples[self._frame]
             st = 't={:.2f}s, f={:d}\tgaze3d=[{:0.2f}, {:0.2f}, {:0.2f}]\tgaze=[{:0.2f}, {:0.2f}, {:0.2f}]'
-            print(st.format((f['time'] - self._sample_time_offset)/1000.0, self._frame, f['gaze3d_posX'], f['gaze3d_posY'], f['gaze3d_posZ'], f['gaze_dirX'], f['gaze_dirY'], f['gaze_dirZ']))
+            print(st.format(t/1000.0, self._frame, f['gaze3d_posX'], f['gaze3d_posY'], f['gaze3d_posZ'], f['gaze_dirX'], f['gaze_dirY'], f['gaze_dirZ']))
         else:
-            if self._frame == 0 or self._frame == len(self._samples) or self._frame % 100 == 0:
-                print('Replaying frame {:d}/{:d}, t={:.1f} s'.format(self._frame, len(self._samples), 
-                                                                    (f['time'] - self._sample_time_offset)/1000.0))
+            if self._frame == 0 or self._frame == self._num_frames() or self._frame % 100 == 0:
+                print('Replaying frame {:d}/{:d}, t={:.1f} s'.format(self._frame, self._num_frames(), t/1000.0))
 
         if advance:
             self._frame += 1
-        if self._frame >= len(self._samples):
-            # Reached last frame, stop replay and reset
-            self.replaying = False
-            self.finished = True
-            if self._player is not None:
-                self._player.setEnabled(False)
-            print('Replay finished.')
+        if self._replay_end():
+            self._finish_replay()
+
+
+    def _finish_replay(self):
+        """ Reached last frame, stop replay and reset """
+        self.replaying = False
+        self.finished = True
+        if self._player is not None:
+            self._player.setEnabled(False)
+        self._set_ui()
+        print('Replay finished.')
+
+
+    def seekReplay(self, frame):
+        """ Jump to a specific frame of the recording and display it.
+        Replay (if running) continues from the new position.
+
+        Args:
+            frame (int): Frame (sample) index to jump to
+        """
+        if frame < 0 or self._replay_end_at(frame):
+            raise ValueError('Frame {:d} is outside of the current recording!'.format(frame))
+        self._frame = int(frame)
+        self.finished = False
+        self.replayCurrentFrame(advance=False)
 
 
     def replayDone(self):
@@ -392,7 +522,8 @@ class SampleReplay(object):
             raise ValueError('Unknown node name specified!')
 
         self._nodes[node]['visible'] = visible
-        self._nodes[node]['obj'].visible(visible)
+        if self._nodes[node]['obj'] is not None:
+            self._nodes[node]['obj'].visible(visible)
         self._nodes[node]['ui'].set(int(visible))
 
 
@@ -404,3 +535,290 @@ class SampleReplay(object):
             enabled (bool): if True, move MainView with replay data """
         self.replay_view = enabled
 
+
+
+class OverlayReplay(object):
+
+    def __init__(self, recordings=None, trial=None, align='start', gaze_length=1.0,
+                 point_size=8.0, line_width=2.0, speed=1.0):
+        """ Synchronized replay of many recordings overlaid in the same scene,
+        e.g. the same trial across all participants of a study.
+
+        All recordings are aligned on a shared time base and replayed in real time
+        from a single update callback. Each tracked node type (e.g. gaze3d, index,
+        efrc) is drawn as one shared point layer and each gaze track as one shared
+        line layer with one vertex (pair) per recording, so the number of scene
+        nodes and per-frame calls does not grow with the number of models.
+        Each recording is drawn in its own color.
+
+        Args:
+            recordings (list): Sample file names to load (see addRecording)
+            trial (int): if set, only replay samples of this trial number
+                (trial_number column of an Experiment sample file)
+            align: Default alignment point for time zero of each recording:
+                - 'start': first replayed sample (e.g. trial onset)
+                - column name: first sample where this column is set (non-zero),
+                    e.g. 'object_visible' for a custom recorder variable
+                - number: sample time in ms
+            gaze_length (float): Length of gaze direction lines in m
+            point_size (float): Size of node markers in pixels
+            line_width (float): Width of gaze lines in pixels
+            speed (float): Replay speed factor (1.0 = real time)
+        """
+        self._recs = []
+        self._pools = {}
+        self._player = None
+        self._t = 0.0
+        self._t_start = 0.0
+        self._t_end = 0.0
+        self.replaying = False
+        self.finished = False
+        self.align = align
+        self.gaze_length = gaze_length
+        self.point_size = point_size
+        self.line_width = line_width
+        self.speed = speed
+
+        if recordings is not None:
+            for rec in recordings:
+                self.addRecording(rec, trial=trial, _build=False)
+            self._build_pools()
+
+
+    def _align_time(self, data, align, sample_file):
+        """ Find the sample time (ms) used as time zero for a recording """
+        if align == 'start':
+            return data['time'][0]
+        elif isinstance(align, (int, float)):
+            return float(align)
+        elif align in data:
+            for t, value in zip(data['time'], data[align]):
+                if value not in (0, '', None):
+                    return t
+            raise ValueError('Alignment column "{:s}" is never set in {:s}!'.format(align, sample_file))
+        else:
+            raise ValueError('Unknown alignment specified: {:s}'.format(str(align)))
+
+
+    def addRecording(self, sample_file, trial=None, align=None, label=None, sep='\t', _build=True):
+        """ Load a SampleRecorder sample file into the overlay
+
+        Args:
+            sample_file (str): Filename of sample file to load (.tsv or .tsv.gz)
+            trial (int): if set, only replay samples of this trial number
+            align: Alignment point for this recording, overrides the default
+                set in the constructor (see OverlayReplay)
+            label (str): Name for this recording, defaults to the file name
+            sep (str): Field separator in input file
+        """
+        s = SampleStream(sample_file, sep=sep)
+        header = s.fieldnames
+        s.close()
+
+        _nodes_builtin = ['gaze', 'gazeL', 'gazeR']
+        _nodes_skip = ['tracker', 'trackerL', 'trackerR']
+        rays = [f[0:-5] for f in header if f[-5:] == '_posX' and f[0:-5] in _nodes_builtin
+                and '{:s}_dirX'.format(f[0:-5]) in header]
+        points = [f[0:-5] for f in header if f[-5:] == '_posX' and f[0:-5] not in _nodes_builtin + _nodes_skip]
+
+        if align is None:
+            align = self.align
+        columns = ['time']
+        for node in rays + points:
+            columns += ['{:s}_pos{:s}'.format(node, c) for c in 'XYZ']
+        for node in rays:
+            columns += ['{:s}_dir{:s}'.format(node, c) for c in 'XYZ']
+        if align in header and align not in columns:
+            columns.append(align)
+
+        match = None
+        if trial is not None:
+            match = {'trial_number': trial}
+        data = readSampleColumns(sample_file, columns=columns, match=match, sep=sep)
+        if len(data['time']) == 0:
+            raise ValueError('No samples to replay in {:s} (trial: {:s})!'.format(sample_file, str(trial)))
+
+        t0 = self._align_time(data, align, sample_file)
+        rec = {'label': label if label is not None else sample_file,
+               'time': [t - t0 for t in data['time']],
+               'frame': -1,
+               'points': {},
+               'rays': {}}
+
+        for node in points:
+            rec['points'][node] = list(zip(*[data['{:s}_pos{:s}'.format(node, c)] for c in 'XYZ']))
+
+        for node in rays:
+            # Gaze line end points from Euler angles (yaw, pitch, roll) in degrees
+            pos = zip(*[data['{:s}_pos{:s}'.format(node, c)] for c in 'XYZ'])
+            ori = zip(*[data['{:s}_dir{:s}'.format(node, c)] for c in 'XYZ'])
+            ray = []
+            for (p, o) in zip(pos, ori):
+                yaw = math.radians(o[0])
+                pitch = math.radians(o[1])
+                d = [math.sin(yaw) * math.cos(pitch), -math.sin(pitch), math.cos(yaw) * math.cos(pitch)]
+                ray.append((p, [p[i] + d[i] * self.gaze_length for i in range(3)]))
+            rec['rays'][node] = ray
+
+        self._recs.append(rec)
+        self._t_start = min([r['time'][0] for r in self._recs])
+        self._t_end = max([r['time'][-1] for r in self._recs])
+        print('* Overlay: loaded {:d} samples from {:s}.'.format(len(rec['time']), rec['label']))
+        if _build:
+            self._build_pools()
+
+
+    def _build_pools(self):
+        """ Create one shared point or line layer per node type for all recordings """
+        for pool in self._pools.values():
+            pool['obj'].remove()
+        self._pools = {}
+
+        n = len(self._recs)
+        for r, rec in enumerate(self._recs):
+            rec['color'] = colorsys.hsv_to_rgb(float(r) / max(n, 1), 0.8, 1.0)
+            rec['frame'] = -1
+
+        nodes = []
+        for rec in self._recs:
+            nodes += [('rays', node) for node in rec['rays'].keys()]
+            nodes += [('points', node) for node in rec['points'].keys()]
+        for (kind, node) in sorted(set(nodes)):
+            recs = [r for r, rec in enumerate(self._recs) if node in rec[kind]]
+            if kind == 'rays':
+                viz.startLayer(viz.LINES)
+                viz.lineWidth(self.line_width)
+                for r in recs:
+                    viz.vertexColor(self._recs[r]['color'])
+                    viz.vertex(self._recs[r][kind][node][0][0])
+                    viz.vertex(self._recs[r][kind][node][0][1])
+            else:
+                viz.startLayer(viz.POINTS)
+                viz.pointSize(self.point_size)
+                for r in recs:
+                    viz.vertexColor(self._recs[r]['color'])
+                    viz.vertex(self._recs[r][kind][node][0])
+            obj = viz.endLayer()
+            obj.dynamic()
+            self._pools[node] = {'obj': obj, 'kind': kind, 'recs': recs}
+        self._show_time(self._t)
+
+
+    def _show_time(self, t):
+        """ Move all pooled vertices to the samples at replay time t (ms).
+        Recordings hold their first / last sample outside of their time range. """
+        changed = set()
+        for r, rec in enumerate(self._recs):
+            times = rec['time']
+            frame = max(rec['frame'], 0)
+            if t >= times[frame]:
+                # Sequential replay: advance from previous frame
+                while frame + 1 < len(times) and times[frame + 1] <= t:
+                    frame += 1
+            else:
+                frame = max(bisect.bisect_right(times, t) - 1, 0)
+            if frame != rec['frame']:
+                rec['frame'] = frame
+                changed.add(r)
+
+        if len(changed) == 0:
+            return
+        for node, pool in self._pools.items():
+            obj = pool['obj']
+            for v, r in enumerate(pool['recs']):
+                if r in changed:
+                    rec = self._recs[r]
+                    if pool['kind'] == 'rays':
+                        (p, e) = rec['rays'][node][rec['frame']]
+                        obj.setVertex(2 * v, p)
+                        obj.setVertex(2 * v + 1, e)
+                    else:
+                        obj.setVertex(v, rec['points'][node][rec['frame']])
+
+
+    def _onUpdate(self):
+        """ Replay update callback, advances replay time for all recordings """
+        self._t += viz.getFrameElapsed() * 1000.0 * self.speed
+        self._show_time(self._t)
+        if self._t > self._t_end:
+            self.replaying = False
+            self.finished = True
+            self._player.setEnabled(False)
+            print('Overlay replay finished.')
+
+
+    @property
+    def labels(self):
+        """ Labels of all loaded recordings, in color order """
+        return [rec['label'] for rec in self._recs]
+
+
+    @property
+    def nodes(self):
+        """ Names of all replayed node types """
+        return list(self._pools.keys())
+
+
+    def startReplay(self, from_start=True):
+        """ Play all recordings synchronously in real time
+
+        Args:
+            from_start (bool): if True, start replay from the earliest sample
+        """
+        if len(self._recs) == 0:
+            raise RuntimeError('No recordings loaded for overlay replay!')
+        if from_start or self._t > self._t_end:
+            self._t = self._t_start
+        if self._player is None:
+            self._player = vizact.onupdate(0, self._onUpdate)
+        if not self.replaying:
+            self._player.setEnabled(True)
+            self.replaying = True
+            self.finished = False
+            print('Overlay replay of {:d} recordings started.'.format(len(self._recs)))
+
+
+    def stopReplay(self):
+        """ Stop an ongoing replay """
+        if self.replaying:
+            self._player.setEnabled(False)
+            self.replaying = False
+            print('Overlay replay stopped at t={:.1f} s.'.format(self._t / 1000.0))
+
+
+    def resetReplay(self):
+        """ Stop replay and reset to the earliest sample """
+        self.stopReplay()
+        self._t = self._t_start
+        self._show_time(self._t)
+
+
+    def seekReplay(self, t):
+        """ Jump to a specific time on the shared time base and display it.
+        Replay (if running) continues from the new position.
+
+        Args:
+            t (float): Time in ms relative to the alignment point
+        """
+        self._t = float(t)
+        self.finished = False
+        self._show_time(self._t)
+
+
+    def replayDone(self):
+        """ Returns True if replay is finished,
+            use as viztask.waitTrue(object.replayDone)
+        """
+        return self.finished
+
+
+    def setNodeVisibility(self, node='gaze3d', visible=True):
+        """ Controls the visibility of a replayed node type for all recordings
+
+        Args:
+            node (str): node name from self.nodes
+            visible (bool): if True, node is set to visible
+        """
+        if node not in self._pools:
+            raise ValueError('Unknown node name specified!')
+        self._pools[node]['obj'].visible(visible)
@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+
+# Vizard gaze tracking toolbox
+# Chunked, streaming access to recorded sample files (does not depend on Vizard)
+
+import io
+import sys
+import csv
+import gzip
+
+if sys.version_info[0] == 3:
+    from time import perf_counter
+else:
+    from time import clock as perf_counter
+
+__all__ = ['readSampleColumns', 'SampleStream', 'ReplayFrames']
+
+
+def _convert_value(data):
+    """ Convert a single string cell to int or float where possible """
+    try:
+        return int(data)
+    except ValueError:
+        try:
+            return float(data)
+        except ValueError:
+            return data
+
+
+def _open_sample_file(file_name):
+    """ Open a plain or gzip-compressed data file in binary mode """
+    if file_name.lower().endswith('.gz'):
+        return gzip.open(file_name, 'rb')
+    return open(file_name, 'rb')
+
+
+def _text_reader(f, sep, encoding='utf-8'):
+    """ csv.reader for a file opened with _open_sample_file """
+    if sys.version_info[0] == 3:
+        f = io.TextIOWrapper(f, encoding=encoding, newline='')
+    return csv.reader(f, delimiter=sep)
+
+
+def _convert_column(values):
+    """ Convert a whole column of string cells at once. Falls back to
+    per-cell conversion only for columns of mixed content. """
+    try:
+        return [int(v) for v in values]
+    except ValueError:
+        pass
+    try:
+        return [float(v) for v in values]
+    except ValueError:
+        return [_convert_value(v) for v in values]
+
+
+def readSampleColumns(sample_file, columns=None, match=None, sep='\t'):
+    """ Read selected columns of a sample file in a single pass. Only the
+    requested columns of matching rows are converted to numbers, which is much
+    faster than loading all samples when e.g. only a single trial is needed.
+
+    Args:
+        sample_file (str): Sample file name (.tsv or .tsv.gz)
+        columns (list): Column names to return, None for all columns
+        match (dict): Only keep rows where each given column has the given
+            value, e.g. {'trial_number': 12}. Values are compared as written
+            to the file by SampleRecorder.
+        sep (str): Field separator in input file
+
+    Returns: dict of column name -> list of values
+    """
+    with _open_sample_file(sample_file) as f:
+        reader = _text_reader(f, sep)
+        header = next(reader)
+        if columns is None:
+            columns = header
+        for c in list(columns) + list((match or {}).keys()):
+            if c not in header:
+                raise ValueError('Column "{:s}" not found in sample file {:s}!'.format(c, sample_file))
+        col_idx = [header.index(c) for c in columns]
+
+        if match:
+            m_idx = [header.index(c) for c in match.keys()]
+            m_val = [str(v) for v in match.values()]
+            rows = [r for r in reader if [r[i] for i in m_idx] == m_val]
+        else:
+            rows = [r for r in reader]
+
+    data = {}
+    for c, i in zip(columns, col_idx):
+        data[c] = _convert_column([r[i] for r in rows])
+    return data
+
+
+
+class SampleStream(object):
+    """ Read-only, list-like view of a SampleRecorder sample file that is read
+    and parsed in chunks. Only a small window of chunks around the current
+    playhead is kept in memory, so recordings larger than RAM can be replayed.
+
+    Plain and gzip-compressed (.gz) files are supported. Chunk start offsets
+    are remembered once a chunk has been read, so later seeks are cheap. Note
+    that seeking backwards in a gzip file requires decompressing from the start
+    of the file up to the requested chunk.
+
+    Attributes:
+        fieldnames (list): Column names from the file header
+        load_latency (float): Time in ms from opening the file to the first
+            chunk being available for replay
+    """
+
+    def __init__(self, sample_file, sep='\t', chunk_size=1024, read_ahead=2, keep_behind=1):
+        """ Open a sample file for streaming access
+
+        Args:
+            sample_file (str): Filename of sample file (.tsv or .tsv.gz)
+            sep (str): Field separator in input file
+            chunk_size (int): Number of samples to read and parse at once
+            read_ahead (int): Number of chunks to keep loaded ahead of the playhead
+            keep_behind (int): Number of chunks to keep loaded behind the playhead
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1!')
+
+        self.sample_file = sample_file
+        self.sep = sep
+        self.chunk_size = int(chunk_size)
+        self.read_ahead = int(read_ahead)
+        self.keep_behind = int(keep_behind)
+        self.max_chunks = self.read_ahead + self.keep_behind + 1
+
+        t_start = perf_counter()
+        self._file = _open_sample_file(sample_file)
+
+        header = self._parse_lines([self._file.readline()])
+        if len(header) == 0:
+            raise ValueError('Sample file is empty: {:s}'.format(sample_file))
+        self.fieldnames = header[0]
+
+        self._offsets = [self._file.tell()]	# file offset of each known chunk start
+        self._file_chunk = 0				# chunk the file pointer is currently at
+        self._num_samples = None			# total count, known once EOF was reached
+        self._chunks = {}					# chunk index -> list of columns
+        self._chunk_order = []				# least recently used chunk first
+        self._playhead_chunk = 0
+
+        self.getChunk(0)
+        self.load_latency = (perf_counter() - t_start) * 1000.0
+
+
+    def __repr__(self):
+        s = '<SampleStream {:s}, {:d}{:s} samples, {:d} chunk(s) loaded>'
+        return s.format(self.sample_file, self.known_length, '' if self.complete else '+', len(self._chunks))
+
+
+    def __len__(self):
+        """ Total number of samples. Scans the remainder of the file
+        (without parsing) if the end has not been reached yet. """
+        if self._num_samples is None:
+            self._scan()
+        return self._num_samples
+
+
+    def __getitem__(self, index):
+        """ Return a single sample as a dict, like an entry of SampleRecorder data """
+        if index < 0:
+            index += len(self)
+        if index < 0:
+            raise IndexError('Sample index out of range')
+        cols = self.getChunk(index // self.chunk_size)
+        row = index % self.chunk_size
+        if len(cols) == 0 or row >= len(cols[0]):
+            raise IndexError('Sample index out of range')
+        return dict(zip(self.fieldnames, [c[row] for c in cols]))
+
+
+    def __iter__(self):
+        """ Sequentially iterate over all samples in the file """
+        chunk = 0
+        while True:
+            try:
+                cols = self.getChunk(chunk)
+            except IndexError:
+                return
+            for row in zip(*cols):
+                yield dict(zip(self.fieldnames, row))
+            if len(cols) == 0 or len(cols[0]) < self.chunk_size:
+                return
+            chunk += 1
+
+
+    @property
+    def complete(self):
+        """ True if the end of the file has been reached, i.e., len() is cheap """
+        return self._num_samples is not None
+
+
+    @property
+    def known_length(self):
+        """ Number of samples known to exist without further reading """
+        if self._num_samples is not None:
+            return self._num_samples
+        return (len(self._offsets) - 1) * self.chunk_size
+
+
+    def _parse_lines(self, lines):
+        """ Split raw lines into lists of string cells """
+        if sys.version_info[0] == 3:
+            lines = [l.decode('utf-8') for l in lines]
+        return [row for row in csv.reader(lines, delimiter=self.sep)]
+
+
+    def _seek_chunk(self, chunk):
+        """ Move file pointer to the start of a chunk, skipping unparsed
+        lines forward if the chunk offset is not known yet """
+        if chunk < len(self._offsets):
+            if self._file_chunk != chunk:
+                self._file.seek(self._offsets[chunk])
+                self._file_chunk = chunk
+            return
+
+        self._seek_chunk(len(self._offsets) - 1)
+        while len(self._offsets) <= chunk:
+            n = 0
+            for n in range(0, self.chunk_size):
+                if not self._file.readline():
+                    self._file_chunk = None
+                    self._num_samples = (len(self._offsets) - 1) * self.chunk_size + n
+                    raise IndexError('Sample index out of range')
+            self._offsets.append(self._file.tell())
+            self._file_chunk = len(self._offsets) - 1
+
+
+    def _scan(self):
+        """ Count remaining samples and record chunk offsets without parsing """
+        try:
+            self._seek_chunk(sys.maxsize)
+        except IndexError:
+            pass
+
+
+    def getChunk(self, chunk):
+        """ Return parsed data of one chunk as a list of columns (ordered as
+        self.fieldnames), loading it from disk if necessary. Chunks outside
+        the current read-ahead window are released.
+
+        Args:
+            chunk (int): Chunk index, i.e. sample index // chunk_size
+        """
+        if chunk in self._chunks:
+            self._chunk_order.remove(chunk)
+            self._chunk_order.append(chunk)
+            return self._chunks[chunk]
+
+        if chunk < 0 or (self._num_samples is not None and chunk * self.chunk_size >= max(self._num_samples, 1)):
+            raise IndexError('Sample index out of range')
+
+        self._seek_chunk(chunk)
+        lines = []
+        for n in range(0, self.chunk_size):
+            line = self._file.readline()
+            if not line:
+                break
+            lines.append(line)
+
+        if len(lines) < self.chunk_size:
+            self._num_samples = chunk * self.chunk_size + len(lines)
+            self._file_chunk = None
+        else:
+            if len(self._offsets) == chunk + 1:
+                self._offsets.append(self._file.tell())
+            self._file_chunk = chunk + 1
+
+        nf = len(self.fieldnames)
+        rows = self._parse_lines(lines)
+        for row in rows:
+            if len(row) < nf:
+                row.extend([''] * (nf - len(row)))
+        if len(rows) > 0:
+            cols = [_convert_column(c) for c in zip(*rows)][0:nf]
+        else:
+            cols = [[] for f in self.fieldnames]
+
+        self._chunks[chunk] = cols
+        self._chunk_order.append(chunk)
+        while len(self._chunk_order) > self.max_chunks:
+            del self._chunks[self._chunk_order.pop(0)]
+        return cols
+
+
+    def prefetch(self, index):
+        """ Move the playhead to a sample index and load at most one missing
+        chunk of the read-ahead window, so that sequential playback does not
+        have to wait for disk access on chunk boundaries. Call once per frame.
+
+        Args:
+            index (int): Current sample index (playhead)
+        """
+        self._playhead_chunk = index // self.chunk_size
+        first = max(0, self._playhead_chunk - self.keep_behind)
+        last = self._playhead_chunk + self.read_ahead
+
+        # Release chunks that fell out of the window, e.g. after seeking
+        for c in list(self._chunk_order):
+            if c < first or c > last:
+                self._chunk_order.remove(c)
+                del self._chunks[c]
+
+        for c in range(self._playhead_chunk, last + 1):
+            if c not in self._chunks:
+                if self._num_samples is not None and c * self.chunk_size >= self._num_samples:
+                    break
+                try:
+                    self.getChunk(c)
+                except IndexError:
+                    pass
+                break
+
+
+    def close(self):
+        """ Close the underlying file and release all loaded chunks """
+        self._file.close()
+        self._chunks = {}
+        self._chunk_order = []
+
+
+
+class ReplayFrames(object):
+    """ Per-node position and orientation arrays prepared from recorded samples,
+    so that replay only has to index into precomputed transforms instead of
+    building field names and matrices on every frame.
+
+    Positions are stored as (x, y, z) tuples. Orientations are stored as
+    (x, y, z, w) quaternions if the recording contains quaternion columns
+    (see SampleRecorder.saveRecording(quat=True)), otherwise as Euler angle
+    (yaw, pitch, roll) tuples. For a SampleStream, each chunk is prepared once
+    when it is first needed and released together with the stream chunk.
+    """
+
+    def __init__(self, samples, nodes):
+        """ Prepare replay transforms
+
+        Args:
+            samples: List of sample dicts, or a SampleStream
+            nodes (list): Node labels to prepare, e.g. ['view', 'gaze', 'gaze3d']
+        """
+        self._stream = None
+        self._prepared = {}
+
+        if isinstance(samples, SampleStream):
+            self._stream = samples
+            self.chunk_size = samples.chunk_size
+            fields = samples.fieldnames
+        else:
+            samples = [s for s in samples if s is not None]
+            self.chunk_size = max(len(samples), 1)
+            if len(samples) > 0:
+                fields = list(samples[0].keys())
+            else:
+                fields = []
+        self._fields = fields
+
+        # Select nodes and orientation format present in the data
+        self.nodes = [n for n in nodes if '{:s}_posX'.format(n) in fields]
+        self.quat = {}
+        self._columns = ['time']
+        for n in self.nodes:
+            self._columns += ['{:s}_pos{:s}'.format(n, c) for c in 'XYZ']
+            if '{:s}_quatX'.format(n) in fields:
+                self.quat[n] = True
+                self._columns += ['{:s}_quat{:s}'.format(n, c) for c in 'XYZW']
+            elif '{:s}_dirX'.format(n) in fields:
+                self.quat[n] = False
+                self._columns += ['{:s}_dir{:s}'.format(n, c) for c in 'XYZ']
+            else:
+                self.quat[n] = None
+
+        if self._stream is None:
+            col = {}
+            for f in self._columns:
+                col[f] = [s[f] for s in samples]
+            self._prepared[0] = self._prepare(col)
+            self._num_frames = len(samples)
+
+
+    def __len__(self):
+        if self._stream is not None:
+            return len(self._stream)
+        return self._num_frames
+
+
+    def _prepare(self, col):
+        """ Build transform arrays for one chunk of column data
+
+        Args:
+            col (dict): Column name -> list of values
+        """
+        p = {'time': col['time']}
+        for n in self.nodes:
+            pos = list(zip(col[n + '_posX'], col[n + '_posY'], col[n + '_posZ']))
+            if self.quat[n]:
+                ori = list(zip(col[n + '_quatX'], col[n + '_quatY'], col[n + '_quatZ'], col[n + '_quatW']))
+            elif self.quat[n] is not None:
+                ori = list(zip(col[n + '_dirX'], col[n + '_dirY'], col[n + '_dirZ']))
+            else:
+                ori = None
+            p[n] = (pos, ori)
+        return p
+
+
+    def lookup(self, frame):
+        """ Return (prepared_chunk, row) for a frame index. prepared_chunk is
+        a dict mapping each node label to a (positions, orientations) tuple
+        and 'time' to the list of sample time stamps.
+
+        Args:
+            frame (int): Frame (sample) index
+        """
+        chunk = frame // self.chunk_size
+        if chunk not in self._prepared:
+            if self._stream is None:
+                raise IndexError('Frame index out of range')
+            cols = self._stream.getChunk(chunk)
+            self._prepared[chunk] = self._prepare(dict(zip(self._fields, cols)))
+
+            # Release prepared data of chunks the stream no longer holds
+            for c in list(self._prepared.keys()):
+                if c not in self._stream._chunks:
+                    del self._prepared[c]
+
+        return (self._prepared[chunk], frame % self.chunk_size)
@@ -3,45 +3,113 @@
 # Vizard gaze tracking toolbox
 # Statistics helper functions that work without numpy/scipy installed
 
+import sys
 import math
 
+__all__ = ['NUMPY_MIN_SIZE', 'setStatsBackend', 'getStatsBackend', 'mean', 'sd', 'median', 'rmsi',
+           'rmsm', 'rmsm3', 'mad', 'mad2', 'summary', 'P2Median', 'RunningStats']
+
+# Statistics backend: 'python', 'numpy', or 'auto' (use NumPy for larger
+# series if it has already been imported, see setStatsBackend)
+_backend = 'auto'
+_np = None
+
+# Minimum series length for which NumPy is used in 'auto' mode
+NUMPY_MIN_SIZE = 32
+
+
+def setStatsBackend(backend='auto'):
+    """ Select how statistics are computed
+
+    Args:
+        backend (str): 'python' (pure Python), 'numpy', or 'auto' (default):
+            use NumPy for series of at least NUMPY_MIN_SIZE values if NumPy has
+            already been imported, so that it is never imported during an experiment
+    """
+    global _backend, _np
+    if backend not in ['auto', 'python', 'numpy']:
+        raise ValueError('Invalid statistics backend: {:s}'.format(str(backend)))
+    if backend == 'numpy':
+        import numpy
+        _np = numpy
+    _backend = backend
+
+
+def getStatsBackend():
+    """ Return the selected statistics backend ('auto', 'python' or 'numpy') """
+    return _backend
+
+
+def _numpy(n):
+    """ Return the numpy module if it should be used for a series of length n, else None """
+    global _np
+    if _backend == 'python':
+        return None
+    if _np is None:
+        if _backend == 'auto' and 'numpy' not in sys.modules:
+            return None
+        import numpy
+        _np = numpy
+    if _backend == 'auto' and n < NUMPY_MIN_SIZE:
+        return None
+    return _np
+
+
 def mean(x):
     """ Calculate Arithmetic Mean without using numpy """
+    np = _numpy(len(x))
+    if np is not None:
+        return float(np.asarray(x, dtype=float).sum() / len(x))
     return sum([float(a) for a in x]) / float(len(x))
 
 
 def sd(x):
     """ Calculate population Standard Deviation without numpy """
+    np = _numpy(len(x))
+    if np is not None:
+        a = np.asarray(x, dtype=float)
+        return _npSD(np, a, a.sum() / len(a))
     xm = mean(x)
     return math.sqrt(sum([(float(xi) - xm)**2 for xi in x]) / float(len(x)))
 
 
 def median(x):
     """ Calculate sample Median without using numpy """
+    np = _numpy(len(x))
+    if np is not None:
+        return _npMedian(np, np.asarray(x, dtype=float))
     x = sorted(x)
     m = int(len(x) / 2.0)
-    if len(x) % 2 == 0:		
+    if len(x) % 2 == 0:
         return (x[m] + x[m-1]) / 2.0
     else:
         return x[m]
 
 
 def rmsi(x):
-    """ Calculate intersample Root Mean Square (RMS) error (precision) 
+    """ Calculate intersample Root Mean Square (RMS) error (precision)
     see also Holmqvist, Nyström & Mulvey, 2012, ETRA """
+    np = _numpy(len(x))
+    if np is not None:
+        return _npRMSI(np, np.asarray(x, dtype=float))
     dsq = [(float(x[t])-float(x[t-1]))**2 for t in range(1, len(x))]
     return math.sqrt(sum(dsq) / len(dsq))
 
 
 def rmsm(x):
     """ Calculate 1D RMS error between samples and the sample mean """
-    xm = mean(x)
-    dsq = [(float(x[t])-xm)**2 + (float(y[t])-ym)**2 + (float(z[t])-zm)**2 for xi in x]
-    return math.sqrt(sum(dsq) / len(dsq))
+    return sd(x)
 
 
 def rmsm3(x, y, z):
-    """ Calculate 3D RMS error between samples and the sample mean """	
+    """ Calculate 3D RMS error between samples and the sample mean """
+    np = _numpy(len(x))
+    if np is not None:
+        dsq = 0.0
+        for v in (x, y, z):
+            a = np.asarray(v, dtype=float)
+            dsq = dsq + (a - a.sum() / len(a)) ** 2
+        return math.sqrt(dsq.sum() / len(dsq))
     xm = mean(x)
     ym = mean(y)
     zm = mean(z)
@@ -53,15 +121,293 @@ def mad(x):
     """ Calculate Median Absolute Deviation (MAD) of samples (precision)
     see also Lohr, Friedman & Komogortsev, 2019, arXiv.
     """
+    np = _numpy(len(x))
+    if np is not None:
+        a = np.asarray(x, dtype=float)
+        return _npMedian(np, np.abs(a - _npMedian(np, a)))
     medx = median(x)
     return median([abs(xi - medx) for xi in x])
 
 
 def mad2(x, y):
     """ Calculate 2D Median Absolute Deviation (MAD) of samples (precision).
-    2D version used for horizontal and vertical gaze angles. See also 
+    2D version used for horizontal and vertical gaze angles. See also
     Lohr, Friedman & Komogortsev, 2019, arXiv.
     """
-    medx = median(x)
-    medy = median(y)
-    return math.sqrt((median([abs(xi - medx) for xi in x]) ** 2) + (median([abs(yi - medy) for yi in y]) ** 2))
+    return math.sqrt((mad(x) ** 2) + (mad(y) ** 2))
+
+
+def summary(x, y=None, z=None):
+    """ Calculate all accuracy and precision measures of a series at once,
+    converting and sorting the data only as often as necessary. Gives the
+    same results as the individual functions.
+
+    Args:
+        x: Series of values, e.g. angular gaze errors
+        y: Optional second series, adds 2D measures (mad2)
+        z: Optional third series (requires y), adds 3D measures (rmsm3)
+
+    Returns: dict with keys 'n', 'mean', 'median', 'sd', 'rmsi', 'mad',
+        'absmean' and 'absmedian' (mean and median of absolute values),
+        and 'mad2' / 'rmsm3' if y / z were specified
+    """
+    np = _numpy(len(x))
+    if np is not None:
+        s = _npSummary(np, np.asarray(x, dtype=float))
+    else:
+        s = _pySummary([float(v) for v in x])
+
+    if y is not None:
+        sy = summary(y)
+        s['mad2'] = math.sqrt((s['mad'] ** 2) + (sy['mad'] ** 2))
+        if z is not None:
+            s['rmsm3'] = rmsm3(x, y, z)
+    return s
+
+
+def _sortedMedian(xs):
+    """ Median of an already sorted list """
+    m = int(len(xs) / 2.0)
+    if len(xs) % 2 == 0:
+        return (xs[m] + xs[m-1]) / 2.0
+    else:
+        return xs[m]
+
+
+def _pySummary(xs):
+    """ Pure Python summary() of a list of floats """
+    n = len(xs)
+    xm = sum(xs) / float(n)
+    absx = [abs(v) for v in xs]
+    med = _sortedMedian(sorted(xs))
+    s = {'n': n,
+         'mean': xm,
+         'median': med,
+         'sd': math.sqrt(sum([(v - xm)**2 for v in xs]) / float(n)),
+         'absmean': sum(absx) / float(n),
+         'absmedian': _sortedMedian(sorted(absx)),
+         'mad': _sortedMedian(sorted([abs(v - med) for v in xs]))}
+    if n > 1:
+        dsq = [(xs[t] - xs[t-1])**2 for t in range(1, n)]
+        s['rmsi'] = math.sqrt(sum(dsq) / len(dsq))
+    else:
+        s['rmsi'] = float('nan')
+    return s
+
+
+def _npMedian(np, a):
+    """ Median of a float array using a single partition """
+    n = len(a)
+    m = n // 2
+    if n % 2 == 0:
+        p = np.partition(a, [m - 1, m])
+        return float((p[m] + p[m-1]) / 2.0)
+    else:
+        return float(np.partition(a, m)[m])
+
+
+def _npSD(np, a, xm):
+    """ Population SD of a float array, given its mean """
+    d = a - xm
+    return math.sqrt(float(np.dot(d, d)) / len(a))
+
+
+def _npRMSI(np, a):
+    """ Intersample RMS of a float array """
+    d = np.diff(a)
+    return math.sqrt(float(np.dot(d, d)) / len(d))
+
+
+def _npSummary(np, a):
+    """ NumPy summary() of a float array """
+    n = len(a)
+    xm = float(a.sum() / n)
+    absx = np.abs(a)
+    med = _npMedian(np, a)
+    s = {'n': n,
+         'mean': xm,
+         'median': med,
+         'sd': _npSD(np, a, xm),
+         'absmean': float(absx.sum() / n),
+         'absmedian': _npMedian(np, absx),
+         'mad': _npMedian(np, np.abs(a - med))}
+    if n > 1:
+        s['rmsi'] = _npRMSI(np, a)
+    else:
+        s['rmsi'] = float('nan')
+    return s
+
+
+
+class P2Median(object):
+    """ Streaming median estimate using the P-square algorithm (Jain & Chlamtac,
+    1985, Communications of the ACM). Uses constant memory and O(1) time per value;
+    exact for up to 5 values. """
+
+    __slots__ = ('_q', '_pos', '_des', '_n')
+
+    def __init__(self):
+        self._q = []                            # marker heights
+        self._pos = [1, 2, 3, 4, 5]             # marker positions
+        self._des = [1.0, 2.0, 3.0, 4.0, 5.0]   # desired marker positions
+        self._n = 0
+
+
+    def __len__(self):
+        return self._n
+
+
+    def add(self, x):
+        """ Add a value to the estimate """
+        x = float(x)
+        self._n += 1
+        q = self._q
+        if self._n <= 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # Find cell k containing x, adjusting extreme markers
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        pos = self._pos
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        des = self._des
+        des[1] += 0.25
+        des[2] += 0.5
+        des[3] += 0.75
+        des[4] += 1.0
+
+        # Adjust heights of the middle markers if necessary
+        for i in (1, 2, 3):
+            d = des[i] - pos[i]
+            if (d >= 1.0 and pos[i + 1] - pos[i] > 1) or (d <= -1.0 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = self._parabolic(i, d)
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / float(pos[i + d] - pos[i])
+                q[i] = qp
+                pos[i] += d
+
+
+    def _parabolic(self, i, d):
+        """ Piecewise-parabolic prediction of marker height """
+        q = self._q
+        n = self._pos
+        return q[i] + d / float(n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / float(n[i + 1] - n[i]) +
+                                                         (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / float(n[i] - n[i - 1]))
+
+
+    @property
+    def median(self):
+        """ Current median estimate, None if no values were added """
+        if self._n == 0:
+            return None
+        if self._n <= 5:
+            return _sortedMedian(self._q)
+        return self._q[2]
+
+
+
+class RunningStats(object):
+    """ Streaming summary of a series, e.g. one gaze angle component during a trial:
+    mean and SD (Welford's algorithm), intersample RMS, an approximate median (P-square)
+    and the number of missing values. Each update takes O(1) time and memory, so
+    values do not need to be stored or re-scanned.
+
+    Intersample RMS only uses pairs of consecutive valid values, i.e., it does not
+    bridge gaps of missing data.
+    """
+
+    __slots__ = ('n', 'missing', '_mean', '_m2', '_last', '_ssd', '_nd', '_median')
+
+    def __init__(self):
+        self.reset()
+
+
+    def reset(self):
+        """ Clear all accumulated data """
+        self.n = 0              # valid values
+        self.missing = 0        # missing values
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._last = None
+        self._ssd = 0.0         # sum of squared intersample differences
+        self._nd = 0
+        self._median = P2Median()
+
+
+    def add(self, x):
+        """ Add a value, or None for a missing value """
+        if x is None:
+            self.addMissing()
+            return
+        x = float(x)
+        self.n += 1
+        delta = x - self._mean
+        self._mean += delta / self.n
+        self._m2 += delta * (x - self._mean)
+        if self._last is not None:
+            self._ssd += (x - self._last) ** 2
+            self._nd += 1
+        self._last = x
+        self._median.add(x)
+
+
+    def addMissing(self):
+        """ Count a missing value """
+        self.missing += 1
+        self._last = None
+
+
+    @property
+    def mean(self):
+        """ Arithmetic mean, None if no values were added """
+        return self._mean if self.n > 0 else None
+
+
+    @property
+    def sd(self):
+        """ Population standard deviation, None if no values were added """
+        return math.sqrt(self._m2 / self.n) if self.n > 0 else None
+
+
+    @property
+    def rmsi(self):
+        """ Intersample RMS, None if there were no consecutive valid values """
+        return math.sqrt(self._ssd / self._nd) if self._nd > 0 else None
+
+
+    @property
+    def median(self):
+        """ Approximate median (exact for up to 5 values) """
+        return self._median.median
+
+
+    def sumSquaredDiffs(self):
+        """ Return (sum of squared intersample differences, number of differences),
+        e.g. to combine horizontal and vertical RMS into a 2D value """
+        return (self._ssd, self._nd)
+
+
+    def toDict(self, prefix=''):
+        """ Return all measures as a dict
+
+        Args:
+            prefix (str): Prefix for dict keys, e.g. 'gazeX_'
+        """
+        return {prefix + 'n': self.n,
+                prefix + 'missing': self.missing,
+                prefix + 'mean': self.mean,
+                prefix + 'sd': self.sd,
+                prefix + 'rmsi': self.rmsi,
+                prefix + 'median': self.median}
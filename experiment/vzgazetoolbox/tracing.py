@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+# Vizard gaze tracking toolbox
+# Timeline tracing in Chrome trace event format (does not depend on Vizard)
+
+import sys
+import json
+
+if sys.version_info[0] == 3:
+    from time import perf_counter
+else:
+    from time import clock as perf_counter
+
+__all__ = ['Tracer']
+
+
+class _NullSpan(object):
+    """ Span returned while tracing is disabled, does nothing """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def end(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+
+class _Span(object):
+    """ Open span on a Tracer timeline, recorded when end() is called
+    or the with-block is left """
+
+    def __init__(self, tracer, name, cat, track, args):
+        self._tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.track = track
+        self.args = args
+        self.start = perf_counter()
+        self._open = True
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.end()
+        return False
+
+
+    def end(self, **args):
+        """ Close the span
+
+        Args:
+            **args: Additional values to store with the span
+        """
+        if self._open:
+            self._open = False
+            self.args.update(args)
+            self._tracer.complete(self.name, self.start, perf_counter(), cat=self.cat,
+                                  track=self.track, **self.args)
+
+
+
+class Tracer(object):
+    """ Records named spans, instant events and counters with perf_counter
+    timestamps, and saves them as a Chrome / Perfetto trace (JSON), which can
+    be viewed e.g. in chrome://tracing or ui.perfetto.dev.
+
+    Events are grouped into named tracks (shown as threads). Spans on one track
+    should be nested, e.g. experiment phases within a trial. Spans may stay open
+    across task yields, so a with-block can cover a phase that lasts several frames.
+
+    While disabled, span() returns a shared no-op object and nothing is stored.
+    """
+
+    def __init__(self, enabled=False, name='vzgazetoolbox'):
+        """ Create a new tracer
+
+        Args:
+            enabled (bool): if True, start recording events immediately
+            name (str): Process name shown in the trace viewer
+        """
+        self.enabled = enabled
+        self.name = name
+        self._t0 = perf_counter()
+        self._events = []
+        self._tracks = {}
+
+
+    def __len__(self):
+        return len(self._events)
+
+
+    def enable(self):
+        """ Start recording events """
+        self.enabled = True
+
+
+    def disable(self):
+        """ Stop recording events. Recorded events are kept. """
+        self.enabled = False
+
+
+    def clear(self):
+        """ Remove all recorded events """
+        self._events = []
+
+
+    def _tid(self, track):
+        """ Numeric thread ID for a track name """
+        if track not in self._tracks:
+            self._tracks[track] = len(self._tracks) + 1
+        return self._tracks[track]
+
+
+    def _ts(self, t):
+        """ perf_counter time (s) to trace timestamp (us) """
+        return (t - self._t0) * 1e6
+
+
+    def span(self, name, cat='', track='main', **args):
+        """ Start a span. Use as context manager, or call end() on the result.
+
+        Args:
+            name (str): Span name, e.g. 'fixation'
+            cat (str): Category, e.g. 'phase' or 'io'
+            track (str): Timeline track to place the span on
+            **args: Values to store with the span, e.g. trial=3
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, track, args)
+
+
+    def complete(self, name, start, end, cat='', track='main', **args):
+        """ Record a span with known start and end times
+
+        Args:
+            name (str): Span name
+            start (float): Start time, from perf_counter() (s)
+            end (float): End time, from perf_counter() (s)
+            cat (str): Category
+            track (str): Timeline track
+            **args: Values to store with the span
+        """
+        if not self.enabled:
+            return
+        self._events.append({'name': name, 'cat': cat, 'ph': 'X', 'pid': 1, 'tid': self._tid(track),
+                             'ts': self._ts(start), 'dur': (end - start) * 1e6, 'args': args})
+
+
+    def instant(self, name, cat='', track='main', **args):
+        """ Record an instant event, e.g. object onset or a dropped frame
+
+        Args:
+            name (str): Event name
+            cat (str): Category
+            track (str): Timeline track
+            **args: Values to store with the event
+        """
+        if not self.enabled:
+            return
+        self._events.append({'name': name, 'cat': cat, 'ph': 'i', 's': 't', 'pid': 1,
+                             'tid': self._tid(track), 'ts': self._ts(perf_counter()), 'args': args})
+
+
+    def counter(self, name, **values):
+        """ Record the current value of one or more counters, e.g. number of samples
+
+        Args:
+            name (str): Counter name
+            **values: Counter series and values
+        """
+        if not self.enabled:
+            return
+        self._events.append({'name': name, 'ph': 'C', 'pid': 1, 'tid': 0,
+                             'ts': self._ts(perf_counter()), 'args': values})
+
+
+    def toDict(self):
+        """ Return the trace as a dict in Chrome trace event format """
+        meta = [{'name': 'process_name', 'ph': 'M', 'pid': 1, 'tid': 0, 'args': {'name': self.name}}]
+        for track, tid in sorted(self._tracks.items(), key=lambda t: t[1]):
+            meta.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': track}})
+            meta.append({'name': 'thread_sort_index', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'sort_index': tid}})
+        return {'traceEvents': meta + self._events, 'displayTimeUnit': 'ms'}
+
+
+    def save(self, file_name):
+        """ Save the trace as a Chrome trace JSON file
+
+        Args:
+            file_name (str): Output file name, e.g. 'Experiment1_trace.json'
+        """
+        with open(file_name, 'w') as tf:
+            json.dump(self.toDict(), tf, default=str)
+        return file_name
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+
+# Vizard gaze tracking toolbox
+# Headless trajectory and time series rendering of recorded sample data
+
+import os
+
+from .lazy import LazyModule, modulesAvailable
+
+# Rendering needs a scientific Python stack, which by default
+# is not the case in Vizard (see data.py)
+_HAS_SCI_PKGS = modulesAvailable('numpy', 'pandas', 'matplotlib')
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+mpl_figure = LazyModule('matplotlib.figure')
+mpl_agg = LazyModule('matplotlib.backends.backend_agg')
+
+__all__ = ['decimateLTTB', 'decimateMinMax', 'TrajectoryRenderer']
+
+
+def _require_sci_pkgs():
+    if not _HAS_SCI_PKGS:
+        raise RuntimeError('Trajectory rendering requires numpy, pandas and matplotlib!')
+
+
+def decimateLTTB(x, y, n_out):
+    """ Shape-preserving downsampling using the Largest-Triangle-Three-Buckets
+    algorithm (Steinarsson, 2013). x must be monotonic, e.g. sample time.
+
+    Args:
+        x: Array of x values (time)
+        y: Array of y values
+        n_out (int): Number of samples to keep
+
+    Returns: sorted array of sample indices to keep
+    """
+    _require_sci_pkgs()
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # First and last sample are always kept, the rest is split into n_out-2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    idx = np.zeros(n_out, dtype=int)
+    idx[-1] = n - 1
+    a = 0
+    for b in range(n_out - 2):
+        start, end = edges[b], edges[b + 1]
+        if b + 2 < len(edges):
+            next_x = x[edges[b + 1]:edges[b + 2]].mean()
+            next_y = y[edges[b + 1]:edges[b + 2]].mean()
+        else:
+            next_x = x[-1]
+            next_y = y[-1]
+
+        # Keep the sample spanning the largest triangle with the previous
+        # kept sample and the average of the next bucket
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) -
+                      (x[a] - x[start:end]) * (next_y - y[a]))
+        area[np.isnan(area)] = -1.0
+        a = start + int(np.argmax(area))
+        idx[b + 1] = a
+    return idx
+
+
+def decimateMinMax(y, n_buckets):
+    """ Shape-preserving downsampling that keeps the first, last, minimum
+    and maximum sample of each bucket, e.g. one bucket per output pixel.
+
+    Args:
+        y: Array of values
+        n_buckets (int): Number of buckets
+
+    Returns: sorted array of sample indices to keep
+    """
+    _require_sci_pkgs()
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if 2 * n_buckets + 2 >= n:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    keep = [0, n - 1]
+    valid = ~np.isnan(y)
+    for b in range(n_buckets):
+        start, end = edges[b], edges[b + 1]
+        if valid[start:end].any():
+            seg = y[start:end]
+            keep.append(start + int(np.nanargmin(seg)))
+            keep.append(start + int(np.nanargmax(seg)))
+    return np.unique(keep)
+
+
+
+class TrajectoryRenderer(object):
+    """ Render trajectory and time series figures of SampleRecorder data
+    without Vizard or a display, e.g. on a Linux analysis server.
+
+    Long recordings are downsampled before plotting using a shape-preserving
+    method (min/max per pixel bucket or LTTB), so figures of millions of samples
+    render quickly while keeping peaks and reversals visible.
+
+    Attributes:
+        samples (pandas.DataFrame): Loaded sample data
+        events (pandas.DataFrame): Loaded event data, or None
+        nodes (list): Names of tracked nodes with position data
+        trials (list): Trial numbers in recording, or [None] if not available
+    """
+
+    def __init__(self, sample_file, event_file=None, nodes=None, sep='\t', method='minmax',
+                 figsize=(8.0, 6.0), dpi=100):
+        """ Load a recording for rendering
+
+        Args:
+            sample_file (str): Sample file saved by SampleRecorder or Experiment (.tsv or .tsv.gz)
+            event_file (str): Event file for event markers. If None, use the matching
+                Experiment events file (*_events.tsv) if it exists.
+            nodes (list): Nodes to load and plot (e.g. ['gaze3d', 'index', 'efrc']),
+                None for all tracked nodes except raw tracker data
+            sep (str): Field separator in input files
+            method (str): Downsampling method, 'minmax' or 'lttb'
+            figsize (tuple): Figure size in inches
+            dpi (int): Figure resolution, also sets the number of downsampling buckets
+        """
+        _require_sci_pkgs()
+        if method not in ['minmax', 'lttb']:
+            raise ValueError('Unknown downsampling method specified: {:s}'.format(method))
+        self.method = method
+        self.figsize = figsize
+        self.dpi = dpi
+
+        header = pd.read_csv(sample_file, sep=sep, nrows=0).columns
+        found = [c[0:-5] for c in header if c[-5:] == '_posX']
+        if nodes is None:
+            nodes = [n for n in found if n not in ['tracker', 'trackerL', 'trackerR']]
+        for node in nodes:
+            if node not in found:
+                raise ValueError('Node "{:s}" not found in sample file {:s}!'.format(node, sample_file))
+        self.nodes = nodes
+
+        cols = ['time'] + ['{:s}_pos{:s}'.format(n, c) for n in nodes for c in 'XYZ']
+        if 'trial_number' in header:
+            cols.append('trial_number')
+        self.samples = pd.read_csv(sample_file, sep=sep, usecols=cols)
+        if 'trial_number' in self.samples.columns:
+            self.trials = [int(t) for t in pd.unique(self.samples['trial_number'])]
+        else:
+            self.trials = [None]
+
+        if event_file is None:
+            (base, ext) = os.path.splitext(sample_file)
+            if ext.lower() == '.gz':
+                (base, ext2) = os.path.splitext(base)
+                ext = ext2 + ext
+            if base.endswith('_samples') and os.path.isfile(base[0:-8] + '_events' + ext):
+                event_file = base[0:-8] + '_events' + ext
+        self.events = None
+        if event_file is not None:
+            self.events = pd.read_csv(event_file, sep=sep)
+
+
+    def getTrialSamples(self, trial=None):
+        """ Return sample data of a single trial as DataFrame
+
+        Args:
+            trial (int): Trial number, or None for all samples
+        """
+        if trial is None:
+            return self.samples
+        return self.samples.loc[self.samples['trial_number'] == trial, :]
+
+
+    def getTrialEvents(self, trial=None):
+        """ Return events of a single trial as DataFrame, or None if no events are loaded
+
+        Args:
+            trial (int): Trial number, or None for all events
+        """
+        if self.events is None or trial is None:
+            return self.events
+        if 'trial_number' in self.events.columns:
+            return self.events.loc[self.events['trial_number'] == trial, :]
+        s = self.getTrialSamples(trial)
+        t = self.events['time']
+        return self.events.loc[(t >= s['time'].min()) & (t <= s['time'].max()), :]
+
+
+    def decimate(self, samples, columns):
+        """ Return indices of samples to plot so that the shape of
+        all given columns over time is preserved
+
+        Args:
+            samples (pandas.DataFrame): Sample data (e.g. from getTrialSamples)
+            columns (list): Data columns to consider
+        """
+        n_buckets = int(self.figsize[0] * self.dpi)
+        keep = []
+        t = samples['time'].values
+        for col in columns:
+            if self.method == 'lttb':
+                keep.append(decimateLTTB(t, samples[col].values, 2 * n_buckets))
+            else:
+                keep.append(decimateMinMax(samples[col].values, n_buckets))
+        return np.unique(np.concatenate(keep))
+
+
+    def _new_figure(self):
+        """ Create a matplotlib Figure that renders without a display """
+        fig = mpl_figure.Figure(figsize=self.figsize, dpi=self.dpi)
+        mpl_agg.FigureCanvasAgg(fig)
+        return fig
+
+
+    def _mark_events(self, ax, samples, events, cols):
+        """ Mark the sample closest to each event on a trajectory plot """
+        if events is None or len(events) == 0 or len(samples) == 0:
+            return
+        t = samples['time'].values
+        for _, ev in events.iterrows():
+            i = min(np.searchsorted(t, ev['time']), len(t) - 1)
+            pos = [samples[c].values[i] for c in cols]
+            ax.plot(*[[p] for p in pos], marker='x', color='k', markersize=6)
+            if len(pos) == 2:
+                ax.annotate(str(ev['message']), xy=pos, xytext=(3, 3), textcoords='offset points', fontsize=7)
+            else:
+                ax.text(pos[0], pos[1], pos[2], str(ev['message']), fontsize=7)
+
+
+    def plotTrajectory(self, trial=None, nodes=None, plane='xz', file_name=None):
+        """ Plot 2D trajectories of tracked nodes, projected onto a plane
+
+        Args:
+            trial (int): Trial number, or None for all samples
+            nodes (list): Nodes to plot, None for all loaded nodes
+            plane (str): Two axes to plot, e.g. 'xz' (top view) or 'xy' (front view)
+            file_name (str): if set, save figure to this file
+
+        Returns: matplotlib Figure
+        """
+        if len(plane) != 2 or not set(plane.upper()) <= set('XYZ'):
+            raise ValueError('Invalid plane specified: {:s}'.format(plane))
+        if nodes is None:
+            nodes = self.nodes
+        s = self.getTrialSamples(trial)
+        ev = self.getTrialEvents(trial)
+
+        fig = self._new_figure()
+        ax = fig.add_subplot(1, 1, 1)
+        for node in nodes:
+            cols = ['{:s}_pos{:s}'.format(node, c) for c in plane.upper()]
+            ds = s.iloc[self.decimate(s, cols)]
+            ax.plot(ds[cols[0]].values, ds[cols[1]].values, '-', linewidth=1, label=node)
+            self._mark_events(ax, s, ev, cols)
+        ax.set_xlabel('{:s} (m)'.format(plane[0].upper()))
+        ax.set_ylabel('{:s} (m)'.format(plane[1].upper()))
+        ax.set_aspect('equal', adjustable='datalim')
+        ax.legend(loc='best', fontsize=8)
+        if trial is not None:
+            ax.set_title('Trial {:d}'.format(int(trial)))
+        if file_name is not None:
+            fig.savefig(file_name)
+        return fig
+
+
+    def plotTrajectory3D(self, trial=None, nodes=None, file_name=None):
+        """ Plot 3D trajectories of tracked nodes
+
+        Args:
+            trial (int): Trial number, or None for all samples
+            nodes (list): Nodes to plot, None for all loaded nodes
+            file_name (str): if set, save figure to this file
+
+        Returns: matplotlib Figure
+        """
+        from mpl_toolkits.mplot3d import Axes3D # registers 3D projection
+        if nodes is None:
+            nodes = self.nodes
+        s = self.getTrialSamples(trial)
+        ev = self.getTrialEvents(trial)
+
+        fig = self._new_figure()
+        ax = fig.add_subplot(1, 1, 1, projection='3d')
+        for node in nodes:
+            # Vizard is Y-up, plot with vertical Y axis on the Z axis of the figure
+            cols = ['{:s}_pos{:s}'.format(node, c) for c in 'XZY']
+            ds = s.iloc[self.decimate(s, cols)]
+            ax.plot(ds[cols[0]].values, ds[cols[1]].values, ds[cols[2]].values, '-', linewidth=1, label=node)
+            self._mark_events(ax, s, ev, cols)
+        ax.set_xlabel('X (m)')
+        ax.set_ylabel('Z (m)')
+        ax.set_zlabel('Y (m)')
+        ax.legend(loc='best', fontsize=8)
+        if trial is not None:
+            ax.set_title('Trial {:d}'.format(int(trial)))
+        if file_name is not None:
+            fig.savefig(file_name)
+        return fig
+
+
+    def plotTimeSeries(self, trial=None, nodes=None, file_name=None):
+        """ Plot X, Y and Z position of tracked nodes over time,
+        with vertical lines marking events
+
+        Args:
+            trial (int): Trial number, or None for all samples
+            nodes (list): Nodes to plot, None for all loaded nodes
+            file_name (str): if set, save figure to this file
+
+        Returns: matplotlib Figure
+        """
+        if nodes is None:
+            nodes = self.nodes
+        s = self.getTrialSamples(trial)
+        ev = self.getTrialEvents(trial)
+        t0 = s['time'].values[0] if len(s) > 0 else 0.0
+
+        fig = self._new_figure()
+        axs = [fig.add_subplot(3, 1, i + 1) for i in range(3)]
+        for i, c in enumerate('XYZ'):
+            ax = axs[i]
+            for node in nodes:
+                col = '{:s}_pos{:s}'.format(node, c)
+                ds = s.iloc[self.decimate(s, [col])]
+                ax.plot((ds['time'].values - t0) / 1000.0, ds[col].values, '-', linewidth=1, label=node)
+            if ev is not None:
+                for _, e in ev.iterrows():
+                    ax.axvline((e['time'] - t0) / 1000.0, color='k', linestyle=':', linewidth=0.8)
+                    if i == 0:
+                        ax.annotate(str(e['message']), xy=((e['time'] - t0) / 1000.0, 1.0), xycoords=('data', 'axes fraction'),
+                                    xytext=(2, -2), textcoords='offset points', va='top', fontsize=7)
+            ax.set_ylabel('{:s} (m)'.format(c))
+        axs[0].legend(loc='upper right', fontsize=8)
+        axs[-1].set_xlabel('Time (s)')
+        if trial is not None:
+            axs[0].set_title('Trial {:d}'.format(int(trial)))
+        if file_name is not None:
+            fig.savefig(file_name)
+        return fig
+
+
+    def renderTrials(self, out_dir, trials=None, plots=('trajectory', 'timeseries'), fmt='png'):
+        """ Render figures for each trial to image files
+
+        Args:
+            out_dir (str): Output directory (created if necessary)
+            trials (list): Trial numbers to render, None for all trials
+            plots (list): Figures to render per trial: 'trajectory', 'trajectory3d', 'timeseries'
+            fmt (str): Image file format, e.g. 'png', 'pdf', 'svg'
+
+        Returns: list of written file names
+        """
+        PLOTS = {'trajectory': self.plotTrajectory,
+                 'trajectory3d': self.plotTrajectory3D,
+                 'timeseries': self.plotTimeSeries}
+        for p in plots:
+            if p not in PLOTS:
+                raise ValueError('Unknown plot type specified: {:s}'.format(p))
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        if trials is None:
+            trials = self.trials
+
+        files = []
+        for trial in trials:
+            for p in plots:
+                if trial is None:
+                    f = os.path.join(out_dir, '{:s}.{:s}'.format(p, fmt))
+                else:
+                    f = os.path.join(out_dir, 'trial{:d}_{:s}.{:s}'.format(int(trial), p, fmt))
+                PLOTS[p](trial=trial, file_name=f)
+                files.append(f)
+        return files
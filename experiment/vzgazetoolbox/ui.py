@@ -4,6 +4,7 @@
 # Experiment UI
 
 import viz
+import vizact
 import vizinfo
 import vizdlg
 
@@ -12,11 +13,28 @@ from .experiment import Experiment, Trial
 
 class ExperimentUI(object):
 
-    def __init__(self, experiment):
+    def __init__(self, experiment, visible_rows=20, follow=True):
+        """ Experimenter UI panel showing trial status and config parameters.
+
+        The trial list only displays a window of visible_rows trials, which
+        can be scrolled using the panel buttons. Updates only change the text
+        of rows whose content changed, so their cost does not depend on the
+        number of trials.
+
+        Args:
+            experiment: Experiment instance to display
+            visible_rows (int): Number of trial rows to display at once
+            follow (bool): if True, scroll the trial list to keep the
+                current trial visible
+        """
         if type(experiment) != Experiment:
             raise ValueError('ExperimentUI requires a valid Experiment instance as first argument!')
 
         self._exp = experiment
+        self.visible_rows = visible_rows
+        self.follow = follow
+        self._first = 0
+        self._followed = None
         self._createUI()
         self.updateTrialList()
 
@@ -26,55 +44,115 @@ class ExperimentUI(object):
         self._ui = vizdlg.TabPanel(align=viz.ALIGN_RIGHT_TOP, border=True)
 
         self._ui_trials = vizdlg.GridPanel(border=False)
-        self._ui_trials_rows = []
         self._tp_trials = self._ui.addPanel('Trials', self._ui_trials)
         self._tp_trials.setCellPadding(0)
         self._ui.addItem(self._ui_trials)
 
+        # Fixed set of row slots, reused for whichever trials are visible
+        self._ui_trials.addRow([viz.addText('Trial'), viz.addText('Status')])
+        self._ui_trials_slots = []
+        for s in range(0, self.visible_rows):
+            num = viz.addText('')
+            status = viz.addText('')
+            row = self._ui_trials.addRow([num, status])
+            self._ui_trials_slots.append({'row': row, 'num': num, 'status': status, 'text': None})
+
+        self._ui_prev = viz.addButtonLabel('<')
+        self._ui_next = viz.addButtonLabel('>')
+        self._ui_trials.addRow([self._ui_prev, self._ui_next])
+        vizact.onbuttondown(self._ui_prev, self.scrollTrials, -self.visible_rows)
+        vizact.onbuttondown(self._ui_next, self.scrollTrials, self.visible_rows)
+
         self._ui_config = vizdlg.GridPanel(border=False)
-        self._ui_config_rows = []
+        self._ui_config_items = {}
         self._tp_config = self._ui.addPanel('Config', self._ui_config)
 
         viz.link(viz.RightTop, self._ui, offset=(-20,-20,0))
 
 
+    def scrollTrials(self, offset):
+        """ Scroll the visible window of the trial list
+
+        Args:
+            offset (int): Number of trials to scroll by (negative: up)
+        """
+        self.showTrial(self._first + offset, align_top=True)
+
+
+    def showTrial(self, index, align_top=False):
+        """ Scroll the trial list so that a trial is visible
+
+        Args:
+            index (int): Trial index in the experiment's trial list
+            align_top (bool): if True, show this trial as first visible row
+        """
+        last = max(len(self._exp.trials) - self.visible_rows, 0)
+        if align_top or index < self._first or index >= self._first + self.visible_rows:
+            self._first = min(max(int(index), 0), last)
+        self.updateTrialList()
+
+
     def updateTrialList(self):
-        """ Rebuilds list of trials in experiment UI """
-        if len(self._ui_trials_rows) > 0:
-            for row in self._ui_trials_rows:
-                self._ui_trials.removeRow(row)
-            self._ui_trials_rows = []
-        
-        header = self._ui_trials.addRow([viz.addText('Trial'),
-                                         viz.addText('Status')])
-        self._ui_trials_rows.append(header)
-
-        for t in self._exp.trials:
-            r = self._ui_trials.addRow([viz.addText(str(t.number)),
-                                         viz.addText(t.status)])
-            self._ui_trials_rows.append(r)
+        """ Update the visible rows of the trial list """
+        trials = self._exp.trials
+        if self.follow and len(trials) > 0 and self._exp.currentTrialIndex != self._followed:
+            # Current trial changed: make sure it is visible
+            cur = self._exp.currentTrialIndex
+            self._followed = cur
+            if cur < self._first or cur >= self._first + self.visible_rows:
+                self._first = min(cur, max(len(trials) - self.visible_rows, 0))
+
+        for s, slot in enumerate(self._ui_trials_slots):
+            idx = self._first + s
+            if idx < len(trials):
+                t = trials[idx]
+                text = (str(t.number), t.status)
+            else:
+                text = ('', '')
+
+            # Only touch GUI nodes whose content changed
+            if text != slot['text']:
+                if slot['text'] is None or text[0] != slot['text'][0]:
+                    slot['num'].message(text[0])
+                if slot['text'] is None or text[1] != slot['text'][1]:
+                    slot['status'].message(text[1])
+                slot['text'] = text
 
 
     def updateConfig(self):
-        """ Rebuild list of config parameters """
-        if len(self._ui_config_rows) > 0:
-            for row in self._ui_config_rows:
-                self._ui_config.removeRow(row)
-            self._ui_config_rows = []
-
-        for c in self._exp.config:
-            label = viz.addText(str(c[0]))
-            if type(c[1]) == bool:
-                field = viz.addCheckbox()
-                field.set(c[1])
-            else:
-                field = viz.addTextbox()
-                field.message(str(c[1]))
-            row = self._ui_config.addRow([label, field])
-            self._ui_config_rows.append(row)
+        """ Update list of config parameters, only adding, changing or
+        removing rows of parameters that changed """
+        config = dict(self._exp.config)
+
+        for key in list(self._ui_config_items.keys()):
+            item = self._ui_config_items[key]
+            if key not in config or (type(config[key]) == bool) != item['bool']:
+                self._ui_config.removeRow(item['row'])
+                del self._ui_config_items[key]
+
+        for key in sorted(config.keys(), key=str):
+            value = config[key]
+            if key not in self._ui_config_items:
+                label = viz.addText(str(key))
+                if type(value) == bool:
+                    field = viz.addCheckbox()
+                else:
+                    field = viz.addTextbox()
+                row = self._ui_config.addRow([label, field])
+                self._ui_config_items[key] = {'row': row, 'field': field, 'value': None,
+                                              'bool': type(value) == bool}
+
+            item = self._ui_config_items[key]
+            text = value if item['bool'] else str(value)
+            if text != item['value']:
+                if item['bool']:
+                    item['field'].set(value)
+                else:
+                    item['field'].message(text)
+                item['value'] = text
 
 
     def update(self):
         """ Update UI information """
         self.updateTrialList()
-        self.updateConfig()
\ No newline at end of file
+        self.updateConfig()